@@ -0,0 +1,278 @@
+# cascade.py
+"""Confidence-gated model cascade.
+
+A cheap engine (VADER from model_2, or the LinearSVC or MLP pipeline from
+model 1) scores every row first. Rows whose confidence (VADER
+``abs(compound)``, the SVC decision margin or the MLP top-class probability)
+is at least a calibrated threshold keep the cheap label; only the uncertain
+rows are sent to the model_3 BERT model, in batches.
+
+Results use the model_3 schema (sentiment, rating, confidence,
+sentiment_score) plus an ``engine`` column naming the engine that decided
+each row and an ``engine_confidence`` column with that engine's raw score.
+The raw scores are on engine-specific scales, so ``confidence`` is always a
+probability: BERT's top-star probability, or for cheap rows the measured
+agreement with BERT of the rows accepted at calibration. An uncalibrated
+engine falls back to its raw score clipped to [0, 1].
+
+An engine needs a threshold, either calibrated or passed explicitly;
+``--default-threshold`` opts into the built-in starting points instead.
+
+Usage:
+    python cascade.py calibrate reviews.csv --cheap vader --target 0.95
+    python cascade.py analyze reviews.csv --cheap vader --output analyzed.csv
+    python cascade.py analyze reviews.csv --cheap mlp --default-threshold
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from engines import BertEngine, get_engine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+THRESHOLDS_PATH = os.path.join(BASE_DIR, "cascade_thresholds.json")
+
+DEFAULT_RATINGS = {"positive": 4, "neutral": 3, "negative": 2}
+DEFAULT_THRESHOLDS = {
+    "vader": {"threshold": 0.5, "ratings": DEFAULT_RATINGS},
+    "svc": {"threshold": 0.5, "ratings": DEFAULT_RATINGS},
+    "mlp": {"threshold": 0.8, "ratings": DEFAULT_RATINGS},
+}
+CHEAP_ENGINES = list(DEFAULT_THRESHOLDS)
+
+SENTIMENT_SCORES = {"positive": 1.0, "neutral": 0.0, "negative": -1.0}
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    thresholds = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            thresholds.update(json.load(f))
+    return thresholds
+
+
+def save_thresholds(calibration, path=THRESHOLDS_PATH):
+    thresholds = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            thresholds = json.load(f)
+    thresholds[calibration["engine"]] = calibration
+    with open(path, "w") as f:
+        json.dump(thresholds, f, indent=2)
+
+
+class CascadeAnalyzer:
+    def __init__(self, cheap="vader", threshold=None, ratings=None, batch_size=32,
+                 cheap_engine=None, bert_engine=None, use_defaults=False):
+        self.cheap = cheap_engine or get_engine(cheap)
+        settings = load_thresholds().get(self.cheap.name)
+        if settings is None and use_defaults:
+            settings = DEFAULT_THRESHOLDS.get(self.cheap.name)
+        settings = settings or {}
+        if threshold is None and "threshold" not in settings:
+            raise ValueError(
+                f"No threshold for engine '{self.cheap.name}': pass one, run "
+                f"`python cascade.py calibrate --cheap {self.cheap.name}` or use "
+                f"--default-threshold"
+            )
+        self.threshold = threshold if threshold is not None else settings["threshold"]
+        self.ratings = ratings or settings.get("ratings", DEFAULT_RATINGS)
+        # Probability that an accepted cheap label matches BERT, if calibrated
+        agreement = settings.get("agreement")
+        self.agreement = float(agreement) if agreement is not None else None
+        self.batch_size = batch_size
+        self._bert = bert_engine
+        self.results = None
+
+    @property
+    def bert(self):
+        # Only load the transformer if some row actually needs it
+        if self._bert is None:
+            self._bert = BertEngine(batch_size=self.batch_size)
+        return self._bert
+
+    def cheap_confidence(self, raw):
+        """Confidence reported for a row the cheap engine decided"""
+        if self.agreement is not None:
+            return self.agreement
+        return float(np.clip(raw, 0.0, 1.0))
+
+    def analyze_texts(self, texts):
+        texts = list(texts)
+        results = [
+            {
+                "sentiment": "NEUTRAL",
+                "rating": 3,
+                "confidence": 0.5,
+                "engine_confidence": 0.5,
+                "score": 0.0,
+                "engine": "default",
+            }
+            for _ in texts
+        ]
+        rows = [i for i, text in enumerate(texts) if not pd.isna(text)]
+        if not rows:
+            return results
+
+        labels, confidence = self.cheap.predict([str(texts[i]) for i in rows])
+        accepted = accepts(confidence, self.threshold)
+
+        uncertain = []
+        for row, label, conf, accept in zip(rows, labels, confidence, accepted):
+            if not accept:
+                uncertain.append(row)
+                continue
+            results[row] = {
+                "sentiment": label.upper(),
+                "rating": int(self.ratings[label]),
+                "confidence": self.cheap_confidence(conf),
+                "engine_confidence": float(conf),
+                "score": SENTIMENT_SCORES[label],
+                "engine": self.cheap.name,
+            }
+
+        print(
+            f"Cascade: {len(rows) - len(uncertain)} rows decided by {self.cheap.name}, "
+            f"{len(uncertain)} sent to {BertEngine.name}"
+        )
+
+        if uncertain:
+            for row, result in zip(
+                uncertain, self.bert.analyze([str(texts[i]) for i in uncertain])
+            ):
+                results[row] = dict(
+                    result, engine_confidence=result["confidence"], engine=BertEngine.name
+                )
+
+        return results
+
+    def analyze_dataframe(self, df, text_column):
+        """Analyze all texts in a dataframe column (model_3 schema + engine)"""
+        results = self.analyze_texts(df[text_column].tolist())
+        self.results = results
+
+        df["sentiment"] = [r["sentiment"] for r in results]
+        df["rating"] = [r["rating"] for r in results]
+        df["confidence"] = [r["confidence"] for r in results]
+        df["sentiment_score"] = [r["score"] for r in results]
+        df["engine"] = [r["engine"] for r in results]
+        df["engine_confidence"] = [r["engine_confidence"] for r in results]
+
+        return df
+
+
+def accepts(confidence, threshold):
+    """The gate shared by the cascade and its calibration"""
+    return np.asarray(confidence) >= threshold
+
+
+def calibrate(texts, cheap="vader", target_agreement=0.95, min_rows=20,
+              cheap_engine=None, bert_engine=None):
+    """Pick the lowest threshold whose accepted rows agree with BERT at the target rate
+
+    Rows are ranked by cheap-engine confidence; the threshold is the
+    confidence of the last row of the largest top-ranked prefix whose
+    agreement with BERT is at least ``target_agreement``. A prefix may only
+    end between two different confidences, so the runtime gate accepts
+    exactly the rows that were measured (ties are never split).
+    """
+    cheap_engine = cheap_engine or get_engine(cheap)
+    bert_engine = bert_engine or BertEngine()
+
+    texts = [str(text) for text in texts if not pd.isna(text)]
+    labels, confidence = cheap_engine.predict(texts)
+    bert_results = bert_engine.analyze(texts)
+    bert_labels = np.array([r["sentiment"].lower() for r in bert_results], dtype=object)
+    bert_ratings = np.array([r["rating"] for r in bert_results])
+
+    confidence = np.asarray(confidence)
+    order = np.argsort(-confidence, kind="stable")
+    ranked = confidence[order]
+    agree = (labels == bert_labels)[order]
+    prefix_agreement = np.cumsum(agree) / np.arange(1, len(agree) + 1)
+
+    # Cut points: the last row of each run of equal confidences
+    cuts = np.flatnonzero(np.append(ranked[:-1] > ranked[1:], len(ranked) > 0))
+    passing = cuts[(prefix_agreement[cuts] >= target_agreement) & (cuts + 1 >= min_rows)]
+    if len(passing):
+        accepted = int(passing[-1]) + 1
+        threshold = float(ranked[accepted - 1])
+    else:
+        # Nothing meets the target: send every row to BERT
+        accepted = 0
+        threshold = float("inf")
+
+    accepted_rows = order[:accepted]
+    ratings = dict(DEFAULT_RATINGS)
+    for label in ratings:
+        label_rows = accepted_rows[labels[accepted_rows] == label]
+        if len(label_rows):
+            # Use BERT's most common star rating for confidently-labelled rows
+            values, counts = np.unique(bert_ratings[label_rows], return_counts=True)
+            ratings[label] = int(values[counts.argmax()])
+
+    calibration = {
+        "engine": cheap_engine.name,
+        "threshold": threshold,
+        "target_agreement": target_agreement,
+        "agreement": float(prefix_agreement[accepted - 1]) if accepted else None,
+        "coverage": accepted / len(texts) if texts else 0.0,
+        "overall_agreement": float(agree.mean()) if len(agree) else None,
+        "rows": len(texts),
+        "ratings": ratings,
+    }
+    return calibration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cheap-first sentiment cascade")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    calibrate_parser = subparsers.add_parser("calibrate")
+    calibrate_parser.add_argument("csv_path")
+    calibrate_parser.add_argument("--text-column", default="comment")
+    calibrate_parser.add_argument("--cheap", default="vader", choices=CHEAP_ENGINES)
+    calibrate_parser.add_argument("--target", type=float, default=0.95)
+    calibrate_parser.add_argument("--sample", type=int, default=None,
+                                  help="Calibrate on a random sample of rows")
+
+    analyze_parser = subparsers.add_parser("analyze")
+    analyze_parser.add_argument("csv_path")
+    analyze_parser.add_argument("--text-column", default="comment")
+    analyze_parser.add_argument("--cheap", default="vader", choices=CHEAP_ENGINES)
+    analyze_parser.add_argument("--threshold", type=float, default=None)
+    analyze_parser.add_argument("--default-threshold", action="store_true",
+                                help="Use the built-in threshold if not calibrated")
+    analyze_parser.add_argument("--batch-size", type=int, default=32)
+    analyze_parser.add_argument("--output", default=None)
+
+    args = parser.parse_args()
+    df = pd.read_csv(args.csv_path)
+    if args.text_column not in df.columns:
+        raise SystemExit(
+            f'Column "{args.text_column}" not found in CSV. '
+            f'Available columns: {", ".join(df.columns)}'
+        )
+
+    if args.command == "calibrate":
+        if args.sample and args.sample < len(df):
+            df = df.sample(n=args.sample, random_state=42)
+        calibration = calibrate(
+            df[args.text_column].tolist(), cheap=args.cheap, target_agreement=args.target
+        )
+        save_thresholds(calibration)
+        print(json.dumps(calibration, indent=2))
+        print(f"Thresholds saved to {THRESHOLDS_PATH}")
+    else:
+        analyzer = CascadeAnalyzer(
+            cheap=args.cheap, threshold=args.threshold, batch_size=args.batch_size,
+            use_defaults=args.default_threshold,
+        )
+        df = analyzer.analyze_dataframe(df, args.text_column)
+        output = args.output or f"cascade_{os.path.basename(args.csv_path)}"
+        df.to_csv(output, index=False)
+        print(df["engine"].value_counts().to_string())
+        print(f"Results saved to {output}")
@@ -0,0 +1,190 @@
+# engines.py
+"""Uniform access to the sentiment engines of every backend.
+
+Each backend directory is a standalone app (and two of them ship a module
+called ``sentiment_model``), so the engine modules are loaded by file path
+under unique names instead of through ``sys.path``. Their directory is on
+``sys.path`` only while they execute, for their uniquely named helper
+modules (``artifacts``, ``embedding_store``, ``registry``).
+
+Every engine exposes ``predict(texts)`` returning two numpy arrays: the
+lowercase sentiment label (positive/neutral/negative) of each text and a
+non-negative confidence whose scale is engine specific. ``artifacts()``
+lists the files that determine an engine's predictions, so results can be
+cached per artifact version without loading the engine.
+"""
+import hashlib
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+from model_registry import ModelRegistry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL1_DIR = os.path.join(BASE_DIR, "model 1")
+MODEL2_DIR = os.path.join(BASE_DIR, "model_2")
+MODEL3_DIR = os.path.join(BASE_DIR, "model_3")
+MODEL1_REGISTRY = os.path.join(MODEL1_DIR, "registry")
+
+
+def load_module(directory, filename, name):
+    """Import ``directory/filename`` as module ``name`` (once per process)"""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    path = os.path.join(directory, filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    sys.path.insert(0, directory)
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[name]
+        raise
+    finally:
+        sys.path.remove(directory)
+    return module
+
+
+def fingerprint(paths):
+    """Short hash of the path, size and mtime of each file (missing ones included)"""
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0".encode("utf-8"))
+        except FileNotFoundError:
+            digest.update(f"{path}\0missing\0".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class VaderEngine:
+    """model_2: VADER lexicon scores; confidence is ``abs(compound)``"""
+
+    name = "vader"
+
+    @staticmethod
+    def artifacts():
+        return [os.path.join(MODEL2_DIR, "sentiment_model.py")]
+
+    def __init__(self):
+        module = load_module(MODEL2_DIR, "sentiment_model.py", "model2_sentiment_model")
+        self.analyzer = module.FlexibleSentimentAnalyzer()
+
+    def predict(self, texts):
+        results = self.analyzer.analyze_texts(texts)
+        labels = np.array([r["sentiment"] for r in results], dtype=object)
+        compound = np.array([r["compound_score"] for r in results], dtype=np.float32)
+        return labels, np.abs(compound)
+
+
+class SvcEngine:
+    """model 1: TF-IDF + LinearSVC; confidence is the decision margin"""
+
+    name = "svc"
+
+    @staticmethod
+    def default_path():
+        """The pipeline app.py serves: the registry's CURRENT version, if any"""
+        registry = ModelRegistry(MODEL1_REGISTRY)
+        version = registry.current()
+        if version is not None:
+            return registry.model_path(version)
+        # An empty registry is seeded with this file when app.py starts
+        return os.path.join(MODEL1_DIR, "sentiment_model.joblib")
+
+    @classmethod
+    def artifacts(cls):
+        return [cls.default_path(), os.path.join(MODEL1_DIR, "sentiment_model.py")]
+
+    def __init__(self, model_path=None):
+        module = load_module(MODEL1_DIR, "sentiment_model.py", "model1_sentiment_model")
+        self.analyzer = module.SentimentAnalyzer()
+        self.analyzer.load_model(model_path or self.default_path())
+
+    def predict(self, texts):
+        labels, margins = self.analyzer.decision_margin(texts)
+        return np.asarray(labels, dtype=object), np.asarray(margins, dtype=np.float32)
+
+
+class MlpEngine:
+    """model 1: TF-IDF MLP run through TFLite; confidence is the top-class probability
+
+    Uses the distilled artifacts from ``distill.py`` when they exist.
+    """
+
+    name = "mlp"
+
+    @staticmethod
+    def default_paths():
+        models_dir = os.path.join(MODEL1_DIR, "models")
+        model_path = os.path.join(models_dir, "distilled_sentiment_model.tflite")
+        if os.path.exists(model_path):
+            return model_path, os.path.join(models_dir, "distilled_vectorizer.json")
+        return (
+            os.path.join(models_dir, "sentiment_model.tflite"),
+            os.path.join(models_dir, "vectorizer.json"),
+        )
+
+    @classmethod
+    def artifacts(cls):
+        return [*cls.default_paths(), os.path.join(MODEL1_DIR, "main.py")]
+
+    def __init__(self, model_path=None, vectorizer_path=None):
+        module = load_module(MODEL1_DIR, "main.py", "model1_main")
+        if model_path is None:
+            model_path, vectorizer_path = self.default_paths()
+
+        self.analyzer = module.SentimentAnalyzer()
+        self.analyzer.load_model(model_path, vectorizer_path)
+        decoder = {v: k for k, v in self.analyzer.label_encoder.items()}
+        self.classes = np.array([decoder[i] for i in range(len(decoder))], dtype=object)
+
+    def predict(self, texts):
+        probabilities = self.analyzer.predict_proba_lite([str(text) for text in texts])
+        return self.classes[probabilities.argmax(axis=1)], probabilities.max(axis=1)
+
+
+class BertEngine:
+    """model_3: nlptown BERT star ratings; confidence is the top-star probability"""
+
+    name = "bert"
+
+    @staticmethod
+    def artifacts():
+        # The Hugging Face model id is set in model.py
+        return [os.path.join(MODEL3_DIR, "model.py")]
+
+    def __init__(self, batch_size=32, long_documents=False):
+        module = load_module(MODEL3_DIR, "model.py", "model3_model")
+        self.analyzer = module.SentimentAnalyzer(long_documents=long_documents)
+        self.batch_size = batch_size
+
+    def analyze(self, texts):
+        """Full model_3 results (sentiment, rating, confidence, score)"""
+        return self.analyzer.analyze_batch(list(texts), batch_size=self.batch_size)
+
+    def predict(self, texts):
+        results = self.analyze(texts)
+        labels = np.array([r["sentiment"].lower() for r in results], dtype=object)
+        confidence = np.array([r["confidence"] for r in results], dtype=np.float32)
+        return labels, confidence
+
+
+ENGINES = {
+    VaderEngine.name: VaderEngine,
+    SvcEngine.name: SvcEngine,
+    MlpEngine.name: MlpEngine,
+    BertEngine.name: BertEngine,
+}
+
+
+def get_engine(name, **kwargs):
+    if name not in ENGINES:
+        raise ValueError(
+            f"Unknown engine '{name}'. Available engines are: {', '.join(ENGINES)}"
+        )
+    return ENGINES[name](**kwargs)
@@ -0,0 +1,291 @@
+# evaluate.py
+"""Side-by-side evaluation of every sentiment engine on a labelled CSV.
+
+Each engine scores the whole dataset in its own process, all engines at
+once, through its batched ``predict`` path. Predictions are cached in
+``.eval_cache/`` per engine, dataset hash and engine artifact version (the
+size and mtime of its model files), so re-running after retraining or
+changing one engine only re-scores that engine.
+
+Writes a JSON report with accuracy, macro F1, per-class precision / recall
+/ F1, the confusion matrix and the throughput of every engine, plus a grid
+of confusion matrices and an accuracy vs. throughput plot.
+
+Usage:
+    python evaluate.py labelled.csv --text-column text --label-column sentiment
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+
+from engines import ENGINES, BertEngine, VaderEngine, fingerprint, get_engine
+
+LABELS = ["positive", "neutral", "negative"]
+ENGINE_NAMES = list(ENGINES) + ["cascade"]
+CACHE_DIR = ".eval_cache"
+CHUNK_SIZE = 1024
+
+
+def dataset_hash(texts):
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def artifact_version(name):
+    """Fingerprint of the files an engine's (or the cascade's) predictions depend on"""
+    if name == "cascade":
+        import cascade
+
+        # The cascade runs VADER first (see load_engine), then BERT
+        paths = VaderEngine.artifacts() + BertEngine.artifacts()
+        return fingerprint(paths + [cascade.__file__, cascade.THRESHOLDS_PATH])
+    return fingerprint(ENGINES[name].artifacts())
+
+
+def load_engine(name, batch_size):
+    """``predict(texts) -> (labels, confidence)`` of an engine or the cascade"""
+    if name == "cascade":
+        from cascade import CascadeAnalyzer
+
+        analyzer = CascadeAnalyzer(batch_size=batch_size, use_defaults=True)
+
+        def predict(texts):
+            results = analyzer.analyze_texts(texts)
+            labels = np.array([r["sentiment"].lower() for r in results], dtype=object)
+            confidence = np.array([r["confidence"] for r in results], dtype=np.float32)
+            return labels, confidence
+
+        return predict
+
+    kwargs = {"batch_size": batch_size} if name == BertEngine.name else {}
+    return get_engine(name, **kwargs).predict
+
+
+def score_engine(name, texts, digest, batch_size=32, cache_dir=CACHE_DIR, refresh=False):
+    """Predictions and timings of one engine (runs in a worker process)"""
+    version = artifact_version(name)
+    cache_path = os.path.join(cache_dir, f"{name}-{digest[:16]}-{version}.npz")
+    if os.path.exists(cache_path) and not refresh:
+        with np.load(cache_path) as cached:
+            return {
+                "labels": cached["labels"].astype(object),
+                "confidence": cached["confidence"],
+                "load_seconds": float(cached["load_seconds"]),
+                "predict_seconds": float(cached["predict_seconds"]),
+                "cached": True,
+            }
+
+    start = time.perf_counter()
+    predict = load_engine(name, batch_size)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels, confidence = [], []
+    for offset in range(0, len(texts), CHUNK_SIZE):
+        chunk_labels, chunk_confidence = predict(texts[offset : offset + CHUNK_SIZE])
+        labels.append(np.asarray(chunk_labels, dtype=object))
+        confidence.append(np.asarray(chunk_confidence, dtype=np.float32))
+    predict_seconds = time.perf_counter() - start
+    labels = np.concatenate(labels) if labels else np.zeros(0, dtype=object)
+    confidence = np.concatenate(confidence) if confidence else np.zeros(0, dtype=np.float32)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path,
+        labels=labels.astype(str),
+        confidence=confidence,
+        load_seconds=load_seconds,
+        predict_seconds=predict_seconds,
+    )
+    os.replace(tmp_path, cache_path)
+
+    return {
+        "labels": labels,
+        "confidence": confidence,
+        "load_seconds": load_seconds,
+        "predict_seconds": predict_seconds,
+        "cached": False,
+    }
+
+
+def metrics(actual, predicted, scored):
+    precision, recall, f1, support = precision_recall_fscore_support(
+        actual, predicted, labels=LABELS, zero_division=0
+    )
+    rows = len(actual)
+    return {
+        "accuracy": float(accuracy_score(actual, predicted)),
+        "macro_f1": float(f1.mean()),
+        "per_class": {
+            label: {
+                "precision": float(p),
+                "recall": float(r),
+                "f1": float(f),
+                "support": int(s),
+            }
+            for label, p, r, f, s in zip(LABELS, precision, recall, f1, support)
+        },
+        "confusion_matrix": confusion_matrix(actual, predicted, labels=LABELS).tolist(),
+        "load_seconds": scored["load_seconds"],
+        "predict_seconds": scored["predict_seconds"],
+        "rows_per_second": rows / scored["predict_seconds"] if scored["predict_seconds"] else None,
+        "cached": scored["cached"],
+    }
+
+
+def plot_confusion_matrices(report, path):
+    names = [name for name, result in report["engines"].items() if "error" not in result]
+    if not names:
+        return
+    fig, axes = plt.subplots(1, len(names), figsize=(4.5 * len(names), 4.5), squeeze=False)
+    for ax, name in zip(axes[0], names):
+        cm = np.array(report["engines"][name]["confusion_matrix"])
+        ax.imshow(cm, cmap="Blues")
+        for i in range(len(LABELS)):
+            for j in range(len(LABELS)):
+                color = "white" if cm[i, j] > cm.max() / 2 else "black"
+                ax.text(j, i, cm[i, j], ha="center", va="center", color=color)
+        ax.set_xticks(range(len(LABELS)))
+        ax.set_xticklabels(LABELS)
+        ax.set_yticks(range(len(LABELS)))
+        ax.set_yticklabels(LABELS)
+        ax.set_xlabel("Predicted Sentiment")
+        ax.set_ylabel("Actual Sentiment")
+        ax.set_title(f"{name} (accuracy {report['engines'][name]['accuracy']:.2f})")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def plot_accuracy_vs_throughput(report, path):
+    points = [
+        (name, result["rows_per_second"], result["accuracy"])
+        for name, result in report["engines"].items()
+        if "error" not in result and result["rows_per_second"]
+    ]
+    if not points:
+        return
+    plt.figure(figsize=(8, 6))
+    for name, throughput, accuracy in points:
+        plt.scatter(throughput, accuracy, s=60)
+        plt.annotate(name, (throughput, accuracy), textcoords="offset points", xytext=(6, 6))
+    plt.xscale("log")
+    plt.xlabel("Throughput (rows/second, log scale)")
+    plt.ylabel("Accuracy")
+    plt.title("Accuracy vs. Throughput")
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
+
+
+def evaluate(csv_path, text_column="text", label_column="sentiment", engines=None,
+             batch_size=32, jobs=None, output="evaluation_report.json", refresh=False):
+    engines = engines or ENGINE_NAMES
+    df = pd.read_csv(csv_path)
+    for column in (text_column, label_column):
+        if column not in df.columns:
+            raise ValueError(
+                f'Column "{column}" not found in CSV. Available columns: {", ".join(df.columns)}'
+            )
+
+    df = df.dropna(subset=[text_column, label_column])
+    actual = df[label_column].astype(str).str.strip().str.lower()
+    known = actual.isin(LABELS)
+    if not known.all():
+        print(f"Skipping {int((~known).sum())} rows with labels outside {LABELS}")
+    texts = df.loc[known, text_column].astype(str).tolist()
+    actual = actual[known].to_numpy()
+    digest = dataset_hash(texts)
+    print(f"Evaluating {len(engines)} engines on {len(texts)} rows ({digest[:16]})")
+
+    report = {
+        "dataset": {
+            "path": os.path.abspath(csv_path),
+            "rows": len(texts),
+            "sha256": digest,
+            "label_counts": {label: int((actual == label).sum()) for label in LABELS},
+        },
+        "labels": LABELS,
+        "engines": {},
+    }
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs or len(engines)) as executor:
+        futures = {
+            executor.submit(score_engine, name, texts, digest, batch_size, CACHE_DIR, refresh): name
+            for name in engines
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                scored = future.result()
+            except Exception as e:
+                print(f"{name}: failed ({str(e)})")
+                report["engines"][name] = {"error": str(e)}
+                continue
+            report["engines"][name] = metrics(actual, scored["labels"], scored)
+            source = "cache" if scored["cached"] else f"{scored['predict_seconds']:.1f}s"
+            print(f"{name}: accuracy {report['engines'][name]['accuracy']:.3f} ({source})")
+    report["wall_seconds"] = time.perf_counter() - start
+
+    # Keep the engines in the requested order
+    report["engines"] = {name: report["engines"][name] for name in engines}
+
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    base = os.path.splitext(output)[0]
+    plot_confusion_matrices(report, f"{base}_confusion.png")
+    plot_accuracy_vs_throughput(report, f"{base}_cost.png")
+
+    print(f"\n{'engine':<10}{'accuracy':>10}{'macro F1':>10}{'rows/s':>12}")
+    for name, result in report["engines"].items():
+        if "error" in result:
+            print(f"{name:<10}{'error':>10}")
+            continue
+        throughput = result["rows_per_second"] or 0.0
+        print(f"{name:<10}{result['accuracy']:>10.3f}{result['macro_f1']:>10.3f}{throughput:>12.1f}")
+    print(f"\nReport saved to {output}, figures to {base}_confusion.png and {base}_cost.png")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate every engine on a labelled CSV")
+    parser.add_argument("csv_path")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="sentiment")
+    parser.add_argument("--engines", nargs="+", default=ENGINE_NAMES, choices=ENGINE_NAMES)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Worker processes (default: one per engine)")
+    parser.add_argument("--output", default="evaluation_report.json")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Ignore cached predictions")
+    args = parser.parse_args()
+
+    evaluate(
+        args.csv_path,
+        text_column=args.text_column,
+        label_column=args.label_column,
+        engines=args.engines,
+        batch_size=args.batch_size,
+        jobs=args.jobs,
+        output=args.output,
+        refresh=args.refresh,
+    )
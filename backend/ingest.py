@@ -0,0 +1,420 @@
+# ingest.py
+"""Continuous stream ingestion of reviews with durable checkpoints.
+
+Tails append-only JSONL/CSV files in a watched directory (a local stand-in
+for a message queue), scores new records in micro-batches with any of the
+engines in engines.py (or the cascade) and appends the results to a JSONL
+sink.
+
+Every output line records the source file and byte offset it came from.
+After each batch the sink is fsynced first and the checkpoint (source
+offsets plus sink length) is then replaced atomically. On restart, lines
+found in the sink past the checkpointed length are rolled forward into the
+offsets instead of being rescored, and a torn last line is cut off, so
+records are neither dropped nor scored twice.
+
+CSV files are parsed with one csv reader per read, so quoted fields may
+span lines; a file offset only ever advances past complete records.
+
+Usage:
+    python ingest.py incoming/ --output scored.jsonl --engine vader
+"""
+import argparse
+import csv
+import fnmatch
+import json
+import logging
+import os
+import signal
+import time
+
+from engines import get_engine
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("ingest")
+
+PATTERNS = ("*.jsonl", "*.csv")
+
+
+def fsync_write(path, data):
+    """Atomically replace ``path`` with ``data`` and make it durable"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class CascadeEngine:
+    """Adapter so the cascade can be used like an engine"""
+
+    name = "cascade"
+
+    def __init__(self, cheap="vader"):
+        from cascade import CascadeAnalyzer
+
+        # A long-running worker starts from the built-in threshold until calibrated
+        self.analyzer = CascadeAnalyzer(cheap=cheap, use_defaults=True)
+
+    def analyze(self, texts):
+        return self.analyzer.analyze_texts(texts)
+
+
+class IngestWorker:
+    def __init__(self, watch_dir, output_path, checkpoint_path=None, engine="vader",
+                 text_field="comment", batch_size=64, max_wait=1.0,
+                 poll_interval=0.5, metrics_path=None, metrics_interval=10.0,
+                 patterns=PATTERNS):
+        self.watch_dir = watch_dir
+        self.output_path = output_path
+        self.checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.json"
+        self.metrics_path = metrics_path
+        self.text_field = text_field
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.patterns = patterns
+
+        self.engine = CascadeEngine() if engine == "cascade" else get_engine(engine)
+        self.files = {}  # name -> {"offset", "inode", "header", "records"}
+        self.records_total = 0
+        self.running = False
+
+        self.started = time.time()
+        self.window_start = time.time()
+        self.window_records = 0
+        self.last_batch_seconds = 0.0
+
+    # Checkpointing ----------------------------------------------------------
+
+    def load_checkpoint(self):
+        sink_offset = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r") as f:
+                state = json.load(f)
+            self.files = state["files"]
+            self.records_total = state["records_total"]
+            sink_offset = state["sink_offset"]
+            logger.info(
+                f"Resuming from checkpoint: {self.records_total} records, "
+                f"{len(self.files)} files"
+            )
+        self.recover_sink(sink_offset)
+
+    def recover_sink(self, sink_offset):
+        """Roll forward sink lines written after the last checkpoint"""
+        if not os.path.exists(self.output_path):
+            open(self.output_path, "w").close()
+            return
+
+        with open(self.output_path, "r+b") as f:
+            f.seek(sink_offset)
+            good_offset = sink_offset
+            recovered = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    source = json.loads(line)["_source"]
+                except (ValueError, KeyError):
+                    break
+                state = self.files.setdefault(
+                    source["file"], {"offset": 0, "inode": None, "header": None, "records": 0}
+                )
+                state["offset"] = source["end"]
+                if source.get("inode") is not None:
+                    state["inode"] = source["inode"]
+                if source.get("header") is not None:
+                    state["header"] = source["header"]
+                state["records"] += 1
+                good_offset += len(line)
+                recovered += 1
+
+            if good_offset < os.path.getsize(self.output_path):
+                logger.warning("Truncating a partially written record from the sink")
+                f.truncate(good_offset)
+
+        self.records_total += recovered
+        if recovered:
+            logger.info(f"Recovered {recovered} records written after the last checkpoint")
+            self.save_checkpoint(good_offset)
+
+    def save_checkpoint(self, sink_offset):
+        fsync_write(
+            self.checkpoint_path,
+            json.dumps(
+                {
+                    "files": self.files,
+                    "records_total": self.records_total,
+                    "sink_offset": sink_offset,
+                    "saved_at": time.time(),
+                },
+                indent=2,
+            ),
+        )
+
+    # Tailing ----------------------------------------------------------------
+
+    def watched_files(self):
+        names = []
+        for name in sorted(os.listdir(self.watch_dir)):
+            if any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+                names.append(name)
+        return names
+
+    def file_state(self, name):
+        path = os.path.join(self.watch_dir, name)
+        stat = os.stat(path)
+        state = self.files.setdefault(
+            name, {"offset": 0, "inode": stat.st_ino, "header": None, "records": 0}
+        )
+        if state["inode"] != stat.st_ino or stat.st_size < state["offset"]:
+            # The file was replaced or truncated: start over from its beginning
+            logger.warning(f"{name} was replaced or truncated, reading it from the start")
+            state.update({"offset": 0, "inode": stat.st_ino, "header": None})
+        return path, stat, state
+
+    @staticmethod
+    def iter_lines(f, position):
+        """Complete lines of ``f`` (a partial line is still being written)
+
+        ``position["offset"]`` follows the end of the last line handed out,
+        and ``position["eof"]`` is set once no complete line is left.
+        """
+        while True:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                position["eof"] = True
+                return
+            position["offset"] += len(line)
+            yield line.decode("utf-8", errors="replace")
+
+    def iter_csv(self, f, position):
+        """(values, end offset) of each complete CSV record
+
+        The reader pulls lines only until a record is complete, so the
+        offset after each record is exactly where the next one starts. A
+        record cut short by the end of the data (e.g. an open quoted field)
+        is dropped, to be read again once the rest has been written.
+        """
+        for values in csv.reader(self.iter_lines(f, position)):
+            if position["eof"]:
+                return
+            yield values, position["offset"]
+
+    def iter_jsonl(self, f, position):
+        for line in self.iter_lines(f, position):
+            yield line.rstrip("\r\n"), position["offset"]
+
+    def read_records(self, limit):
+        """Read up to ``limit`` complete new records across all watched files"""
+        records = []
+        for name in self.watched_files():
+            if len(records) >= limit:
+                break
+            path, stat, state = self.file_state(name)
+            if stat.st_size <= state["offset"]:
+                continue
+
+            is_csv = name.endswith(".csv")
+            header = state["header"]
+            position = {"offset": state["offset"], "eof": False}
+            with open(path, "rb") as f:
+                f.seek(position["offset"])
+                parsed = self.iter_csv(f, position) if is_csv else self.iter_jsonl(f, position)
+                for value, end in parsed:
+                    if is_csv:
+                        if not value:
+                            continue
+                        if header is None:
+                            # The header carries no record; remember it with the offset
+                            header = value
+                            state["header"] = header
+                            state["offset"] = end
+                            continue
+                        record = dict(zip(header, value))
+                    else:
+                        if not value.strip():
+                            continue
+                        try:
+                            record = json.loads(value)
+                        except ValueError as e:
+                            record = {"_error": f"Invalid JSON: {e}", "_raw": value}
+
+                    records.append(
+                        {
+                            "file": name,
+                            "end": end,
+                            "inode": stat.st_ino,
+                            "header": header if is_csv else None,
+                            "record": record,
+                        }
+                    )
+                    if len(records) >= limit:
+                        break
+        return records
+
+    # Scoring ----------------------------------------------------------------
+
+    def score(self, texts):
+        if hasattr(self.engine, "analyze"):
+            return [dict(result) for result in self.engine.analyze(texts)]
+        labels, confidence = self.engine.predict(texts)
+        return [
+            {"sentiment": str(label), "confidence": float(conf)}
+            for label, conf in zip(labels, confidence)
+        ]
+
+    def process_batch(self, items, sink):
+        start = time.perf_counter()
+        scorable = [
+            i for i, item in enumerate(items)
+            if isinstance(item["record"], dict) and "_error" not in item["record"]
+            and item["record"].get(self.text_field) not in (None, "")
+        ]
+        results = {}
+        if scorable:
+            texts = [str(items[i]["record"][self.text_field]) for i in scorable]
+            results = dict(zip(scorable, self.score(texts)))
+
+        lines = []
+        for i, item in enumerate(items):
+            output = dict(item["record"]) if isinstance(item["record"], dict) else {
+                "_raw": item["record"]
+            }
+            if i in results:
+                output.update(results[i])
+                output["engine"] = output.get("engine", self.engine.name)
+            elif "_error" not in output:
+                output["_error"] = f"Missing '{self.text_field}' field"
+            output["_source"] = {
+                "file": item["file"],
+                "end": item["end"],
+                "inode": item["inode"],
+                "header": item["header"],
+            }
+            lines.append(json.dumps(output) + "\n")
+
+        # Results must be durable before the offsets that cover them
+        sink.write("".join(lines).encode("utf-8"))
+        sink.flush()
+        os.fsync(sink.fileno())
+
+        for item in items:
+            state = self.files[item["file"]]
+            state["offset"] = item["end"]
+            state["header"] = item["header"]
+            state["records"] += 1
+        self.records_total += len(items)
+        self.save_checkpoint(sink.tell())
+
+        self.window_records += len(items)
+        self.last_batch_seconds = time.perf_counter() - start
+
+    # Metrics ----------------------------------------------------------------
+
+    def metrics(self):
+        lag = {}
+        for name in self.watched_files():
+            try:
+                size = os.path.getsize(os.path.join(self.watch_dir, name))
+            except OSError:
+                continue
+            offset = self.files.get(name, {}).get("offset", 0)
+            lag[name] = max(size - offset, 0)
+
+        now = time.time()
+        elapsed = now - self.window_start
+        metrics = {
+            "records_total": self.records_total,
+            "throughput_rps": self.window_records / elapsed if elapsed else 0.0,
+            "last_batch_seconds": self.last_batch_seconds,
+            "lag_bytes": sum(lag.values()),
+            "lag_bytes_by_file": lag,
+            "uptime_seconds": now - self.started,
+        }
+        self.window_start = now
+        self.window_records = 0
+        return metrics
+
+    def report_metrics(self):
+        metrics = self.metrics()
+        logger.info(
+            f"{metrics['records_total']} records, {metrics['throughput_rps']:.1f} rec/s, "
+            f"lag {metrics['lag_bytes']} bytes"
+        )
+        if self.metrics_path:
+            fsync_write(self.metrics_path, json.dumps(metrics, indent=2))
+
+    # Main loop --------------------------------------------------------------
+
+    def stop(self, signum=None, frame=None):
+        logger.info("Stopping after the current batch...")
+        self.running = False
+
+    def run(self):
+        self.load_checkpoint()
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        last_metrics = time.time()
+        with open(self.output_path, "ab") as sink:
+            while self.running:
+                # Micro-batch: wait up to max_wait for a full batch
+                items = self.read_records(self.batch_size)
+                deadline = time.time() + self.max_wait
+                while items and len(items) < self.batch_size and time.time() < deadline:
+                    time.sleep(min(self.poll_interval, self.max_wait))
+                    items = self.read_records(self.batch_size)
+
+                if items:
+                    self.process_batch(items, sink)
+                else:
+                    time.sleep(self.poll_interval)
+
+                if time.time() - last_metrics >= self.metrics_interval:
+                    self.report_metrics()
+                    last_metrics = time.time()
+
+        self.report_metrics()
+        logger.info("Ingestion stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tail review files and score them")
+    parser.add_argument("watch_dir")
+    parser.add_argument("--output", default="scored.jsonl")
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--engine", default="vader",
+                        choices=["vader", "svc", "mlp", "bert", "cascade"])
+    parser.add_argument("--text-field", default="comment")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--max-wait", type=float, default=1.0,
+                        help="Seconds to wait for a batch to fill up")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--metrics", default=None, help="Write metrics JSON here")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    args = parser.parse_args()
+
+    IngestWorker(
+        args.watch_dir,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        engine=args.engine,
+        text_field=args.text_field,
+        batch_size=args.batch_size,
+        max_wait=args.max_wait,
+        poll_interval=args.poll_interval,
+        metrics_path=args.metrics,
+        metrics_interval=args.metrics_interval,
+    ).run()
@@ -0,0 +1,605 @@
+# loadtest.py
+"""Load-testing harness for the HTTP backends.
+
+Starts a backend on localhost with its engine swapped for a deterministic
+stub (so it runs offline and measures the serving path, not the model),
+drives it with concurrent clients using a configurable request mix and
+payloads sampled from the model_3 sample CSVs, and writes a JSON report
+with throughput, latency percentiles, error rates and server RSS over time.
+Any non-2xx response counts as an error; the run exits non-zero when an
+endpoint's error rate is above ``--max-error-rate``.
+
+Usage:
+    python loadtest.py run model3 --concurrency 8 --duration 30
+    python loadtest.py run model1 --mix batch=1 --batch-size 50
+    python loadtest.py run model3 --mix analyze=3,download=1 --rows 200
+    python loadtest.py run model2 --url http://127.0.0.1:5000 --pid 1234
+"""
+import argparse
+import csv
+import glob
+import http.client
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+from prefork import read_memory
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CSVS = os.path.join(BASE_DIR, "model_3", "uploads", "*.csv")
+
+TARGETS = {
+    "model1": {"dir": "model 1", "module": "app.py", "endpoints": ["batch"]},
+    "model2": {"dir": "model_2", "module": "main.py", "endpoints": ["analyze"]},
+    "model3": {"dir": "model_3", "module": "main.py", "endpoints": ["analyze", "download"]},
+}
+
+POSITIVE_WORDS = {"great", "love", "amazing", "excellent", "good", "fantastic",
+                  "perfect", "engaging", "happy", "best"}
+NEGATIVE_WORDS = {"boring", "bad", "worst", "terrible", "poor", "broke",
+                  "disappointed", "waste", "awful", "too"}
+
+
+# ---------------------------------------------------------------------------
+# Deterministic stub engines (server side)
+# ---------------------------------------------------------------------------
+
+
+def stub_stars(text, latency):
+    """1-5 stars from a tiny keyword lexicon, plus optional simulated work"""
+    if latency:
+        time.sleep(latency)
+    words = str(text).lower().split()
+    balance = sum(w.strip(".,!?") in POSITIVE_WORDS for w in words) - sum(
+        w.strip(".,!?") in NEGATIVE_WORDS for w in words
+    )
+    return max(1, min(5, 3 + balance))
+
+
+def stub_sentiment(text, latency):
+    stars = stub_stars(text, latency)
+    return "positive" if stars >= 4 else "negative" if stars <= 2 else "neutral"
+
+
+def install_stubs(target, latency):
+    """Replace the target's engine dependency in ``sys.modules``"""
+    if target == "model1":
+        module = types.ModuleType("sentiment_model")
+
+        class StubPipeline:
+            """What the registry's warm-up check inspects"""
+
+            def predict_proba(self, texts):
+                return [[0.2, 0.3, 0.5] for _ in texts]
+
+        class SentimentAnalyzer:
+            model = None
+
+            def load_model(self, path, mmap_mode=None):
+                self.model = StubPipeline()
+
+            def preprocess_text(self, text):
+                return str(text).lower()
+
+            def predict(self, text):
+                return stub_sentiment(text, latency)
+
+            def predict_batch(self, texts):
+                return [stub_sentiment(text, latency) for text in texts]
+
+        module.SentimentAnalyzer = SentimentAnalyzer
+        sys.modules["sentiment_model"] = module
+
+    elif target == "model2":
+        module = types.ModuleType("sentiment_model")
+
+        class FlexibleSentimentAnalyzer:
+            def analyze_text(self, text):
+                stars = stub_stars(text, latency)
+                compound = (stars - 3) / 2
+                return {
+                    "sentiment": stub_sentiment(text, 0),
+                    "compound_score": compound,
+                    "positive_score": max(compound, 0.0),
+                    "negative_score": max(-compound, 0.0),
+                    "neutral_score": 1 - abs(compound),
+                }
+
+        module.FlexibleSentimentAnalyzer = FlexibleSentimentAnalyzer
+        sys.modules["sentiment_model"] = module
+
+    elif target == "model3":
+        # Keep the real model.py (result container, plots, report) and only
+        # swap the transformers pipeline for a keyword scorer
+        module = types.ModuleType("transformers")
+
+        def pipeline(task, model=None, **kwargs):
+            def classify(texts, **call_kwargs):
+                single = isinstance(texts, str)
+                outputs = []
+                for text in [texts] if single else texts:
+                    stars = stub_stars(text, latency)
+                    outputs.append(
+                        {"label": f"{stars} star{'s' if stars > 1 else ''}", "score": 0.9}
+                    )
+                return outputs
+
+            return classify
+
+        module.pipeline = pipeline
+        sys.modules["transformers"] = module
+
+
+def scratch_environment(target, scratch):
+    """Settings that keep a stubbed server's registry and outputs in ``scratch``"""
+    environment = {"MODEL_REGISTRY": os.path.join(scratch, "registry")}
+    if target == "model1":
+        # The app seeds its empty registry from this file; the stub analyzer
+        # never reads it
+        stub_model = os.path.join(scratch, "sentiment_model.joblib")
+        with open(stub_model, "wb") as f:
+            f.write(b"stub")
+        environment["LEGACY_MODEL_PATH"] = stub_model
+    elif target == "model3":
+        environment["UPLOAD_FOLDER"] = os.path.join(scratch, "uploads")
+        environment["RESULTS_FOLDER"] = os.path.join(scratch, "results")
+        environment["REPORT_FOLDER"] = scratch
+    return environment
+
+
+def serve(target, port, latency, real_engines=False):
+    config = TARGETS[target]
+    app_dir = os.path.join(BASE_DIR, config["dir"])
+
+    if real_engines:
+        # The real engines load their artifacts relative to the app directory
+        os.chdir(app_dir)
+    else:
+        install_stubs(target, latency)
+        # The registry, uploads and results go to a scratch directory, not
+        # the repository
+        scratch = tempfile.mkdtemp(prefix=f"loadtest_{target}_")
+        os.environ.update(scratch_environment(target, scratch))
+    sys.path.insert(0, app_dir)
+    module_name = os.path.splitext(config["module"])[0]
+    spec = importlib.util.spec_from_file_location(
+        module_name, os.path.join(app_dir, config["module"])
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+
+    if target == "model1":
+        import uvicorn
+
+        uvicorn.run(module.app, host="127.0.0.1", port=port, log_level="warning")
+    elif target == "model2":
+        from waitress import serve as waitress_serve
+
+        waitress_serve(module.app, host="127.0.0.1", port=port, threads=8)
+    else:
+        module.app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+# ---------------------------------------------------------------------------
+# Load generator (client side)
+# ---------------------------------------------------------------------------
+
+
+def load_samples(pattern=SAMPLE_CSVS):
+    rows = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows.extend(csv.DictReader(f))
+    if not rows:
+        raise SystemExit(f"No sample rows found in {pattern}")
+    return rows
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def parse_mix(value, endpoints):
+    if not value:
+        return {endpoint: 1.0 for endpoint in endpoints}
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in endpoints:
+            raise SystemExit(
+                f"Unknown endpoint '{name}'. Available endpoints: {', '.join(endpoints)}"
+            )
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoadGenerator:
+    def __init__(self, target, host, port, samples, mix, batch_size=20, rows=100,
+                 timeout=60.0, seed=42):
+        self.target = target
+        self.host = host
+        self.port = port
+        self.samples = samples
+        self.mix = mix
+        self.batch_size = batch_size
+        self.rows = rows
+        self.timeout = timeout
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = defaultdict(Counter)
+        self.result_files = []
+
+    # Payload builders -------------------------------------------------------
+
+    def texts(self, rng, count):
+        return [rng.choice(self.samples)["comment"] for _ in range(count)]
+
+    def csv_payload(self, rng):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(self.samples[0].keys()))
+        writer.writeheader()
+        for _ in range(self.rows):
+            writer.writerow(rng.choice(self.samples))
+        return buffer.getvalue().encode("utf-8")
+
+    def build_request(self, endpoint, rng):
+        """Return (method, path, body, headers) or None if not possible yet"""
+        if endpoint == "batch":
+            body = json.dumps({"texts": self.texts(rng, self.batch_size)}).encode("utf-8")
+            return "POST", "/batch", body, {"Content-Type": "application/json"}
+
+        if endpoint == "analyze" and self.target == "model2":
+            body = json.dumps({"text": self.texts(rng, 1)[0]}).encode("utf-8")
+            return "POST", "/analyze", body, {"Content-Type": "application/json"}
+
+        if endpoint == "analyze":
+            boundary = uuid.uuid4().hex
+            body = b"".join(
+                [
+                    f"--{boundary}\r\n".encode(),
+                    b'Content-Disposition: form-data; name="text_column"\r\n\r\n',
+                    b"comment\r\n",
+                    f"--{boundary}\r\n".encode(),
+                    b'Content-Disposition: form-data; name="file"; filename="load.csv"\r\n',
+                    b"Content-Type: text/csv\r\n\r\n",
+                    self.csv_payload(rng),
+                    f"\r\n--{boundary}--\r\n".encode(),
+                ]
+            )
+            headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            return "POST", "/analyze", body, headers
+
+        if endpoint == "download":
+            with self.lock:
+                if not self.result_files:
+                    return None
+                filename = rng.choice(self.result_files)
+            return "GET", f"/download/{filename}", None, {}
+
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+    # Workers ----------------------------------------------------------------
+
+    def worker(self, index, deadline, max_requests, counter):
+        rng = random.Random(self.seed + index)
+        endpoints = list(self.mix)
+        weights = [self.mix[e] for e in endpoints]
+        connection = None
+
+        while time.time() < deadline:
+            with self.lock:
+                if max_requests and counter[0] >= max_requests:
+                    return
+                counter[0] += 1
+
+            endpoint = rng.choices(endpoints, weights)[0]
+            request = self.build_request(endpoint, rng)
+            if request is None:
+                # Nothing to download yet, analyze first
+                endpoint = "analyze"
+                request = self.build_request(endpoint, rng)
+            method, path, body, headers = request
+
+            start = time.perf_counter()
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(
+                        self.host, self.port, timeout=self.timeout
+                    )
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                elapsed = time.perf_counter() - start
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.latencies[endpoint].append(elapsed)
+                    self.errors[endpoint][type(e).__name__] += 1
+                if connection is not None:
+                    connection.close()
+                connection = None
+                continue
+
+            with self.lock:
+                self.latencies[endpoint].append(elapsed)
+                self.statuses[endpoint][status] += 1
+                if not 200 <= status < 300:
+                    self.errors[endpoint][f"HTTP {status}"] += 1
+                elif endpoint == "analyze" and self.target == "model3":
+                    try:
+                        self.result_files.append(json.loads(payload)["result_file"])
+                    except (ValueError, KeyError):
+                        pass
+
+        if connection is not None:
+            connection.close()
+
+    def run(self, concurrency, duration, max_requests=None):
+        deadline = time.time() + duration
+        counter = [0]
+        threads = [
+            threading.Thread(
+                target=self.worker, args=(i, deadline, max_requests, counter), daemon=True
+            )
+            for i in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def summary(self, elapsed):
+        endpoints = {}
+        all_latencies = []
+        for endpoint, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            all_latencies.extend(latencies)
+            errors = sum(self.errors[endpoint].values())
+            endpoints[endpoint] = summarize(latencies, errors, elapsed)
+            endpoints[endpoint]["status_codes"] = {
+                str(k): v for k, v in self.statuses[endpoint].items()
+            }
+            endpoints[endpoint]["error_types"] = dict(self.errors[endpoint])
+
+        total_errors = sum(sum(e.values()) for e in self.errors.values())
+        return {
+            "overall": summarize(sorted(all_latencies), total_errors, elapsed),
+            "endpoints": endpoints,
+        }
+
+
+def summarize(latencies, errors, elapsed):
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": sum(latencies) / count * 1000 if count else None,
+            "p50": percentile(latencies, 50) * 1000 if count else None,
+            "p95": percentile(latencies, 95) * 1000 if count else None,
+            "p99": percentile(latencies, 99) * 1000 if count else None,
+            "max": latencies[-1] * 1000 if count else None,
+        },
+    }
+
+
+class MemorySampler(threading.Thread):
+    """Samples the server's memory every ``interval`` seconds"""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        start = time.time()
+        while not self.stopped.is_set():
+            stats = read_memory(self.pid)
+            if stats:
+                self.samples.append({"t": round(time.time() - start, 2), **stats})
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(host, port, process=None, timeout=120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server on {host}:{port} did not start within {timeout}s")
+
+
+def run_load_test(args):
+    config = TARGETS[args.target]
+    mix = parse_mix(args.mix, config["endpoints"])
+    samples = load_samples(args.samples)
+
+    process = None
+    if args.url:
+        parsed = urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+        pid = args.pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        command = [
+            sys.executable, os.path.abspath(__file__), "serve", args.target,
+            "--port", str(port), "--stub-latency-ms", str(args.stub_latency_ms),
+        ]
+        if args.real_engines:
+            command.append("--real-engines")
+        process = subprocess.Popen(command)
+        pid = process.pid
+
+    try:
+        wait_until_ready(host, port, process)
+        sampler = MemorySampler(pid, args.memory_interval) if pid else None
+        if sampler:
+            sampler.start()
+
+        generator = LoadGenerator(
+            args.target, host, port, samples, mix,
+            batch_size=args.batch_size, rows=args.rows, seed=args.seed,
+        )
+        if args.warmup:
+            generator.run(args.concurrency, args.warmup)
+            generator = LoadGenerator(
+                args.target, host, port, samples, mix,
+                batch_size=args.batch_size, rows=args.rows, seed=args.seed,
+            )
+
+        elapsed = generator.run(args.concurrency, args.duration, args.requests)
+        if sampler:
+            sampler.stop()
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    memory = sampler.samples if sampler else []
+    report = {
+        "target": args.target,
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "max_requests": args.requests,
+            "mix": mix,
+            "batch_size": args.batch_size,
+            "rows": args.rows,
+            "stub_latency_ms": None if args.real_engines else args.stub_latency_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "elapsed_seconds": elapsed,
+        **generator.summary(elapsed),
+        "server_memory": {
+            "peak_rss_kb": max((s["rss_kb"] for s in memory), default=None),
+            "samples": memory,
+        },
+    }
+
+    report["failed_endpoints"] = sorted(
+        endpoint
+        for endpoint, stats in report["endpoints"].items()
+        if stats["error_rate"] > args.max_error_rate
+    )
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    overall = report["overall"]
+    print(
+        f"{args.target}: {overall['requests']} requests in {elapsed:.1f}s "
+        f"({overall['throughput_rps']:.1f} req/s), error rate {overall['error_rate']:.2%}"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(
+            f"  {endpoint}: p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+            f"p99 {latency['p99']:.1f} ms"
+        )
+    print(f"Report saved to {args.output}")
+    return report
+
+
+def check_report(report):
+    """Exit non-zero if an endpoint's non-2xx rate is above the limit"""
+    for endpoint in report["failed_endpoints"]:
+        stats = report["endpoints"][endpoint]
+        print(
+            f"FAILED {endpoint}: error rate {stats['error_rate']:.2%} > "
+            f"{report['config']['max_error_rate']:.2%} ({stats['error_types']})"
+        )
+    if report["failed_endpoints"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the sentiment backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Start a server and drive load")
+    run_parser.add_argument("target", choices=list(TARGETS))
+    run_parser.add_argument("--concurrency", type=int, default=4)
+    run_parser.add_argument("--duration", type=float, default=30.0)
+    run_parser.add_argument("--requests", type=int, default=None,
+                            help="Stop after this many requests")
+    run_parser.add_argument("--warmup", type=float, default=2.0)
+    run_parser.add_argument("--mix", default=None,
+                            help="Endpoint weights, e.g. analyze=3,download=1")
+    run_parser.add_argument("--batch-size", type=int, default=20,
+                            help="Texts per model1 /batch request")
+    run_parser.add_argument("--rows", type=int, default=100,
+                            help="CSV rows per model3 /analyze upload")
+    run_parser.add_argument("--samples", default=SAMPLE_CSVS)
+    run_parser.add_argument("--stub-latency-ms", type=float, default=0.0,
+                            help="Simulated model time per text")
+    run_parser.add_argument("--real-engines", action="store_true",
+                            help="Use the real models instead of stubs")
+    run_parser.add_argument("--url", default=None,
+                            help="Target an already running server instead")
+    run_parser.add_argument("--pid", type=int, default=None,
+                            help="Server pid to sample memory from (with --url)")
+    run_parser.add_argument("--memory-interval", type=float, default=0.5)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--output", default="loadtest_report.json")
+    run_parser.add_argument("--max-error-rate", type=float, default=0.0,
+                            help="Fail if an endpoint's non-2xx rate is above this")
+
+    serve_parser = subparsers.add_parser("serve", help="Run a backend with stub engines")
+    serve_parser.add_argument("target", choices=list(TARGETS))
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--stub-latency-ms", type=float, default=0.0)
+    serve_parser.add_argument("--real-engines", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args.target, args.port, args.stub_latency_ms / 1000, args.real_engines)
+    else:
+        check_report(run_load_test(args))
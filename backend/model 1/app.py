@@ -1,10 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from collections import Counter
 from sentiment_model import SentimentAnalyzer
+from registry import REGISTRY_DIR, ModelRegistry, HotModel
+import hmac
+import json
+import os
+import time
 import uvicorn
 
+try:
+    import orjson
+
+    def ndjson_line(obj):
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+except ImportError:
+
+    def ndjson_line(obj):
+        return (json.dumps(obj) + "\n").encode("utf-8")
+
 app = FastAPI()
 
 # Add CORS middleware
@@ -14,14 +32,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Model-Version"],
 )
 
-# Initialize model
-analyzer = SentimentAnalyzer()
+# Model written by the training scripts; it only seeds an empty registry
+LEGACY_MODEL_PATH = os.environ.get("LEGACY_MODEL_PATH", "sentiment_model.joblib")
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY", REGISTRY_DIR)
+# Admin endpoints require this token in X-Admin-Token; without it they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# Initialize model from the registry (see registry.py)
+registry = ModelRegistry(MODEL_REGISTRY)
+model = HotModel(registry, SentimentAnalyzer())
+if registry.current() is None and os.path.exists(LEGACY_MODEL_PATH):
+    # Seed an empty registry with the model saved by the training scripts
+    metadata = registry.register(LEGACY_MODEL_PATH, note="imported at startup")
+    registry.set_current(metadata["version"])
 try:
-    analyzer.load_model("sentiment_model.joblib")
-except:
-    print("Warning: Could not load model")
+    if model.load_current() is None:
+        print("Warning: No model version registered; /batch returns 503 until one is activated")
+except Exception as e:
+    print(f"Error loading model version {registry.current()}: {str(e)}")
+    model.error = str(e)
+
+
+@app.middleware("http")
+async def add_model_version(request: Request, call_next):
+    response = await call_next(request)
+    # Prefer the version that actually served the request
+    version = getattr(request.state, "model_version", None)
+    if version is None and model.active is not None:
+        version = model.active[0]
+    if version is not None:
+        response.headers["X-Model-Version"] = version
+    return response
+
+
+def serving_model(request):
+    served = model.get()
+    if served is None:
+        raise HTTPException(status_code=503, detail="No model loaded")
+    request.state.model_version = served[0]
+    return served
+
+
+def check_admin(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
 
 
 class TextInput(BaseModel):
@@ -42,8 +101,49 @@ async def test():
     return {"status": "ok"}
 
 
+def stream_batch(texts, chunk_size, analyzer, version):
+    """Yield one NDJSON line per result as each chunk is scored, then a summary"""
+    start = time.perf_counter()
+    counts = Counter()
+    try:
+        for offset in range(0, len(texts), chunk_size):
+            predictions = analyzer.predict_batch(texts[offset : offset + chunk_size])
+            lines = []
+            for index, sentiment in enumerate(predictions, start=offset):
+                sentiment = str(sentiment)
+                counts[sentiment] += 1
+                lines.append(ndjson_line({"index": index, "sentiment": sentiment}))
+            yield b"".join(lines)
+    except Exception as e:
+        print(f"Error streaming batch: {str(e)}")
+        yield ndjson_line({"error": str(e)})
+        return
+
+    yield ndjson_line(
+        {
+            "summary": {
+                "count": sum(counts.values()),
+                "model_version": version,
+                "sentiment_counts": dict(counts),
+                "elapsed_seconds": time.perf_counter() - start,
+            }
+        }
+    )
+
+
 @app.post("/batch")
-async def analyze_batch(input_data: BatchInput):
+async def analyze_batch(
+    input_data: BatchInput, request: Request, stream: bool = False, chunk_size: int = 64
+):
+    # Pin one version for the whole request, even if a swap happens meanwhile
+    version, analyzer = serving_model(request)
+    if stream:
+        print(f"Streaming batch request with {len(input_data.texts)} texts")
+        return StreamingResponse(
+            stream_batch(input_data.texts, max(chunk_size, 1), analyzer, version),
+            media_type="application/x-ndjson",
+        )
+
     try:
         print(f"Received batch request with {len(input_data.texts)} texts")
         results = []
@@ -56,6 +156,35 @@ async def analyze_batch(input_data: BatchInput):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/admin/models")
+async def list_models(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    return {"versions": registry.versions(), **model.status()}
+
+
+@app.post("/admin/models/{version}/activate", status_code=202)
+async def activate_model(version: str, x_admin_token: Optional[str] = Header(None)):
+    """Load and warm a version in the background, then switch traffic to it"""
+    check_admin(x_admin_token)
+    try:
+        started = model.activate(version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"activating": version if started else None, **model.status()}
+
+
+@app.post("/admin/rollback")
+async def rollback_model(x_admin_token: Optional[str] = Header(None)):
+    check_admin(x_admin_token)
+    try:
+        version = model.rollback()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"rolled_back_to": version, **model.status()}
+
+
 if __name__ == "__main__":
     print("Starting server...")
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="debug")
@@ -0,0 +1,175 @@
+# artifacts.py
+"""Versioned, cache-friendly distribution of the model artifacts.
+
+Every artifact gets a content-hash version. Each representation (identity,
+gzip, brotli) carries its own strong ETag derived from it, conditional GETs
+are answered with 304 when the client holds the representation it would be
+sent, and a missing artifact is reported as absent, never an error. Gzip (plus
+brotli when installed) variants are precompressed once per version. The
+manifest lists the current version of every artifact, so a client start
+costs one small revalidated request instead of re-downloading the models.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")] if brotli else [("gzip", ".gz")]
+
+# Versioned URLs never change content, so clients may cache them for a year
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def parse_etags(header):
+    """Opaque tags of an If-None-Match header (weak comparison, RFC 9110)"""
+    if not header:
+        return set()
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tags.add(tag.strip('"'))
+    return tags
+
+
+def accepted_encodings(header):
+    """Encodings listed in Accept-Encoding without q=0"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if name and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.lower())
+    return accepted
+
+
+class ArtifactStore:
+    def __init__(self, directory, artifacts, cache_dir=None):
+        """``artifacts`` maps a file name inside ``directory`` to its mimetype"""
+        self.directory = directory
+        self.artifacts = artifacts
+        self.cache_dir = cache_dir or os.path.join(directory, ".compressed")
+        self._info = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, name):
+        """Current version info of an artifact, recomputed when the file changes
+
+        Returns None for unknown artifacts and for files that are missing
+        (e.g. not trained yet, or being rotated).
+        """
+        if name not in self.artifacts:
+            return None
+
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                key = (stat.st_mtime_ns, stat.st_size)
+                info = self._info.get(name)
+                if info is None or info["key"] != key or not all(
+                    os.path.exists(variant["path"]) for variant in info["variants"].values()
+                ):
+                    info = self._build(name, path, key)
+                    self._info[name] = info
+                return info
+            except FileNotFoundError:
+                self._info.pop(name, None)
+                return None
+
+    def _build(self, name, path, key):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        version = digest[:16]
+
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            variant_path = os.path.join(self.cache_dir, f"{name}.{version}{suffix}")
+            if not os.path.exists(variant_path):
+                compressed = compress(data, encoding)
+                # Only keep variants that actually save bytes
+                if len(compressed) >= len(data):
+                    continue
+                tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, variant_path)
+            variants[encoding] = {
+                "path": variant_path,
+                "size": os.path.getsize(variant_path),
+                "etag": f"{version}-{encoding}",
+            }
+
+        return {
+            "key": key,
+            "name": name,
+            "path": path,
+            "mimetype": self.artifacts[name],
+            "sha256": digest,
+            "version": version,
+            "size": len(data),
+            "etag": version,
+            "variants": variants,
+        }
+
+    def select(self, name, accept_encoding):
+        """Pick the representation to send: (path, etag, content encoding)
+
+        Returns None if the artifact is missing.
+        """
+        info = self.get(name)
+        if info is None:
+            return None
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in info["variants"] and encoding in accepted:
+                variant = info["variants"][encoding]
+                return variant["path"], variant["etag"], encoding
+        return info["path"], info["etag"], None
+
+    @staticmethod
+    def is_fresh(etag, if_none_match):
+        """True if If-None-Match matches ``etag``, the ETag of the selected representation"""
+        tags = parse_etags(if_none_match)
+        return "*" in tags or etag in tags
+
+    def manifest(self, url_prefix="/models"):
+        artifacts = {}
+        for name in self.artifacts:
+            info = self.get(name)
+            if info is None:
+                continue
+            artifacts[name] = {
+                "version": info["version"],
+                "sha256": info["sha256"],
+                "size": info["size"],
+                "url": f"{url_prefix}/{name}?v={info['version']}",
+                "encodings": {
+                    encoding: variant["size"]
+                    for encoding, variant in info["variants"].items()
+                },
+            }
+        return {"artifacts": artifacts}
+
+    def manifest_etag(self):
+        versions = []
+        for name in sorted(self.artifacts):
+            info = self.get(name)
+            versions.append(f"{name}:{info['version'] if info else '-'}")
+        return hashlib.sha256("|".join(versions).encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,222 @@
+# distill.py
+"""Distill the model_3 BERT rating model into the TF-IDF MLP.
+
+The analyzed CSVs model_3 writes to ``results/`` hold BERT's star rating and
+its confidence for every comment. Those are turned into soft targets over
+the three sentiment classes (the top star keeps its confidence, the rest of
+the probability mass goes to neighbouring stars; a low-confidence row is
+pulled towards its star's class just enough that that class stays the most
+likely one), the MLP is trained on them and exported as a new ``.tflite`` plus vectorizer. The report lists the
+exported model's agreement with BERT on held-out rows and, when the
+transformer is available locally, the measured speedup.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.optimizers import Adam
+
+from main import SentimentAnalyzer, models_dir
+from preprocessing import CorpusPreprocessor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "..", "model_3", "results")
+
+# Star -> sentiment class index of SentimentAnalyzer.label_encoder
+STAR_CLASSES = np.array([0, 0, 1, 2, 2])
+CLASS_NAMES = ["negative", "neutral", "positive"]
+# Minimum lead of the star's class over the others in the soft targets
+CLASS_MARGIN = 1e-3
+
+
+def load_teacher_results(pattern, text_column="comment"):
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise ValueError(f"No analyzed CSVs match {pattern}")
+
+    frames = [pd.read_csv(path) for path in paths]
+    df = pd.concat(frames, ignore_index=True)
+    missing = {text_column, "rating", "confidence"} - set(df.columns)
+    if missing:
+        raise ValueError(f"Analyzed CSVs are missing columns: {', '.join(missing)}")
+
+    df = df.dropna(subset=[text_column, "rating", "confidence"])
+    # Re-analyzed uploads appear in several result files; keep the latest
+    df = df.drop_duplicates(subset=[text_column], keep="last")
+    print(f"Loaded {len(df)} teacher-labelled rows from {len(paths)} files")
+    return df.reset_index(drop=True)
+
+
+def soft_targets(ratings, confidences, neighbour_decay=1.0):
+    """Three-class soft targets from BERT's top star and its probability"""
+    ratings = np.asarray(ratings, dtype=int)
+    confidences = np.clip(np.asarray(confidences, dtype=np.float32), 0.0, 1.0)
+
+    stars = np.arange(1, 6)
+    distance = np.abs(stars[None, :] - ratings[:, None])
+    weights = np.exp(-neighbour_decay * distance).astype(np.float32)
+    weights[distance == 0] = 0.0
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    star_probs = weights * (1.0 - confidences)[:, None]
+    star_probs[distance == 0] = confidences
+
+    targets = np.zeros((len(ratings), len(CLASS_NAMES)), dtype=np.float32)
+    for star, class_index in enumerate(STAR_CLASSES):
+        targets[:, class_index] += star_probs[:, star]
+
+    # Below ~1/3 confidence the neighbours of a 3-star row can outweigh the
+    # neutral class; mix in the one-hot star class so it leads again
+    rows = np.arange(len(ratings))
+    classes = teacher_labels(ratings)
+    others = targets.copy()
+    others[rows, classes] = -np.inf
+    deficit = others.max(axis=1) - targets[rows, classes] + CLASS_MARGIN
+    mix = np.clip(deficit / (1.0 + deficit), 0.0, 1.0)[:, None]
+    targets *= 1.0 - mix
+    targets[rows, classes] += mix[:, 0]
+    return targets
+
+
+def teacher_labels(ratings):
+    """BERT's hard sentiment class for each star rating"""
+    return STAR_CLASSES[np.asarray(ratings, dtype=int) - 1]
+
+
+def measure_bert(texts):
+    """Seconds per text for the model_3 BERT engine, or None if unavailable"""
+    sys.path.insert(0, os.path.join(BASE_DIR, ".."))
+    try:
+        from engines import BertEngine
+
+        engine = BertEngine()
+    except Exception as e:
+        print(f"Skipping BERT timing: {e}")
+        return None
+
+    engine.analyze(texts[:8])  # warm up
+    start = time.perf_counter()
+    engine.analyze(texts)
+    return (time.perf_counter() - start) / len(texts)
+
+
+def distill(
+    results_pattern=os.path.join(RESULTS_DIR, "analyzed_*.csv"),
+    text_column="comment",
+    model_path=os.path.join(models_dir, "distilled_sentiment_model.tflite"),
+    vectorizer_path=os.path.join(models_dir, "distilled_vectorizer.json"),
+    test_size=0.2,
+    epochs=50,
+    batch_size=32,
+    neighbour_decay=1.0,
+    time_bert=True,
+):
+    df = load_teacher_results(results_pattern, text_column)
+    targets = soft_targets(df["rating"], df["confidence"], neighbour_decay)
+    labels = teacher_labels(df["rating"])
+    with CorpusPreprocessor() as preprocessor:
+        processed_texts = preprocessor.process(df[text_column].tolist())
+    texts = df[text_column].astype(str).tolist()
+
+    indices = np.arange(len(df))
+    train_idx, test_idx = train_test_split(
+        indices, test_size=test_size, random_state=42,
+        stratify=labels if len(df) >= 10 * len(CLASS_NAMES) else None,
+    )
+
+    student = SentimentAnalyzer()
+    X_train = student.vectorizer.fit_transform(
+        [processed_texts[i] for i in train_idx]
+    ).toarray()
+
+    # Soft targets need the dense cross-entropy instead of the sparse one
+    student.model = student.build_model(X_train.shape[1])
+    student.model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss="categorical_crossentropy",
+        metrics=["accuracy"],
+    )
+    student.model.fit(
+        X_train,
+        targets[train_idx],
+        validation_split=0.1,
+        epochs=epochs,
+        batch_size=batch_size,
+        callbacks=[EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)],
+        verbose=1,
+    )
+    student.save_model(model_path, vectorizer_path)
+
+    # Evaluate the exported TFLite model, which is what clients will run
+    exported = SentimentAnalyzer()
+    exported.load_model(model_path, vectorizer_path)
+    test_processed = [processed_texts[i] for i in test_idx]
+    start = time.perf_counter()
+    probabilities = exported.predict_proba_lite(test_processed, preprocessed=True)
+    student_seconds = (time.perf_counter() - start) / max(len(test_idx), 1)
+
+    predicted = probabilities.argmax(axis=1)
+    teacher = labels[test_idx]
+    agreement = float((predicted == teacher).mean()) if len(test_idx) else None
+
+    report = {
+        "teacher_rows": int(len(df)),
+        "train_rows": int(len(train_idx)),
+        "test_rows": int(len(test_idx)),
+        "agreement": agreement,
+        "per_class_agreement": {
+            name: float((predicted[teacher == i] == i).mean())
+            for i, name in enumerate(CLASS_NAMES)
+            if (teacher == i).any()
+        },
+        "student_ms_per_text": student_seconds * 1000,
+        "model_path": model_path,
+        "model_bytes": os.path.getsize(model_path),
+        "vectorizer_path": vectorizer_path,
+    }
+
+    if time_bert and len(test_idx):
+        bert_seconds = measure_bert([texts[i] for i in test_idx])
+        if bert_seconds:
+            report["bert_ms_per_text"] = bert_seconds * 1000
+            report["speedup"] = bert_seconds / student_seconds
+
+    report_path = os.path.splitext(model_path)[0] + "_report.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    print(f"Distillation report saved to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Distill BERT into the TF-IDF MLP")
+    parser.add_argument("--results", default=os.path.join(RESULTS_DIR, "analyzed_*.csv"),
+                        help="Glob of model_3 analyzed CSVs")
+    parser.add_argument("--text-column", default="comment")
+    parser.add_argument("--model-path",
+                        default=os.path.join(models_dir, "distilled_sentiment_model.tflite"))
+    parser.add_argument("--vectorizer-path",
+                        default=os.path.join(models_dir, "distilled_vectorizer.json"))
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--neighbour-decay", type=float, default=1.0)
+    parser.add_argument("--no-bert-timing", action="store_true")
+    args = parser.parse_args()
+
+    distill(
+        results_pattern=args.results,
+        text_column=args.text_column,
+        model_path=args.model_path,
+        vectorizer_path=args.vectorizer_path,
+        epochs=args.epochs,
+        neighbour_decay=args.neighbour_decay,
+        time_bert=not args.no_bert_timing,
+    )
@@ -15,8 +15,9 @@ from nltk.stem import WordNetLemmatizer
 import logging
 from typing import List, Dict, Union
 import os
-from flask import Flask, send_file
+from flask import Flask, Response, jsonify, request, send_file
 from flask_cors import CORS
+from artifacts import ArtifactStore, IMMUTABLE_CACHE, REVALIDATE_CACHE, parse_etags
 
 # Get the absolute path of the current directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -33,6 +34,15 @@ vectorizer_path = os.path.join(models_dir, "vectorizer.json")
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Content-hash versions, ETags and precompressed variants of the served files
+artifact_store = ArtifactStore(
+    models_dir,
+    {
+        os.path.basename(model_path): "application/octet-stream",
+        os.path.basename(vectorizer_path): "application/json",
+    },
+)
+
 class NumpyEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, np.integer):
@@ -127,10 +137,14 @@ class SentimentAnalyzer:
         validation_split: float = 0.2,
         epochs: int = 50,
         batch_size: int = 32,
+        preprocessed: bool = False,
     ) -> Dict[str, Union[float, List[float]]]:
         try:
-            # Preprocess all texts
-            processed_texts = [self.preprocess_text(text) for text in texts]
+            # Preprocess all texts (unless they come from the preprocessing cache)
+            if preprocessed:
+                processed_texts = list(texts)
+            else:
+                processed_texts = [self.preprocess_text(text) for text in texts]
 
             # Vectorize texts
             X = self.vectorizer.fit_transform(processed_texts).toarray()
@@ -191,6 +205,29 @@ class SentimentAnalyzer:
             self.logger.error(f"Error in prediction: {str(e)}")
             raise
 
+    def predict_proba_lite(
+        self, texts: List[str], preprocessed: bool = False
+    ) -> np.ndarray:
+        """Class probabilities from the loaded TFLite model (what clients run)."""
+        try:
+            if preprocessed:
+                processed_texts = list(texts)
+            else:
+                processed_texts = [self.preprocess_text(text) for text in texts]
+            X = self.vectorizer.transform(processed_texts).toarray().astype(np.float32)
+
+            input_details = self.interpreter.get_input_details()[0]
+            output_details = self.interpreter.get_output_details()[0]
+            self.interpreter.resize_tensor_input(input_details["index"], X.shape)
+            self.interpreter.allocate_tensors()
+            self.interpreter.set_tensor(input_details["index"], X)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(output_details["index"])
+
+        except Exception as e:
+            self.logger.error(f"Error in TFLite prediction: {str(e)}")
+            raise
+
     def save_model(self, model_path: str, vectorizer_path: str):
         try:
             # Create directories if they don't exist
@@ -205,6 +242,7 @@ class SentimentAnalyzer:
                 "vocabulary": vocabulary,
                 "idf": self.vectorizer.idf_.tolist(),
                 "max_features": self.max_features,
+                "ngram_range": list(self.vectorizer.ngram_range),
             }
 
             with open(vectorizer_path, "w") as f:
@@ -230,9 +268,14 @@ class SentimentAnalyzer:
             with open(vectorizer_path, "r") as f:
                 vectorizer_data = json.load(f)
 
+            # Older vectorizer files don't record the n-gram range they were
+            # fitted with, which is the constructor default
             self.vectorizer = TfidfVectorizer(
                 max_features=vectorizer_data["max_features"],
                 vocabulary=vectorizer_data["vocabulary"],
+                ngram_range=tuple(vectorizer_data.get("ngram_range", (1, 3))),
+                strip_accents="unicode",
+                lowercase=True,
             )
             self.vectorizer.idf_ = np.array(vectorizer_data["idf"])
 
@@ -247,13 +290,51 @@ class SentimentAnalyzer:
             raise
 
 # Flask routes for serving model files
+@app.route("/models/manifest.json")
+def serve_manifest():
+    etag = artifact_store.manifest_etag()
+    if etag in parse_etags(request.headers.get("If-None-Match")):
+        response = Response(status=304)
+    else:
+        response = jsonify(artifact_store.manifest())
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = REVALIDATE_CACHE
+    return response
+
+
+def serve_artifact(name):
+    info = artifact_store.get(name)
+    selected = artifact_store.select(name, request.headers.get("Accept-Encoding"))
+    if info is None or selected is None:
+        return jsonify({"error": f"Artifact not available: {name}"}), 404
+    path, etag, encoding = selected
+    versioned = request.args.get("v") == info["version"]
+
+    # The 304 and the full response carry the ETag of the same representation
+    if artifact_store.is_fresh(etag, request.headers.get("If-None-Match")):
+        response = Response(status=304)
+    else:
+        try:
+            response = send_file(path, mimetype=info["mimetype"], etag=False, conditional=False)
+        except FileNotFoundError:
+            return jsonify({"error": f"Artifact not available: {name}"}), 404
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE if versioned else REVALIDATE_CACHE
+    response.headers["X-Artifact-Version"] = info["version"]
+    return response
+
+
 @app.route("/models/sentiment_model.tflite")
 def serve_model():
-    return send_file(model_path, mimetype="application/octet-stream")
+    return serve_artifact(os.path.basename(model_path))
 
 @app.route("/models/vectorizer.json")
 def serve_vectorizer():
-    return send_file(vectorizer_path, mimetype="application/json")
+    return serve_artifact(os.path.basename(vectorizer_path))
 
 @app.route("/health")
 def health_check():
@@ -0,0 +1,230 @@
+# online_trainer.py
+"""Out-of-core trainer for the sentiment model.
+
+Streams the training CSV in chunks through a stateless HashingVectorizer and
+an SGD linear classifier trained with ``partial_fit``, so memory stays fixed
+no matter how large the corpus is. The result is a scikit-learn Pipeline
+saved with joblib, which ``app.py`` loads like the LinearSVC pipeline, and
+registered as a new version in the model registry (see registry.py).
+
+Checkpoints record the hash of the input file and the chunk size. A
+checkpoint that does not match the current run is ignored, and the
+checkpoint is deleted once training finishes.
+"""
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+
+from preprocessing import CorpusPreprocessor, file_hash
+from registry import REGISTRY_DIR, ModelRegistry
+
+CLASSES = np.array(["negative", "neutral", "positive"])
+
+
+class OnlineSentimentTrainer:
+    def __init__(
+        self,
+        n_features=2**20,
+        ngram_range=(1, 2),
+        alpha=1e-5,
+        loss="hinge",
+        chunk_size=10000,
+        holdout_every=10,
+        classes=CLASSES,
+        random_state=42,
+    ):
+        self.chunk_size = chunk_size
+        self.holdout_every = holdout_every
+        self.classes = np.asarray(classes)
+        self.random_state = random_state
+
+        # The hashing vectorizer has no vocabulary to fit, so every chunk is
+        # mapped into the same feature space without a first pass
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            alternate_sign=False,
+            norm="l2",
+        )
+        self.classifier = SGDClassifier(
+            loss=loss, alpha=alpha, random_state=random_state
+        )
+        # Chunks are cached after the first epoch, so later epochs skip
+        # text normalization
+        self.preprocessor = CorpusPreprocessor(shard_size=max(chunk_size // 4, 1))
+        self.epoch = 0
+        self.chunk = 0
+
+    @property
+    def model(self):
+        return Pipeline(
+            [("hashing", self.vectorizer), ("classifier", self.classifier)]
+        )
+
+    def preprocess(self, texts):
+        return self.preprocessor.process(texts)
+
+    def iter_chunks(self, csv_path, text_column, label_column):
+        reader = pd.read_csv(
+            csv_path,
+            usecols=[text_column, label_column],
+            chunksize=self.chunk_size,
+        )
+        for chunk in reader:
+            chunk = chunk.dropna()
+            yield chunk[text_column].tolist(), chunk[label_column].to_numpy()
+
+    def save_checkpoint(self, path, source_hash=None):
+        state = {
+            "vectorizer": self.vectorizer,
+            "classifier": self.classifier,
+            "epoch": self.epoch,
+            "chunk": self.chunk,
+            "source_hash": source_hash,
+            "chunk_size": self.chunk_size,
+        }
+        tmp_path = f"{path}.tmp"
+        joblib.dump(state, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load_checkpoint(self, path, source_hash=None):
+        """Restore training state; returns False if the checkpoint belongs to another run"""
+        state = joblib.load(path)
+        if state.get("source_hash") != source_hash or state.get("chunk_size") != self.chunk_size:
+            print(f"Ignoring checkpoint {path}: it was written for a different input or chunk size")
+            return False
+        self.vectorizer = state["vectorizer"]
+        self.classifier = state["classifier"]
+        self.epoch = state["epoch"]
+        self.chunk = state["chunk"]
+        print(f"Resuming from epoch {self.epoch + 1}, chunk {self.chunk}")
+        return True
+
+    def train(
+        self,
+        csv_path,
+        text_column="text",
+        label_column="sentiment",
+        epochs=3,
+        checkpoint_path=None,
+        checkpoint_every=10,
+        resume=True,
+    ):
+        source_hash = file_hash(csv_path) if checkpoint_path else None
+        if checkpoint_path and resume and os.path.exists(checkpoint_path):
+            self.load_checkpoint(checkpoint_path, source_hash)
+
+        rng = np.random.RandomState(self.random_state)
+        history = []
+
+        while self.epoch < epochs:
+            start = time.time()
+            seen = correct = evaluated = 0
+
+            for index, (texts, labels) in enumerate(
+                self.iter_chunks(csv_path, text_column, label_column)
+            ):
+                # Skip chunks already consumed before the checkpoint
+                if index < self.chunk:
+                    continue
+
+                X = self.vectorizer.transform(self.preprocess(texts))
+
+                # Hold out a fixed slice of every chunk for progressive validation
+                holdout = np.arange(len(labels)) % self.holdout_every == 0
+                if hasattr(self.classifier, "coef_") and holdout.any():
+                    predictions = self.classifier.predict(X[holdout])
+                    correct += int((predictions == labels[holdout]).sum())
+                    evaluated += int(holdout.sum())
+
+                train_rows = np.flatnonzero(~holdout)
+                rng.shuffle(train_rows)
+                self.classifier.partial_fit(
+                    X[train_rows], labels[train_rows], classes=self.classes
+                )
+                seen += len(train_rows)
+                self.chunk = index + 1
+
+                if checkpoint_path and self.chunk % checkpoint_every == 0:
+                    self.save_checkpoint(checkpoint_path, source_hash)
+
+            accuracy = correct / evaluated if evaluated else float("nan")
+            elapsed = time.time() - start
+            print(
+                f"Epoch {self.epoch + 1}/{epochs}: {seen} rows in {elapsed:.1f}s, "
+                f"holdout accuracy {accuracy:.3f}"
+            )
+            history.append(
+                {"epoch": self.epoch + 1, "rows": seen, "accuracy": accuracy}
+            )
+
+            self.epoch += 1
+            self.chunk = 0
+            if checkpoint_path:
+                self.save_checkpoint(checkpoint_path, source_hash)
+
+        # A finished run must not be "resumed" by the next one
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.preprocessor.close()
+        return history
+
+    def save_model(self, path):
+        joblib.dump(self.model, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core sentiment training")
+    parser.add_argument("csv_path", nargs="?", default="sentiment_reviews.csv")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="sentiment")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint path (default: keyed on the input file hash)")
+    parser.add_argument("--checkpoint-every", type=int, default=10)
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Start from scratch even if a matching checkpoint exists")
+    parser.add_argument("--output", default="sentiment_model.joblib")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--no-register", action="store_true",
+                        help="Only save the model, do not add it to the registry")
+    parser.add_argument("--activate", action="store_true",
+                        help="Make the registered version CURRENT")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or f"sentiment_model.{file_hash(args.csv_path)[:16]}.ckpt"
+
+    trainer = OnlineSentimentTrainer(chunk_size=args.chunk_size)
+    history = trainer.train(
+        args.csv_path,
+        text_column=args.text_column,
+        label_column=args.label_column,
+        epochs=args.epochs,
+        checkpoint_path=checkpoint,
+        checkpoint_every=args.checkpoint_every,
+        resume=not args.no_resume,
+    )
+    trainer.save_model(args.output)
+    print(f"Model saved to {args.output}")
+
+    if not args.no_register:
+        registry = ModelRegistry(args.registry)
+        metadata = registry.register(
+            args.output,
+            trainer="online_trainer",
+            data=os.path.abspath(args.csv_path),
+            epochs=args.epochs,
+            holdout_accuracy=history[-1]["accuracy"] if history else None,
+        )
+        print(f"Registered model version {metadata['version']}")
+        if args.activate:
+            registry.set_current(metadata["version"])
+            print(f"CURRENT -> {metadata['version']}")
@@ -0,0 +1,272 @@
+# preprocessing.py
+"""Parallel, cached text preprocessing for training runs.
+
+The corpus is split into shards that are normalized on a process pool. Each
+processed shard is stored in an on-disk cache keyed by the shard contents and
+the preprocessing configuration (stopword set, regex, lemmatizer), and a
+manifest keyed by the hash of the whole text sequence lists its shards. A
+repeated training run on the same texts skips text normalization entirely,
+and an edited corpus only reprocesses the shards that changed. Keying on
+the texts rather than the input file means a different text column, or rows
+dropped from the same file, never reuse another corpus's results.
+
+Shard boundaries are content-defined: a shard ends after a row whose hash
+falls on a boundary, so inserting or deleting a row only changes the shard
+around it instead of shifting every later one. The process pool is created
+on first use and reused by later calls until ``close()``.
+"""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import nltk
+import pandas as pd
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
+
+DEFAULT_CONFIG = {
+    "lowercase": True,
+    "regex": r"[^a-zA-Z\s]",
+    "stopwords": "english",
+    "keep_stopwords": [],
+    "lemmatizer": "wordnet",
+}
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".preprocess_cache"
+)
+
+# Per-process state, built once by the pool initializer
+_worker = {}
+
+
+def config_key(config):
+    """Stable hash of a preprocessing configuration"""
+    return hashlib.sha256(
+        json.dumps(config, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hash(text):
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+
+
+def split_shards(texts, shard_size):
+    """Content-defined shards of ``shard_size`` rows on average
+
+    A shard is cut after every row whose hash is a multiple of
+    ``shard_size``; shards are also capped at four times that size.
+    """
+    shards = []
+    start = 0
+    for i, text in enumerate(texts):
+        if row_hash(text) % shard_size == 0 or i + 1 - start >= 4 * shard_size:
+            shards.append(texts[start : i + 1])
+            start = i + 1
+    if start < len(texts):
+        shards.append(texts[start:])
+    return shards
+
+
+def normalize_texts(texts):
+    return ["" if pd.isna(text) else str(text) for text in texts]
+
+
+def shard_hash(texts):
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(str(text).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+
+
+def init_worker(config):
+    # Only hit the network for resources that are not installed yet
+    for resource, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(resource, quiet=True)
+
+    stop_words = set()
+    if config["stopwords"]:
+        stop_words = set(stopwords.words(config["stopwords"]))
+    stop_words -= set(config["keep_stopwords"])
+
+    _worker["config"] = config
+    _worker["pattern"] = re.compile(config["regex"])
+    _worker["stop_words"] = stop_words
+    _worker["lemmatizer"] = (
+        WordNetLemmatizer() if config["lemmatizer"] == "wordnet" else None
+    )
+
+
+def preprocess_text(text):
+    """Same normalization as SentimentAnalyzer.preprocess_text"""
+    config = _worker["config"]
+    text = str(text)
+    if config["lowercase"]:
+        text = text.lower()
+    text = _worker["pattern"].sub("", text)
+    tokens = word_tokenize(text)
+
+    lemmatizer = _worker["lemmatizer"]
+    stop_words = _worker["stop_words"]
+    tokens = [
+        lemmatizer.lemmatize(token) if lemmatizer else token
+        for token in tokens
+        if token not in stop_words
+    ]
+    return " ".join(tokens)
+
+
+def preprocess_shard(texts):
+    return [preprocess_text(text) for text in texts]
+
+
+class CorpusPreprocessor:
+    def __init__(
+        self, config=None, cache_dir=DEFAULT_CACHE_DIR, shard_size=5000, n_jobs=None
+    ):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.config_key = config_key(self.config)
+        self.cache_dir = os.path.join(cache_dir, self.config_key)
+        self.shard_size = shard_size
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self._pool = None
+        self._initialized = False
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, shards):
+        """Preprocess shards in this process or on the shared pool"""
+        if self.n_jobs == 1 or (len(shards) == 1 and self._pool is None):
+            if not self._initialized:
+                init_worker(self.config)
+                self._initialized = True
+            return map(preprocess_shard, shards)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=init_worker,
+                initargs=(self.config,),
+            )
+        return self._pool.map(preprocess_shard, shards)
+
+    def _shard_path(self, key):
+        return os.path.join(self.cache_dir, f"shard_{key}.json")
+
+    def _manifest_path(self, corpus_hash):
+        return os.path.join(self.cache_dir, f"corpus_{corpus_hash}.json")
+
+    def _read_json(self, path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, path, data):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load_cached(self, texts):
+        """Return the processed texts if this exact corpus was processed before"""
+        return self._load_manifest(shard_hash(normalize_texts(texts)))
+
+    def _load_manifest(self, corpus_hash):
+        manifest = self._read_json(self._manifest_path(corpus_hash))
+        if manifest is None:
+            return None
+
+        processed = []
+        for key in manifest["shards"]:
+            shard = self._read_json(self._shard_path(key))
+            if shard is None:
+                return None
+            processed.extend(shard)
+        return processed
+
+    def process(self, texts, source_path=None):
+        """Preprocess texts, reusing cached shards and parallelizing the rest
+
+        A corpus processed before is served straight from its manifest.
+        ``source_path`` is the file the texts were read from; it is only
+        recorded in the manifest and log messages.
+        """
+        texts = normalize_texts(texts)
+        corpus_hash = shard_hash(texts)
+        cached = self._load_manifest(corpus_hash)
+        if cached is not None and len(cached) == len(texts):
+            print(f"Using cached preprocessing for {source_path or 'corpus'}")
+            return cached
+
+        shards = split_shards(texts, self.shard_size)
+        keys = [shard_hash(shard) for shard in shards]
+
+        results = {}
+        missing = []
+        for key, shard in zip(keys, shards):
+            if key in results:
+                continue
+            cached = self._read_json(self._shard_path(key))
+            if cached is not None:
+                results[key] = cached
+            else:
+                results[key] = None
+                missing.append((key, shard))
+
+        print(
+            f"Preprocessing {len(texts)} texts: {len(shards) - len(missing)} "
+            f"cached shards, {len(missing)} to process"
+        )
+
+        if missing:
+            processed = self._map([shard for _, shard in missing])
+            for (key, _), shard in zip(missing, processed):
+                results[key] = shard
+                self._write_json(self._shard_path(key), shard)
+
+        self._write_json(
+            self._manifest_path(corpus_hash),
+            {
+                "source": os.path.abspath(source_path) if source_path else None,
+                "rows": len(texts),
+                "shards": keys,
+            },
+        )
+
+        processed_texts = []
+        for key in keys:
+            processed_texts.extend(results[key])
+        return processed_texts
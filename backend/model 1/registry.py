@@ -0,0 +1,81 @@
+# registry.py
+"""Model 1's versions in the shared model registry (backend/model_registry.py).
+
+Each version holds a copy of a fitted pipeline saved by the training
+scripts. ``HotModel`` serves shallow copies of a template SentimentAnalyzer,
+one per version, with the version's pipeline memory-mapped. A version whose
+warm-up predictions are not valid labels (or whose scores are not finite
+probabilities / margins) fails to load and is never swapped in.
+
+Usage:
+    python registry.py register sentiment_model.joblib --activate
+    python registry.py list
+"""
+import copy
+import os
+import sys
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The registry and hot swapping are shared with model_3
+sys.path.append(os.path.dirname(BASE_DIR))
+
+import model_registry  # noqa: E402
+from model_registry import ModelRegistry  # noqa: E402,F401
+
+REGISTRY_DIR = os.path.join(BASE_DIR, "registry")
+WARMUP_TEXTS = [
+    "This product is amazing! I love it!",
+    "Worst purchase ever. Don't buy this.",
+    "It's okay, nothing special.",
+]
+LABELS = ("positive", "neutral", "negative")
+
+
+def check_warmup(analyzer, texts=WARMUP_TEXTS):
+    """Run the warm-up texts and validate the outputs, raising ValueError if invalid
+
+    This also pages in the model arrays and runs every prediction code path
+    once, so the first real request is not cold.
+    """
+    labels = [str(label) for label in analyzer.predict_batch(texts)]
+    if len(labels) != len(texts):
+        raise ValueError(f"Expected {len(texts)} warm-up predictions, got {len(labels)}")
+    unknown = sorted(set(labels) - set(LABELS))
+    if unknown:
+        raise ValueError(f"Model predicts unknown labels: {', '.join(unknown)}")
+
+    model = analyzer.model
+    processed = [analyzer.preprocess_text(text) for text in texts]
+    if hasattr(model, "predict_proba"):
+        probabilities = np.asarray(model.predict_proba(processed), dtype=float)
+        if (
+            not np.all(np.isfinite(probabilities))
+            or probabilities.min() < 0
+            or not np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-3)
+        ):
+            raise ValueError("Model returns invalid class probabilities")
+    if hasattr(model, "decision_function"):
+        if not np.all(np.isfinite(model.decision_function(processed))):
+            raise ValueError("Model returns non-finite decision scores")
+    return labels
+
+
+class HotModel(model_registry.HotModel):
+    def __init__(self, registry, analyzer, check_interval=1.0):
+        """``analyzer`` is a SentimentAnalyzer used as a template; each loaded
+        version is a shallow copy of it holding that version's pipeline"""
+        super().__init__(registry, self._load_analyzer, check_interval=check_interval)
+        self.analyzer = analyzer
+
+    def _load_analyzer(self, version):
+        analyzer = copy.copy(self.analyzer)
+        # Memory-map the model arrays so forked workers (see prefork.py) share them
+        analyzer.load_model(self.registry.model_path(version), mmap_mode="r")
+        check_warmup(analyzer)
+        return analyzer
+
+
+if __name__ == "__main__":
+    model_registry.main(REGISTRY_DIR, description="Manage the model 1 registry")
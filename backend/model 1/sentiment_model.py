@@ -11,6 +11,9 @@ from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 
+DEFAULT_TFIDF_PARAMS = {"max_features": 5000, "ngram_range": (1, 2)}
+DEFAULT_CLASSIFIER_PARAMS = {"random_state": 42}
+
 class SentimentAnalyzer:
     def __init__(self):
         # Download required NLTK data
@@ -42,23 +45,33 @@ class SentimentAnalyzer:
 
         return " ".join(tokens)
 
-    def prepare_data(self, texts, labels):
-        # Preprocess all texts
-        processed_texts = [self.preprocess_text(text) for text in texts]
+    def prepare_data(self, texts, labels, preprocessed=False):
+        # Preprocess all texts (unless they come from the preprocessing cache)
+        if preprocessed:
+            processed_texts = list(texts)
+        else:
+            processed_texts = [self.preprocess_text(text) for text in texts]
 
         # Create pipeline with TF-IDF and SVM
-        self.model = Pipeline(
-            [
-                ("tfidf", TfidfVectorizer(max_features=5000, ngram_range=(1, 2))),
-                ("classifier", LinearSVC(random_state=42)),
-            ]
-        )
+        self.model = self.build_pipeline()
 
         return processed_texts, labels
 
-    def train(self, texts, labels):
+    @staticmethod
+    def build_pipeline(tfidf_params=None, classifier_params=None, memory=None):
+        tfidf_params = dict(DEFAULT_TFIDF_PARAMS, **(tfidf_params or {}))
+        classifier_params = dict(DEFAULT_CLASSIFIER_PARAMS, **(classifier_params or {}))
+        return Pipeline(
+            [
+                ("tfidf", TfidfVectorizer(**tfidf_params)),
+                ("classifier", LinearSVC(**classifier_params)),
+            ],
+            memory=memory,
+        )
+
+    def train(self, texts, labels, preprocessed=False):
         # Prepare data
-        processed_texts, labels = self.prepare_data(texts, labels)
+        processed_texts, labels = self.prepare_data(texts, labels, preprocessed)
 
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -93,13 +106,37 @@ class SentimentAnalyzer:
         prediction = self.model.predict([processed_text])[0]
         return prediction
 
+    def predict_batch(self, texts):
+        if self.model is None:
+            raise ValueError("Model not trained yet!")
+
+        processed_texts = [self.preprocess_text(str(text)) for text in texts]
+        return self.model.predict(processed_texts)
+
+    def decision_margin(self, texts):
+        """Predicted labels plus the gap between the top two decision scores"""
+        if self.model is None:
+            raise ValueError("Model not trained yet!")
+
+        processed_texts = [self.preprocess_text(str(text)) for text in texts]
+        scores = self.model.decision_function(processed_texts)
+        classes = self.model.classes_
+        if scores.ndim == 1:
+            # Binary models return a single signed distance
+            labels = np.where(scores > 0, classes[1], classes[0])
+            return labels, np.abs(scores)
+
+        top_two = np.sort(scores, axis=1)[:, -2:]
+        labels = classes[scores.argmax(axis=1)]
+        return labels, top_two[:, 1] - top_two[:, 0]
+
     def save_model(self, path):
         if self.model is None:
             raise ValueError("No model to save!")
         joblib.dump(self.model, path)
 
-    def load_model(self, path):
-        self.model = joblib.load(path)
+    def load_model(self, path, mmap_mode=None):
+        self.model = joblib.load(path, mmap_mode=mmap_mode)
 
 
 # Example usage and training script
@@ -1,9 +1,11 @@
 # train_model.py
 import pandas as pd
 from sentiment_model import SentimentAnalyzer
+from preprocessing import CorpusPreprocessor
+from registry import REGISTRY_DIR, ModelRegistry
 
 
-def train_with_csv(csv_path):
+def train_with_csv(csv_path, n_jobs=None):
     # Load your training data
     df = pd.read_csv(csv_path)
 
@@ -11,9 +13,13 @@ def train_with_csv(csv_path):
     texts = df["text"].tolist()
     labels = df["sentiment"].tolist()
 
+    # Normalize texts in parallel, reusing cached shards from earlier runs
+    with CorpusPreprocessor(n_jobs=n_jobs) as preprocessor:
+        processed_texts = preprocessor.process(texts, source_path=csv_path)
+
     # Initialize and train model
     analyzer = SentimentAnalyzer()
-    results = analyzer.train(texts, labels)
+    results = analyzer.train(processed_texts, labels, preprocessed=True)
 
     # Print results
     print("Training Results:")
@@ -25,6 +31,15 @@ def train_with_csv(csv_path):
     # Save model
     analyzer.save_model("sentiment_model.joblib")
 
+    # Register it as a new version; app.py switches to it via /admin/models/<version>/activate
+    metadata = ModelRegistry(REGISTRY_DIR).register(
+        "sentiment_model.joblib",
+        training_data=csv_path,
+        train_score=results["train_score"],
+        test_score=results["test_score"],
+    )
+    print(f"Registered model version {metadata['version']}")
+
 
 if __name__ == "__main__":
     # Replace with path to your training data
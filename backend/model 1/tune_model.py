@@ -0,0 +1,166 @@
+# tune_model.py
+"""Cross-validated hyperparameter search for the TF-IDF + LinearSVC pipeline.
+
+Candidates are evaluated on all cores. The pipeline is given a joblib
+Memory, so each fitted TF-IDF transform (per vectorizer setting and fold) is
+computed once and reused for every classifier setting. The winning pipeline
+is refit on the full data, saved in the format app.py loads and registered
+as a new version in the model registry (see registry.py).
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import joblib
+import pandas as pd
+from joblib import Memory
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+
+from preprocessing import CorpusPreprocessor
+from registry import REGISTRY_DIR, ModelRegistry
+from sentiment_model import SentimentAnalyzer
+
+DEFAULT_GRID = {
+    "tfidf__max_features": [5000, 20000, None],
+    "tfidf__ngram_range": [(1, 1), (1, 2)],
+    "tfidf__min_df": [1, 2],
+    "tfidf__sublinear_tf": [False, True],
+    "classifier__C": [0.1, 0.5, 1.0, 2.0],
+    "classifier__class_weight": [None, "balanced"],
+}
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tfidf_cache")
+
+
+def load_grid(path):
+    """Read a JSON grid; lists of two ints are turned into ngram tuples"""
+    with open(path, "r") as f:
+        grid = json.load(f)
+    for name, values in grid.items():
+        if name.endswith("ngram_range"):
+            grid[name] = [tuple(value) for value in values]
+    return grid
+
+
+def results_table(search):
+    results = pd.DataFrame(search.cv_results_)
+    columns = [c for c in results.columns if c.startswith("param_")]
+    table = results[
+        columns
+        + [
+            "mean_fit_time",
+            "mean_score_time",
+            "mean_test_f1_macro",
+            "std_test_f1_macro",
+            "mean_test_accuracy",
+            "rank_test_f1_macro",
+        ]
+    ].rename(columns={c: c[len("param_") :] for c in columns})
+    return table.sort_values("rank_test_f1_macro")
+
+
+def tune(
+    csv_path,
+    text_column="text",
+    label_column="sentiment",
+    grid=None,
+    folds=5,
+    n_jobs=-1,
+    output="sentiment_model.joblib",
+    clear_cache=False,
+    registry_dir=REGISTRY_DIR,
+    activate=False,
+):
+    """Search the grid, save the best pipeline and register it
+
+    Pass ``registry_dir=None`` to skip registration; with ``activate`` the
+    new version becomes CURRENT and is picked up by running servers.
+    """
+    df = pd.read_csv(csv_path).dropna(subset=[text_column, label_column])
+    labels = df[label_column].tolist()
+    with CorpusPreprocessor() as preprocessor:
+        processed_texts = preprocessor.process(df[text_column].tolist(), source_path=csv_path)
+
+    if clear_cache:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    memory = Memory(CACHE_DIR, verbose=0)
+
+    search = GridSearchCV(
+        SentimentAnalyzer.build_pipeline(memory=memory),
+        grid or DEFAULT_GRID,
+        scoring=["f1_macro", "accuracy"],
+        refit="f1_macro",
+        cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=42),
+        n_jobs=n_jobs,
+        verbose=1,
+    )
+
+    start = time.time()
+    search.fit(processed_texts, labels)
+    elapsed = time.time() - start
+
+    table = results_table(search)
+    with pd.option_context("display.max_rows", 50, "display.width", 200):
+        print(table.head(20).to_string(index=False))
+    print(f"\nSearch finished in {elapsed:.1f}s over {len(table)} candidates")
+    print(f"Best params: {search.best_params_}")
+    print(f"Best CV macro F1: {search.best_score_:.3f}")
+
+    # Drop the cache reference so the saved pipeline is self-contained
+    best_model = search.best_estimator_
+    best_model.set_params(memory=None)
+    joblib.dump(best_model, output)
+    print(f"Best model saved to {output}")
+
+    table_path = os.path.splitext(output)[0] + "_tuning.csv"
+    table.to_csv(table_path, index=False)
+    print(f"Timing and score table saved to {table_path}")
+
+    if registry_dir:
+        registry = ModelRegistry(registry_dir)
+        metadata = registry.register(
+            output,
+            trainer="tune_model",
+            data=os.path.abspath(csv_path),
+            best_params=dict(search.best_params_),
+            cv_f1_macro=float(search.best_score_),
+        )
+        print(f"Registered model version {metadata['version']}")
+        if activate:
+            registry.set_current(metadata["version"])
+            print(f"CURRENT -> {metadata['version']}")
+
+    return search, table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the LinearSVC pipeline")
+    parser.add_argument("csv_path", nargs="?", default="sentiment_reviews.csv")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--label-column", default="sentiment")
+    parser.add_argument("--grid", help="JSON file with the parameter grid")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--output", default="sentiment_model.joblib")
+    parser.add_argument("--clear-cache", action="store_true")
+    parser.add_argument("--registry", default=REGISTRY_DIR)
+    parser.add_argument("--no-register", action="store_true",
+                        help="Only save the model, do not add it to the registry")
+    parser.add_argument("--activate", action="store_true",
+                        help="Make the registered version CURRENT")
+    args = parser.parse_args()
+
+    tune(
+        args.csv_path,
+        text_column=args.text_column,
+        label_column=args.label_column,
+        grid=load_grid(args.grid) if args.grid else None,
+        folds=args.folds,
+        n_jobs=args.n_jobs,
+        output=args.output,
+        clear_cache=args.clear_cache,
+        registry_dir=None if args.no_register else args.registry,
+        activate=args.activate,
+    )
@@ -61,6 +61,10 @@ class FlexibleSentimentAnalyzer:
         # Decide which scores to use (raw text or preprocessed text)
         scores = raw_scores
 
+        return self._to_result(scores)
+
+    @staticmethod
+    def _to_result(scores):
         # Determine sentiment category
         if scores["compound"] >= 0.05:
             sentiment = "positive"
@@ -77,6 +81,12 @@ class FlexibleSentimentAnalyzer:
             "neutral_score": scores["neu"],
         }
 
+    def analyze_texts(self, texts):
+        """Score many texts on the raw-text path, without the debug output"""
+        return [
+            self._to_result(self.analyzer.polarity_scores(str(text))) for text in texts
+        ]
+
     def analyze_dataframe(self, df, text_column):
         """Analyze sentiment for all texts in a dataframe"""
         if text_column not in df.columns:
@@ -100,19 +110,30 @@ class FlexibleSentimentAnalyzer:
 
         return df
 
-    def evaluate_model(self, df, text_column, label_column):
-        """Evaluate the model using accuracy and confusion matrix"""
+    def evaluate_model(self, df, text_column, label_column,
+                       save_path="confusion_matrix.png", show=False):
+        """Evaluate the model using accuracy and confusion matrix
+
+        The confusion matrix is saved to ``save_path``; it is only shown in a
+        window when ``show`` is set, so evaluation also runs headless.
+        """
         # Check if the required columns exist
         if text_column not in df.columns:
             raise ValueError(f"'{text_column}' not found in dataframe.")
         if label_column not in df.columns:
             raise ValueError(f"'{label_column}' not found in dataframe.")
 
-        # Preprocess text and analyze sentiment
-        df = self.analyze_dataframe(df, text_column)
+        # Analyze sentiment on the batched raw-text path
+        print(f"Evaluating on {len(df)} texts...")
+        results = self.analyze_texts(df[text_column].tolist())
+        df["sentiment"] = [r["sentiment"] for r in results]
+        df["compound_score"] = [r["compound_score"] for r in results]
+        df["positive_score"] = [r["positive_score"] for r in results]
+        df["negative_score"] = [r["negative_score"] for r in results]
+        df["neutral_score"] = [r["neutral_score"] for r in results]
 
         # Get actual and predicted sentiment
-        actual = df[label_column].tolist()
+        actual = df[label_column].astype(str).str.strip().str.lower().tolist()
         predicted = df["sentiment"].tolist()
 
         # Calculate accuracy
@@ -136,7 +157,11 @@ class FlexibleSentimentAnalyzer:
         plt.xlabel("Predicted Sentiment")
         plt.ylabel("Actual Sentiment")
         plt.title("Confusion Matrix")
-        plt.show()
+        if save_path:
+            plt.savefig(save_path)
+        if show:
+            plt.show()
+        plt.close()
 
         print(f"Accuracy: {accuracy:.2f}")
         return accuracy, cm
@@ -0,0 +1,324 @@
+# embedding_store.py
+"""Append-only, memory-mapped store of transformer outputs.
+
+For every analyzed comment the store keeps the pooled embedding and the
+classifier logits as float16 rows, keyed by a hash of the text. Trying new
+thresholds, sentiment mappings or another lightweight head then becomes a
+matrix operation over the stored arrays instead of a new BERT pass, and the
+embeddings support batched nearest-neighbour search for near-duplicate
+reviews.
+
+Layout of a store directory:
+    meta.json        embedding size, label names and model name
+    keys.bin         20-byte SHA-1 of each text, one per row
+    embeddings.f16   float16 rows of ``dim`` values
+    logits.f16       float16 rows of ``num_labels`` values
+
+``keys.bin`` is written last, so its length defines the committed rows; on
+open, rows past it in the other files (from an interrupted append) are cut
+off. Callers choose the keys (``SentimentAnalyzer`` hashes each text
+together with its truncation settings), so membership and duplicate pairs
+are reported by key. Appends hold an exclusive lock on ``keys.bin``, so several processes
+(e.g. prefork workers) can share one store. The lock uses ``fcntl`` on
+POSIX and ``msvcrt`` on Windows.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+KEY_SIZE = 20
+
+
+def text_key(text):
+    return hashlib.sha1(str(text).encode("utf-8")).digest()
+
+
+def lock_file(f):
+    """Exclusive lock on an open file, released when it is closed"""
+    try:
+        import fcntl
+    except ImportError:
+        import msvcrt
+
+        # Lock the first byte; msvcrt retries for about ten seconds
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        return
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+
+def softmax(logits):
+    logits = logits.astype(np.float32)
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class EmbeddingStore:
+    def __init__(self, directory, dim=None, labels=None, model_name=None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as f:
+                self.meta = json.load(f)
+        else:
+            if dim is None or labels is None:
+                raise ValueError("dim and labels are required to create a new store")
+            self.meta = {"dim": int(dim), "labels": list(labels), "model_name": model_name}
+            with open(meta_path, "w") as f:
+                json.dump(self.meta, f, indent=2)
+
+        self.dim = self.meta["dim"]
+        self.labels = self.meta["labels"]
+        self.num_labels = len(self.labels)
+
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.embeddings_path = os.path.join(directory, "embeddings.f16")
+        self.logits_path = os.path.join(directory, "logits.f16")
+        for path in (self.keys_path, self.embeddings_path, self.logits_path):
+            if not os.path.exists(path):
+                open(path, "wb").close()
+
+        self.size = 0
+        self.index = {}
+        self.keys = []  # key of each row
+        self._embeddings = None
+        self._logits = None
+        with open(self.keys_path, "rb") as f:
+            lock_file(f)
+            self._refresh(f)
+            self._truncate_uncommitted()
+
+    def _refresh(self, keys_file):
+        """Index keys appended since the last read (possibly by other processes)"""
+        keys_file.seek(self.size * KEY_SIZE)
+        keys = keys_file.read()
+        for i in range(len(keys) // KEY_SIZE):
+            key = keys[i * KEY_SIZE : (i + 1) * KEY_SIZE]
+            self.index[key] = self.size
+            self.keys.append(key)
+            self.size += 1
+
+    def _truncate_uncommitted(self):
+        """Drop rows of an append that was interrupted before its keys were written"""
+        for path, width in (
+            (self.embeddings_path, self.dim),
+            (self.logits_path, self.num_labels),
+        ):
+            expected = self.size * width * 2
+            if os.path.getsize(path) > expected:
+                with open(path, "r+b") as f:
+                    f.truncate(expected)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        """Whether a key (as passed to ``append``) is stored"""
+        if not isinstance(key, bytes):
+            raise TypeError(
+                "EmbeddingStore membership is by key; hash texts with the key "
+                "function used to append them (e.g. SentimentAnalyzer.is_stored)"
+            )
+        return self.lookup([key])[0] >= 0
+
+    def lookup(self, keys):
+        """Row of each key, -1 where the key is not stored"""
+        with self._lock:
+            if os.path.getsize(self.keys_path) > self.size * KEY_SIZE:
+                with open(self.keys_path, "rb") as f:
+                    self._refresh(f)
+            return np.array([self.index.get(key, -1) for key in keys], dtype=np.int64)
+
+    def append(self, keys, embeddings, logits):
+        """Append new rows; keys that are already stored are skipped"""
+        embeddings = np.asarray(embeddings, dtype=np.float16).reshape(-1, self.dim)
+        logits = np.asarray(logits, dtype=np.float16).reshape(-1, self.num_labels)
+
+        with self._lock, open(self.keys_path, "r+b") as keys_file:
+            lock_file(keys_file)
+            self._refresh(keys_file)
+            self._truncate_uncommitted()
+
+            new = []
+            seen = set()
+            for i, key in enumerate(keys):
+                if key not in self.index and key not in seen:
+                    new.append(i)
+                    seen.add(key)
+            if not new:
+                return
+
+            with open(self.embeddings_path, "ab") as f:
+                f.write(np.ascontiguousarray(embeddings[new]).tobytes())
+            with open(self.logits_path, "ab") as f:
+                f.write(np.ascontiguousarray(logits[new]).tobytes())
+            keys_file.seek(0, os.SEEK_END)
+            keys_file.write(b"".join(keys[i] for i in new))
+            keys_file.flush()
+
+            for i in new:
+                self.index[keys[i]] = self.size
+                self.keys.append(keys[i])
+                self.size += 1
+            # Remap lazily on next access
+            self._embeddings = None
+            self._logits = None
+
+    def _map(self, path, width):
+        if self.size == 0:
+            return np.zeros((0, width), dtype=np.float16)
+        return np.memmap(path, dtype=np.float16, mode="r", shape=(self.size, width))
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None or len(self._embeddings) != self.size:
+            self._embeddings = self._map(self.embeddings_path, self.dim)
+        return self._embeddings
+
+    @property
+    def logits(self):
+        if self._logits is None or len(self._logits) != self.size:
+            self._logits = self._map(self.logits_path, self.num_labels)
+        return self._logits
+
+    # Re-scoring -------------------------------------------------------------
+
+    def probabilities(self, rows=None, temperature=1.0):
+        logits = self.logits if rows is None else self.logits[rows]
+        return softmax(np.asarray(logits, dtype=np.float32) / temperature)
+
+    def ratings(self, rows=None, temperature=1.0):
+        """Star rating (1-5) and its probability from the stored logits"""
+        probabilities = self.probabilities(rows, temperature)
+        label_ratings = np.array([int(label.split()[0]) for label in self.labels])
+        top = probabilities.argmax(axis=1)
+        return label_ratings[top], probabilities[np.arange(len(top)), top]
+
+    def rescore(self, rows=None, positive_from=4, negative_to=2, min_confidence=None):
+        """Sentiments under a different rating mapping / confidence threshold
+
+        Rows whose top-star probability is below ``min_confidence`` are
+        labelled NEUTRAL.
+        """
+        ratings, confidences = self.ratings(rows)
+        sentiments = np.full(len(ratings), "NEUTRAL", dtype=object)
+        sentiments[ratings >= positive_from] = "POSITIVE"
+        sentiments[ratings <= negative_to] = "NEGATIVE"
+        if min_confidence is not None:
+            sentiments[confidences < min_confidence] = "NEUTRAL"
+        return sentiments, ratings, confidences
+
+    def apply_head(self, weights, bias=None, rows=None, chunk_size=65536):
+        """Logits of a new linear head (``dim`` x outputs) over the stored embeddings"""
+        weights = np.asarray(weights, dtype=np.float32)
+        embeddings = self.embeddings if rows is None else self.embeddings[rows]
+        outputs = []
+        for start in range(0, len(embeddings), chunk_size):
+            chunk = np.asarray(embeddings[start : start + chunk_size], dtype=np.float32)
+            outputs.append(chunk @ weights)
+        outputs = np.concatenate(outputs) if outputs else np.zeros((0, weights.shape[1]))
+        return outputs + bias if bias is not None else outputs
+
+    # Near-duplicate search --------------------------------------------------
+
+    def nearest(self, queries, k=5, chunk_size=65536, exclude_self_rows=None):
+        """Top-k cosine neighbours of each query vector among the stored rows
+
+        Returns ``(rows, similarities)``, both shaped (len(queries), k). The
+        store is scanned in chunks so it never has to fit in memory as
+        float32. ``exclude_self_rows`` gives each query's own row, if any.
+        """
+        queries = np.array(queries, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+        k = min(k, self.size)
+        if k == 0:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0))
+
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        best_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        for start in range(0, self.size, chunk_size):
+            chunk = np.asarray(self.embeddings[start : start + chunk_size], dtype=np.float32)
+            chunk /= np.linalg.norm(chunk, axis=1, keepdims=True) + 1e-12
+            sims = queries @ chunk.T
+            if exclude_self_rows is not None:
+                local = np.asarray(exclude_self_rows) - start
+                mask = (local >= 0) & (local < len(chunk))
+                sims[np.flatnonzero(mask), local[mask]] = -np.inf
+
+            rows = np.broadcast_to(np.arange(start, start + len(chunk)), sims.shape)
+            merged_sims = np.concatenate([best_sims, sims], axis=1)
+            merged_rows = np.concatenate([best_rows, rows], axis=1)
+            top = np.argpartition(-merged_sims, k - 1, axis=1)[:, :k]
+            best_sims = np.take_along_axis(merged_sims, top, axis=1)
+            best_rows = np.take_along_axis(merged_rows, top, axis=1)
+
+        order = np.argsort(-best_sims, axis=1)
+        return (
+            np.take_along_axis(best_rows, order, axis=1),
+            np.take_along_axis(best_sims, order, axis=1),
+        )
+
+    def find_duplicates(self, threshold=0.95, k=5, batch_size=1024):
+        """Pairs of stored rows whose embeddings have cosine similarity >= threshold
+
+        Each pair is ``(row, neighbour, similarity, key, neighbour_key)``,
+        most similar first.
+        """
+        pairs = []
+        for start in range(0, self.size, batch_size):
+            rows = np.arange(start, min(start + batch_size, self.size))
+            neighbours, sims = self.nearest(
+                self.embeddings[rows], k=k, exclude_self_rows=rows
+            )
+            for row, row_neighbours, row_sims in zip(rows, neighbours, sims):
+                for neighbour, sim in zip(row_neighbours, row_sims):
+                    if sim >= threshold and row < neighbour:
+                        pairs.append((
+                            int(row), int(neighbour), float(sim),
+                            self.keys[row], self.keys[neighbour],
+                        ))
+        return sorted(pairs, key=lambda pair: -pair[2])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect an embedding store")
+    parser.add_argument("store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rescore_parser = subparsers.add_parser("rescore", help="Sentiment mix under new settings")
+    rescore_parser.add_argument("--positive-from", type=int, default=4)
+    rescore_parser.add_argument("--negative-to", type=int, default=2)
+    rescore_parser.add_argument("--min-confidence", type=float, default=None)
+
+    duplicates_parser = subparsers.add_parser("duplicates", help="Near-duplicate rows")
+    duplicates_parser.add_argument("--threshold", type=float, default=0.95)
+    duplicates_parser.add_argument("--k", type=int, default=5)
+
+    args = parser.parse_args()
+    store = EmbeddingStore(args.store)
+    print(f"{len(store)} stored rows ({store.meta.get('model_name')})")
+
+    if args.command == "rescore":
+        sentiments, ratings, confidences = store.rescore(
+            positive_from=args.positive_from,
+            negative_to=args.negative_to,
+            min_confidence=args.min_confidence,
+        )
+        values, counts = np.unique(sentiments, return_counts=True)
+        for value, count in zip(values, counts):
+            print(f"{value}: {count} ({count / len(sentiments) * 100:.1f}%)")
+        print(f"Average rating: {ratings.mean():.2f}")
+    else:
+        pairs = store.find_duplicates(threshold=args.threshold, k=args.k)
+        print(f"{len(pairs)} near-duplicate pairs")
+        for row, neighbour, sim, key, neighbour_key in pairs[:50]:
+            print(f"{row}\t{neighbour}\t{sim:.4f}\t{key.hex()}\t{neighbour_key.hex()}")
@@ -0,0 +1,316 @@
+# estimate.py
+"""Progressive sampled estimation of the sentiment mix of a large CSV.
+
+Rows are scored in growing random samples, stratified by a column such as
+category or product (given, or the first of STRATA_COLUMNS present) with
+proportional allocation. Strata too small to get two rows of the first
+sample are merged into one "(other)" stratum, so every stratum is sampled
+from the first round on. After every round the sentiment proportions and
+the mean rating are re-estimated with confidence intervals, using the
+stratified estimator with finite population correction, so the interval
+shrinks to zero once every row has been scored.
+
+With a ``state_dir`` the estimator publishes its snapshot there after every
+round and honours a stop request file, so the job can be polled and stopped
+through any process sharing the directory (e.g. every prefork worker).
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from model import SENTIMENTS, SentimentResults
+
+JOB_ID = re.compile(r"[0-9a-f]{32}")
+STRATA_COLUMNS = ["category", "product", "name"]
+OTHER_STRATUM = "(other)"
+
+
+def job_path(state_dir, job_id, suffix=".json"):
+    if not JOB_ID.fullmatch(job_id):
+        raise ValueError(f"Invalid estimate job id: {job_id}")
+    return os.path.join(state_dir, f"{job_id}{suffix}")
+
+
+def read_snapshot(state_dir, job_id):
+    """Last published snapshot of a job, None if unknown or evicted"""
+    try:
+        with open(job_path(state_dir, job_id), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def request_stop(state_dir, job_id):
+    """Ask the process running a job to stop it; returns its last snapshot"""
+    snapshot = read_snapshot(state_dir, job_id)
+    if snapshot is not None:
+        open(job_path(state_dir, job_id, ".stop"), "w").close()
+    return snapshot
+
+
+def evict_snapshots(state_dir, ttl):
+    """Remove job files not updated for ``ttl`` seconds"""
+    cutoff = time.time() - ttl
+    for name in os.listdir(state_dir):
+        path = os.path.join(state_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ProgressiveEstimator:
+    def __init__(self, analyzer, df, text_column, strata_column=None,
+                 initial_sample=200, growth=2.0, confidence_level=0.95,
+                 target_margin=None, batch_size=32, seed=42, state_dir=None):
+        self.analyzer = analyzer
+        self.texts = df[text_column].tolist()
+        self.total = len(self.texts)
+        self.growth = growth
+        self.initial_sample = initial_sample
+        self.z = NormalDist().inv_cdf(0.5 + confidence_level / 2)
+        self.confidence_level = confidence_level
+        self.target_margin = target_margin
+        self.batch_size = batch_size
+        self.state_dir = state_dir
+
+        self.job_id = uuid.uuid4().hex
+        self.status = "running"
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # None detects a strata column, False disables stratification
+        if strata_column is None:
+            strata_column = next((c for c in STRATA_COLUMNS if c in df.columns), None)
+        self.strata_column = strata_column or None
+        if self.strata_column:
+            strata = df[self.strata_column].fillna("(missing)").astype(str).to_numpy()
+            _, inverse, counts = np.unique(strata, return_inverse=True, return_counts=True)
+            small = counts * min(initial_sample, self.total) < 2 * self.total
+            if small.sum() > 1:
+                strata = np.where(small[inverse], OTHER_STRATUM, strata)
+        else:
+            strata = np.zeros(self.total, dtype=object)
+
+        # A random order of the rows inside each stratum; sampling takes the
+        # next rows of every stratum, so each round extends the previous one
+        rng = np.random.RandomState(seed)
+        self.strata = []
+        for name in pd.unique(strata):
+            rows = np.flatnonzero(strata == name)
+            rng.shuffle(rows)
+            self.strata.append({"name": name, "rows": rows, "scored": 0})
+
+        self.results = SentimentResults(self.total)
+        self.scored = 0
+        self.estimate = None
+
+    def _allocate(self, sample_size):
+        """Rows to score per stratum so the sample is ``sample_size`` rows, proportionally
+
+        Rows already scored are kept, so the total only exceeds
+        ``sample_size`` if more rows than that have been scored already.
+        """
+        sizes = np.array([len(stratum["rows"]) for stratum in self.strata])
+        targets = np.array([stratum["scored"] for stratum in self.strata])
+
+        # One row per stratum for its mean, then a second for its variance,
+        # largest strata first, as far as the budget allows
+        for minimum in (1, 2):
+            for i in np.argsort(-sizes, kind="stable"):
+                if sample_size - targets.sum() <= 0:
+                    break
+                targets[i] = max(targets[i], min(minimum, sizes[i]))
+
+        # Spread the rest over the strata furthest below their proportional share
+        remaining = sample_size - targets.sum()
+        if remaining > 0:
+            deficit = np.clip(sample_size * sizes / self.total - targets, 0, None)
+            shares = deficit * remaining / deficit.sum()
+            extra = np.floor(shares).astype(int)
+            leftover = remaining - extra.sum()
+            extra[np.argsort(-(shares - extra), kind="stable")[:leftover]] += 1
+            targets += extra
+        return np.minimum(targets, sizes).tolist()
+
+    def _score_round(self, sample_size):
+        targets = self._allocate(sample_size)
+        new_rows = []
+        for stratum, target in zip(self.strata, targets):
+            new_rows.append(stratum["rows"][stratum["scored"] : target])
+        new_rows = np.concatenate(new_rows) if new_rows else np.zeros(0, dtype=int)
+
+        for start in range(0, len(new_rows), self.batch_size * 8):
+            if self.stopping():
+                return False
+            rows = new_rows[start : start + self.batch_size * 8]
+            scored = SentimentResults(len(rows))
+            self.analyzer.analyze_into(
+                [self.texts[i] for i in rows], scored, batch_size=self.batch_size
+            )
+            with self._lock:
+                self.results.codes[rows] = scored.codes
+                self.results.ratings[rows] = scored.ratings
+                self.results.confidences[rows] = scored.confidences
+
+        with self._lock:
+            for stratum, target in zip(self.strata, targets):
+                stratum["scored"] = target
+            self.scored = sum(stratum["scored"] for stratum in self.strata)
+            self.estimate = self._compute_estimate()
+        self.publish()
+        return True
+
+    def stopping(self):
+        """True once stop() was called here or a stop was requested through state_dir"""
+        if (
+            not self._stop.is_set()
+            and self.state_dir is not None
+            and os.path.exists(job_path(self.state_dir, self.job_id, ".stop"))
+        ):
+            self._stop.set()
+        return self._stop.is_set()
+
+    def publish(self):
+        """Write the snapshot where every process sharing state_dir can read it"""
+        if self.state_dir is None:
+            return
+        path = job_path(self.state_dir, self.job_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def _stratified(self, values_by_stratum, worst_variance):
+        """Stratified mean and its variance (with finite population correction)
+
+        A stratum without sampled rows yet (only possible for rounds smaller
+        than the number of strata) is left out of the mean, whose weights
+        are renormalized over the sampled strata, and adds the worst-case
+        variance.
+        """
+        sampled = sum(
+            len(stratum["rows"]) for stratum, values in zip(self.strata, values_by_stratum)
+            if len(values)
+        )
+        mean = variance = 0.0
+        for stratum, values in zip(self.strata, values_by_stratum):
+            size, n = len(stratum["rows"]), len(values)
+            weight = size / self.total
+            if n == 0:
+                variance += weight**2 * worst_variance
+                continue
+            mean += size / sampled * values.mean()
+            if n < size:
+                # Unknown spread from a single row: assume the worst case
+                s2 = values.var(ddof=1) if n > 1 else worst_variance
+                variance += weight**2 * (1 - n / size) * s2 / n
+        return mean, variance
+
+    def _interval(self, mean, variance):
+        margin = self.z * float(np.sqrt(variance))
+        return {
+            "estimate": float(mean),
+            "low": float(mean - margin),
+            "high": float(mean + margin),
+            "margin": margin,
+        }
+
+    def _compute_estimate(self):
+        sampled = [stratum["rows"][: stratum["scored"]] for stratum in self.strata]
+
+        proportions = {}
+        for code, sentiment in enumerate(SENTIMENTS):
+            indicators = [(self.results.codes[rows] == code).astype(float) for rows in sampled]
+            interval = self._interval(*self._stratified(indicators, 0.25))
+            interval["low"] = max(interval["low"], 0.0)
+            interval["high"] = min(interval["high"], 1.0)
+            proportions[sentiment] = interval
+
+        ratings = [self.results.ratings[rows].astype(float) for rows in sampled]
+        mean_rating = self._interval(*self._stratified(ratings, 4.0))
+
+        return {
+            "proportions": proportions,
+            "mean_rating": mean_rating,
+        }
+
+    def _tight_enough(self):
+        if self.target_margin is None or self.estimate is None:
+            return False
+        margins = [p["margin"] for p in self.estimate["proportions"].values()]
+        return max(margins) <= self.target_margin
+
+    def run_round(self, sample_size=None):
+        """Score the next round synchronously; returns False once finished"""
+        if self.scored >= self.total:
+            return False
+        if sample_size is None:
+            if self.scored == 0:
+                sample_size = self.initial_sample
+            else:
+                sample_size = int(self.scored * self.growth)
+        return self._score_round(min(sample_size, self.total))
+
+    def _refine(self):
+        try:
+            while not self.stopping() and self.scored < self.total:
+                if self._tight_enough():
+                    break
+                if not self.run_round():
+                    break
+            with self._lock:
+                if self.scored >= self.total:
+                    self.status = "done"
+                elif self._tight_enough():
+                    self.status = "converged"
+                else:
+                    self.status = "stopped"
+                self.finished = time.time()
+        except Exception as e:
+            with self._lock:
+                self.status = "error"
+                self.error = str(e)
+                self.finished = time.time()
+        self.publish()
+
+    def start(self):
+        """Score the first sample now, then keep refining in the background"""
+        self.run_round()
+        self._thread = threading.Thread(target=self._refine, daemon=True)
+        self._thread.start()
+        return self.snapshot()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        return self.snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "error": self.error,
+                "scored": self.scored,
+                "total": self.total,
+                "exact": self.scored >= self.total,
+                "strata_column": self.strata_column,
+                "strata": len(self.strata),
+                "confidence_level": self.confidence_level,
+                "elapsed_seconds": time.time() - self.started,
+                **(self.estimate or {}),
+            }
@@ -1,32 +1,244 @@
 # main.py
-from flask import Flask, request, jsonify, send_file
-from model import SentimentAnalyzer
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
+from model import (
+    MODEL_NAME as DEFAULT_MODEL_NAME,
+    SentimentAnalyzer,
+    load_pipeline,
+    load_store,
+    unload_pipeline,
+)
+from estimate import ProgressiveEstimator, evict_snapshots, read_snapshot, request_stop
 import pandas as pd
+import numpy as np
 import os
+import sys
+import hmac
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
 from werkzeug.utils import secure_filename
 import logging
 from datetime import datetime
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# The model registry and hot swapping are shared with model 1
+sys.path.append(os.path.dirname(BASE_DIR))
+from model_registry import HotModel, ModelRegistry  # noqa: E402
+
+try:
+    import orjson
+
+    def ndjson_line(obj):
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+except ImportError:
+
+    def ndjson_line(obj):
+        return (json.dumps(obj) + "\n").encode("utf-8")
+
 app = Flask(__name__)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure upload folder
-UPLOAD_FOLDER = "uploads"
-RESULTS_FOLDER = "results"
+# Configure upload folder. Uploads, results and the plots/report of the last
+# analysis are kept under absolute paths: send_file would otherwise resolve
+# them against the app directory rather than the working directory.
+UPLOAD_FOLDER = os.path.abspath(os.environ.get("UPLOAD_FOLDER", "uploads"))
+RESULTS_FOLDER = os.path.abspath(os.environ.get("RESULTS_FOLDER", "results"))
+REPORT_FOLDER = os.path.abspath(os.environ.get("REPORT_FOLDER", "."))
 ALLOWED_EXTENSIONS = {"csv"}
+STREAM_CHUNK_SIZE = 256
+
+# Keep pooled embeddings and logits of analyzed comments (see embedding_store.py)
+EMBEDDING_STORE = os.environ.get("EMBEDDING_STORE")
+
+# Served models are versions of the registry (see ../model_registry.py); its
+# CURRENT version is served and followed by every prefork worker. MODEL_NAME
+# (a Hugging Face name or a local directory) only seeds an empty registry.
+MODEL_REGISTRY = os.environ.get("MODEL_REGISTRY", os.path.join(BASE_DIR, "registry"))
+MODEL_NAME = os.environ.get("MODEL_NAME", DEFAULT_MODEL_NAME)
+# Split long reviews into overlapping token windows instead of truncating them
+LONG_DOCUMENTS = os.environ.get("LONG_DOCUMENTS", "").lower() in ("1", "true", "yes")
+WINDOW_STRIDE = int(os.environ.get("WINDOW_STRIDE", 128))
+# Admin endpoints require this token in X-Admin-Token; without it they are disabled
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+WARMUP_TEXTS = [
+    "This product is amazing! I love it!",
+    "Worst purchase ever. Don't buy this.",
+    "It's okay, nothing special.",
+]
+
+# Estimate jobs run in the process that started them, least recently used
+# first. Their snapshots are published to ESTIMATES_DIR, so a poll or stop
+# that lands on another prefork worker is served from there. Jobs are
+# evicted once they have not been updated for ESTIMATE_TTL seconds, and the
+# least recently used one is stopped when a process runs more than
+# MAX_ESTIMATES.
+ESTIMATES_DIR = os.environ.get("ESTIMATES_DIR", os.path.join(RESULTS_FOLDER, "estimates"))
+ESTIMATE_TTL = float(os.environ.get("ESTIMATE_TTL", 3600))
+MAX_ESTIMATES = int(os.environ.get("MAX_ESTIMATES", 16))
+estimates = OrderedDict()
+estimates_lock = threading.Lock()
 
 # Create folders if they don't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULTS_FOLDER, exist_ok=True)
+os.makedirs(ESTIMATES_DIR, exist_ok=True)
+
+
+registry = ModelRegistry(MODEL_REGISTRY)
+if registry.current() is None:
+    # Seed an empty registry with the configured model
+    registry.set_current(
+        registry.find(MODEL_NAME)
+        or registry.register_name(MODEL_NAME, note="imported at startup")["version"]
+    )
+
+
+def warm_model(version):
+    """Load a registered version and check it on the warm-up texts
+
+    Runs the model once so its first real request is not cold, and raises
+    if it fails or returns anything but star ratings with probabilities.
+    Returns the model name requests of this version are served with.
+    """
+    model_name = registry.model_name(version)
+    load_pipeline(model_name)
+    if EMBEDDING_STORE:
+        load_store(EMBEDDING_STORE, model_name)
+    SentimentAnalyzer(
+        model_name=model_name, long_documents=LONG_DOCUMENTS, stride=WINDOW_STRIDE
+    ).check(WARMUP_TEXTS)
+    return model_name
+
+
+def release_model(version):
+    """Free a version's pipeline unless the served or previous version uses it"""
+    model_name = registry.model_name(version)
+    if model_name not in {registry.model_name(v) for v in model.loaded_versions()}:
+        unload_pipeline(model_name)
+
+
+# The served version and the previous one (kept loaded for instant rollback);
+# CURRENT is loaded by warmup() or on the first request
+model = HotModel(registry, warm_model, unload=release_model)
+
+
+def warmup():
+    """Load the model up front (called by prefork.py before forking workers)"""
+    model.load_current()
+
+
+def make_analyzer():
+    """Analyzer pinned to the currently served version for the whole request"""
+    served = model.get()
+    if served is None:
+        raise RuntimeError(f"No model version is being served: {model.error}")
+    version, model_name = served
+    g.model_version = version
+    return SentimentAnalyzer(
+        model_name=model_name,
+        embedding_store=EMBEDDING_STORE,
+        long_documents=LONG_DOCUMENTS,
+        stride=WINDOW_STRIDE,
+    )
+
+
+@app.after_request
+def add_model_version(response):
+    # The model that served the request, or the current one for other routes
+    served = model.active
+    version = g.get("model_version") or (served[0] if served else registry.current())
+    if version is not None:
+        response.headers["X-Model-Version"] = version
+    return response
+
+
+def check_admin():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN is not set)"}), 403
+    token = request.headers.get("X-Admin-Token") or ""
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({"error": "Invalid admin token"}), 403
+    return None
 
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def stream_analysis(analyzer, file_path, filename, text_column, chunk_size=STREAM_CHUNK_SIZE):
+    """Score the CSV chunk by chunk, yielding NDJSON result lines as they are ready
+
+    Rows are appended to the result file as each chunk finishes, so neither
+    the input nor the results are held in memory; the final line carries the
+    same statistics as the non-streaming response.
+    """
+    result_filename = f"analyzed_{filename}"
+    result_path = os.path.join(RESULTS_FOLDER, result_filename)
+
+    sentiment_counts = Counter()
+    confidences = []
+    row = 0
+    try:
+        for chunk_index, chunk in enumerate(pd.read_csv(file_path, chunksize=chunk_size)):
+            chunk = analyzer.analyze_dataframe(chunk, text_column)
+            chunk.to_csv(
+                result_path, mode="w" if chunk_index == 0 else "a",
+                header=chunk_index == 0, index=False,
+            )
+
+            results = analyzer.results
+            lines = []
+            for i in range(len(results)):
+                record = results.record(i)
+                lines.append(
+                    ndjson_line(
+                        {
+                            "row": row,
+                            "sentiment": record["sentiment"],
+                            "rating": record["rating"],
+                            "confidence": record["confidence"],
+                            "sentiment_score": record["score"],
+                        }
+                    )
+                )
+                row += 1
+            sentiment_counts.update(results.sentiment_counts())
+            confidences.append(results.confidences)
+            yield b"".join(lines)
+    except Exception as e:
+        logger.error(f"Error streaming analysis: {str(e)}")
+        yield ndjson_line({"error": str(e)})
+        return
+
+    confidences = np.concatenate(confidences) if confidences else np.zeros(0)
+    confidence_stats = {}
+    if len(confidences):
+        confidence_stats = {
+            "mean": float(confidences.mean()),
+            "median": float(np.median(confidences)),
+            "min": float(confidences.min()),
+            "max": float(confidences.max()),
+        }
+
+    yield ndjson_line(
+        {
+            "status": "success",
+            "message": "Analysis completed successfully",
+            "result_file": result_filename,
+            "model_version": g.get("model_version"),
+            "statistics": {
+                "sentiment_counts": dict(sentiment_counts),
+                "confidence_stats": confidence_stats,
+            },
+        }
+    )
+
+
 @app.route("/analyze", methods=["POST"])
 def analyze_csv():
     try:
@@ -55,6 +267,27 @@ def analyze_csv():
         file_path = os.path.join(UPLOAD_FOLDER, filename)
         file.save(file_path)
 
+        # Streaming mode: return NDJSON lines as chunks are scored
+        if request.args.get("stream", request.form.get("stream", "")).lower() in (
+            "1", "true", "yes",
+        ):
+            columns = pd.read_csv(file_path, nrows=0).columns
+            if text_column not in columns:
+                return (
+                    jsonify(
+                        {
+                            "error": f'Column "{text_column}" not found in CSV. Available columns: {", ".join(columns)}'
+                        }
+                    ),
+                    400,
+                )
+            return Response(
+                stream_with_context(
+                    stream_analysis(make_analyzer(), file_path, filename, text_column)
+                ),
+                mimetype="application/x-ndjson",
+            )
+
         # Read CSV
         df = pd.read_csv(file_path)
 
@@ -70,13 +303,19 @@ def analyze_csv():
             )
 
         # Initialize analyzer and process data
-        analyzer = SentimentAnalyzer()
+        analyzer = make_analyzer()
         df = analyzer.analyze_dataframe(df, text_column)
 
         # Generate visualizations
-        analyzer.plot_sentiment_distribution()
-        analyzer.plot_confidence_histogram()
-        analyzer.generate_summary_report()
+        analyzer.plot_sentiment_distribution(
+            os.path.join(REPORT_FOLDER, "sentiment_distribution.png")
+        )
+        analyzer.plot_confidence_histogram(
+            os.path.join(REPORT_FOLDER, "confidence_distribution.png")
+        )
+        analyzer.generate_summary_report(
+            os.path.join(REPORT_FOLDER, "sentiment_analysis_report.txt")
+        )
 
         # Save results
         result_filename = f"analyzed_{filename}"
@@ -84,12 +323,13 @@ def analyze_csv():
         df.to_csv(result_path, index=False)
 
         # Get summary statistics
-        sentiment_counts = df["sentiment"].value_counts().to_dict()
+        results = analyzer.results
+        sentiment_counts = results.sentiment_counts()
         confidence_stats = {
-            "mean": float(df["confidence"].mean()),
-            "median": float(df["confidence"].median()),
-            "min": float(df["confidence"].min()),
-            "max": float(df["confidence"].max()),
+            "mean": float(results.confidences.mean(dtype=np.float64)),
+            "median": float(np.median(results.confidences)),
+            "min": float(results.confidences.min()),
+            "max": float(results.confidences.max()),
         }
 
         # Return results
@@ -125,10 +365,167 @@ def download_file(filename):
         return jsonify({"error": f"File not found: {str(e)}"}), 404
 
 
+def evict_estimates():
+    """Drop expired jobs and stop the least recently used ones over the limit"""
+    now = time.time()
+    evicted = []
+    with estimates_lock:
+        for job_id, estimator in list(estimates.items()):
+            if estimator.finished is not None and now - estimator.finished > ESTIMATE_TTL:
+                evicted.append(estimates.pop(job_id))
+        while len(estimates) > MAX_ESTIMATES:
+            evicted.append(estimates.popitem(last=False)[1])
+    for estimator in evicted:
+        estimator.stop(wait=False)
+    evict_snapshots(ESTIMATES_DIR, ESTIMATE_TTL)
+
+
+def find_estimate(job_id):
+    with estimates_lock:
+        estimator = estimates.get(job_id)
+        if estimator is not None:
+            estimates.move_to_end(job_id)
+        return estimator
+
+
+@app.route("/estimate", methods=["POST"])
+def start_estimate():
+    """Estimate the sentiment mix from a stratified sample, refining in the background"""
+    try:
+        if "file" not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+
+        file = request.files["file"]
+        if file.filename == "":
+            return jsonify({"error": "No file selected"}), 400
+
+        if not allowed_file(file.filename):
+            return (
+                jsonify({"error": "Invalid file type. Only CSV files are allowed"}),
+                400,
+            )
+
+        text_column = request.form.get("text_column", "comment")
+        strata_column = request.form.get("strata_column") or None
+        target_margin = request.form.get("target_margin", type=float)
+        initial_sample = request.form.get("initial_sample", 200, type=int)
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = secure_filename(f"{timestamp}_{file.filename}")
+        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        file.save(file_path)
+
+        df = pd.read_csv(file_path)
+        for column in (text_column, strata_column):
+            if column and column not in df.columns:
+                return (
+                    jsonify(
+                        {
+                            "error": f'Column "{column}" not found in CSV. Available columns: {", ".join(df.columns)}'
+                        }
+                    ),
+                    400,
+                )
+        if df.empty:
+            return jsonify({"error": "CSV file has no rows"}), 400
+
+        estimator = ProgressiveEstimator(
+            make_analyzer(),
+            df,
+            text_column,
+            strata_column=strata_column,
+            initial_sample=initial_sample,
+            target_margin=target_margin,
+            state_dir=ESTIMATES_DIR,
+        )
+        with estimates_lock:
+            estimates[estimator.job_id] = estimator
+        evict_estimates()
+        return jsonify(estimator.start()), 202
+
+    except Exception as e:
+        logger.error(f"Error starting estimate: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/estimate/<job_id>", methods=["GET"])
+def get_estimate(job_id):
+    evict_estimates()
+    estimator = find_estimate(job_id)
+    if estimator is not None:
+        return jsonify(estimator.snapshot())
+    # A job started through another worker process
+    snapshot = read_snapshot(ESTIMATES_DIR, job_id)
+    if snapshot is None:
+        return jsonify({"error": "Unknown estimate job"}), 404
+    return jsonify(snapshot)
+
+
+@app.route("/estimate/<job_id>", methods=["DELETE"])
+def stop_estimate(job_id):
+    """Stop refining once the client is happy with the interval"""
+    with estimates_lock:
+        estimator = estimates.pop(job_id, None)
+    if estimator is not None:
+        return jsonify(estimator.stop())
+    # The worker running the job stops it before its next batch
+    snapshot = request_stop(ESTIMATES_DIR, job_id)
+    if snapshot is None:
+        return jsonify({"error": "Unknown estimate job"}), 404
+    return jsonify(dict(snapshot, status="stopping")), 202
+
+
+@app.route("/admin/model", methods=["GET"])
+def model_status():
+    denied = check_admin()
+    if denied:
+        return denied
+    return jsonify({"versions": registry.versions(), **model.status()})
+
+
+@app.route("/admin/model", methods=["POST"])
+def activate_model():
+    """Load and warm another registered version in the background, then switch traffic to it
+
+    Takes a ``version`` from the registry, or a ``model_name`` that has been
+    registered with ../model_registry.py; anything else is refused.
+    """
+    denied = check_admin()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or request.form
+    version = data.get("version")
+    if not version and data.get("model_name"):
+        version = registry.find(data["model_name"])
+        if version is None:
+            return jsonify({"error": f"Model {data['model_name']} is not registered"}), 404
+    if not version:
+        return jsonify({"error": "No version provided"}), 400
+    try:
+        started = model.activate(version)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"activating": version if started else None, **model.status()}), 202
+
+
+@app.route("/admin/rollback", methods=["POST"])
+def rollback():
+    denied = check_admin()
+    if denied:
+        return denied
+    try:
+        version = model.rollback()
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"rolled_back_to": version, **model.status()})
+
+
 @app.route("/visualization/<filename>", methods=["GET"])
 def get_visualization(filename):
     try:
-        return send_file(filename, mimetype="image/png")
+        return send_file(os.path.join(REPORT_FOLDER, filename), mimetype="image/png")
     except Exception as e:
         return jsonify({"error": f"File not found: {str(e)}"}), 404
 
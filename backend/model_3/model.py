@@ -1,79 +1,420 @@
 from transformers import pipeline
+import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 
+from embedding_store import EmbeddingStore, text_key
 
-class SentimentAnalyzer:
-    def __init__(self):
-        self.analyzer = pipeline(
-            "sentiment-analysis",
-            model="nlptown/bert-base-multilingual-uncased-sentiment",
+MODEL_NAME = "nlptown/bert-base-multilingual-uncased-sentiment"
+
+# Loaded pipelines are shared by every analyzer in the process (and, when
+# served through prefork.py, by every forked worker copy-on-write)
+_pipelines = {}
+
+
+def load_pipeline(model_name=MODEL_NAME):
+    """Load the sentiment pipeline once per process"""
+    if model_name not in _pipelines:
+        _pipelines[model_name] = pipeline("sentiment-analysis", model=model_name)
+    return _pipelines[model_name]
+
+
+def unload_pipeline(model_name):
+    """Drop a pipeline that is no longer served so its memory can be freed"""
+    _pipelines.pop(model_name, None)
+
+
+_stores = {}
+
+
+def load_store(directory, model_name=MODEL_NAME):
+    """Open (or create) the embedding store of ``model_name`` once per process
+
+    Each model gets its own subdirectory, since their outputs are not
+    comparable.
+    """
+    store_dir = os.path.join(directory, model_name.strip("/").replace("/", "--"))
+    if store_dir not in _stores:
+        model = load_pipeline(model_name).model
+        store = EmbeddingStore(
+            store_dir,
+            dim=model.config.hidden_size,
+            labels=[model.config.id2label[i] for i in range(model.config.num_labels)],
+            model_name=model_name,
         )
+        if store.meta.get("model_name") != model_name:
+            raise ValueError(
+                f"Embedding store {store_dir} holds outputs of "
+                f"{store.meta.get('model_name')}, not {model_name}"
+            )
+        _stores[store_dir] = store
+    return _stores[store_dir]
+
+
+SENTIMENTS = ["NEGATIVE", "NEUTRAL", "POSITIVE"]
+SENTIMENT_SCORES = np.array([-1.0, 0.0, 1.0], dtype=np.float32)
+NEUTRAL_CODE = SENTIMENTS.index("NEUTRAL")
+
+
+class SentimentResults:
+    """Columnar analysis results backed by fixed-dtype arrays
+
+    Sentiments are stored as categorical codes into ``SENTIMENTS`` (derived
+    from the star rating), ratings as int8 and confidences as float32. The
+    sentiment score is not stored at all; it is looked up from the codes.
+    """
+
+    def __init__(self, size):
+        self.codes = np.full(size, NEUTRAL_CODE, dtype=np.int8)
+        self.ratings = np.full(size, 3, dtype=np.int8)
+        self.confidences = np.full(size, 0.5, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def set(self, index, rating, confidence):
+        """Store one prediction in place"""
+        self.ratings[index] = rating
+        self.confidences[index] = confidence
+        # Convert 5-star rating to sentiment categories
+        if rating >= 4:
+            self.codes[index] = SENTIMENTS.index("POSITIVE")
+        elif rating <= 2:
+            self.codes[index] = SENTIMENTS.index("NEGATIVE")
+        else:
+            self.codes[index] = NEUTRAL_CODE
+
+    @property
+    def sentiments(self):
+        return pd.Categorical.from_codes(self.codes, categories=SENTIMENTS)
+
+    @property
+    def scores(self):
+        return SENTIMENT_SCORES[self.codes]
+
+    def sentiment_counts(self):
+        """Counts per sentiment, omitting sentiments that never occur"""
+        counts = np.bincount(self.codes, minlength=len(SENTIMENTS))
+        return {
+            sentiment: int(count)
+            for sentiment, count in zip(SENTIMENTS, counts)
+            if count
+        }
+
+    def rating_counts(self):
+        """Counts of 1..5 star ratings"""
+        return np.bincount(self.ratings, minlength=6)[1:6]
+
+    def record(self, index):
+        return {
+            "sentiment": SENTIMENTS[self.codes[index]],
+            "rating": int(self.ratings[index]),
+            "confidence": float(self.confidences[index]),
+            "score": float(SENTIMENT_SCORES[self.codes[index]]),
+        }
+
+    def records(self):
+        return [self.record(i) for i in range(len(self))]
+
+    def assign_to(self, df):
+        """Add the result columns to a dataframe straight from the arrays"""
+        df["sentiment"] = self.sentiments
+        df["rating"] = self.ratings
+        df["confidence"] = self.confidences
+        df["sentiment_score"] = self.scores
+        return df
+
+
+class SentimentAnalyzer:
+    def __init__(self, model_name=MODEL_NAME, embedding_store=None,
+                 long_documents=False, max_tokens=None, stride=128):
+        """``embedding_store`` is an optional directory in which pooled
+        embeddings and logits are kept; texts already stored are not re-run.
+
+        With ``long_documents``, reviews longer than ``max_tokens`` (default:
+        the model's limit) are split into token windows overlapping by
+        ``stride`` tokens instead of being truncated; ``stride`` must be
+        smaller than a window's text tokens.
+        """
+        self.model_name = model_name
+        self.analyzer = load_pipeline(model_name)
+        self.store = load_store(embedding_store, model_name) if embedding_store else None
+        self.long_documents = long_documents
+        self.stride = stride
         self.results = None
+        self._max_tokens = max_tokens
+        self._body = None
+
+        # Token windows are only needed up front in long-document mode; the
+        # default mode lets the pipeline truncate and only tokenizes itself
+        # for the embedding store
+        if long_documents:
+            body = self._window_body()
+            if not 0 <= stride < body:
+                raise ValueError(
+                    f"stride must be between 0 and {body - 1} for "
+                    f"{self.max_tokens}-token windows, got {stride}"
+                )
+
+    @property
+    def max_tokens(self):
+        """Tokens per window, special tokens included (default: the model's limit)"""
+        if self._max_tokens is None:
+            tokenizer, config = self.analyzer.tokenizer, self.analyzer.model.config
+            self._max_tokens = min(tokenizer.model_max_length, config.max_position_embeddings)
+        return self._max_tokens
+
+    def _window_body(self):
+        """Text tokens per window, next to the special tokens"""
+        if self._body is None:
+            body = self.max_tokens - self.analyzer.tokenizer.num_special_tokens_to_add()
+            if body < 1:
+                raise ValueError(
+                    f"max_tokens={self.max_tokens} leaves no room for text next to the "
+                    f"special tokens"
+                )
+            self._body = body
+        return self._body
+
+    @staticmethod
+    def _parse_prediction(result):
+        """Star rating and confidence of a pipeline prediction"""
+        # Model returns labels like '1 star', '2 stars', etc.
+        return int(result["label"].split()[0]), result["score"]
 
     def analyze_text(self, text):
         """Analyze a single piece of text using 5-star rating system"""
+        results = SentimentResults(1)
         try:
-            result = self.analyzer(text[:512])[0]
-            # Model returns labels like '1 star', '2 stars', etc.
-            rating = int(result["label"].split()[0])
-            confidence = result["score"]
-
-            # Convert 5-star rating to sentiment categories
-            if rating >= 4:
-                sentiment = "POSITIVE"
-                score = 1.0
-            elif rating <= 2:
-                sentiment = "NEGATIVE"
-                score = -1.0
+            if self.long_documents:
+                _, logits = self._forward([str(text)], with_embeddings=False)
+                self._set_from_logits(results, [0], logits)
             else:
-                sentiment = "NEUTRAL"
-                score = 0.0
-
-            return {
-                "sentiment": sentiment,
-                "rating": rating,
-                "confidence": confidence,
-                "score": score,
-            }
+                results.set(0, *self._parse_prediction(self.analyzer(text, truncation=True)[0]))
         except Exception as e:
             print(f"Error analyzing text: {e}")
-            return {
-                "sentiment": "NEUTRAL",
-                "rating": 3,
-                "confidence": 0.5,
-                "score": 0.0,
-            }
-
-    def analyze_dataframe(self, df, text_column):
-        """Analyze all texts in a dataframe column"""
-        print("Analyzing sentiments...")
-        results = []
-        for text in df[text_column]:
-            if pd.isna(text):
-                results.append(
-                    {
-                        "sentiment": "NEUTRAL",
-                        "rating": 3,
-                        "confidence": 0.5,
-                        "score": 0.0,
-                    }
+        return results.record(0)
+
+    def analyze_into(self, texts, results, offset=0, batch_size=32):
+        """Analyze texts with batched forward passes, filling ``results`` in place
+
+        Missing texts keep the neutral default result.
+        """
+        rows = [i for i, text in enumerate(texts) if not pd.isna(text)]
+        if not rows:
+            return results
+        if self.store is not None:
+            return self._analyze_with_store(texts, rows, results, offset, batch_size)
+
+        try:
+            if self.long_documents:
+                _, logits = self._forward(
+                    [str(texts[i]) for i in rows], batch_size, with_embeddings=False
                 )
+                self._set_from_logits(results, [offset + i for i in rows], logits)
+                return results
+
+            # The tokenizer truncates to the model's limit, so short texts cost
+            # only their own tokens
+            predictions = self.analyzer(
+                [str(texts[i]) for i in rows],
+                batch_size=batch_size,
+                truncation=True,
+            )
+        except Exception as e:
+            print(f"Error analyzing batch, falling back to single texts: {e}")
+            for i in rows:
+                result = self.analyze_text(str(texts[i]))
+                results.set(offset + i, result["rating"], result["confidence"])
+            return results
+
+        for i, prediction in zip(rows, predictions):
+            results.set(offset + i, *self._parse_prediction(prediction))
+        return results
+
+    def check(self, texts):
+        """Score ``texts`` without the error fallbacks and validate the outputs
+
+        Raises if the model fails or does not return 1-5 star ratings with
+        probabilities, so a broken model is never swapped in for serving.
+        """
+        texts = [str(text) for text in texts]
+        results = SentimentResults(len(texts))
+        if self.long_documents:
+            _, logits = self._forward(texts, with_embeddings=False)
+            if logits.shape[0] != len(texts) or not np.all(np.isfinite(logits)):
+                raise ValueError("Model returned invalid logits")
+            config = self.analyzer.model.config
+            labels = [config.id2label[i] for i in range(config.num_labels)]
+            if not all((label.split() or [""])[0] in set("12345") for label in labels):
+                raise ValueError(f"Model labels are not star ratings: {labels}")
+            self._set_from_logits(results, range(len(texts)), logits)
+        else:
+            predictions = self.analyzer(texts, truncation=True)
+            if len(predictions) != len(texts):
+                raise ValueError(f"Expected {len(texts)} predictions, got {len(predictions)}")
+            for i, prediction in enumerate(predictions):
+                try:
+                    rating, confidence = self._parse_prediction(prediction)
+                except (KeyError, TypeError, ValueError, IndexError, AttributeError):
+                    raise ValueError(f"Unexpected prediction: {prediction!r}")
+                if not 1 <= rating <= 5:
+                    raise ValueError(f"Rating outside 1-5 in prediction: {prediction!r}")
+                if not (np.isfinite(confidence) and 0.0 <= confidence <= 1.0):
+                    raise ValueError(f"Invalid probability in prediction: {prediction!r}")
+                results.set(i, rating, confidence)
+        return results.records()
+
+    def _set_from_logits(self, results, indices, logits):
+        config = self.analyzer.model.config
+        label_ratings = np.array(
+            [int(config.id2label[i].split()[0]) for i in range(config.num_labels)]
+        )
+        probabilities = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        top = probabilities.argmax(axis=1)
+        for index, label, probability in zip(indices, top, probabilities):
+            results.set(index, label_ratings[label], probability[label])
+
+    def _windows(self, texts):
+        """(text index, input ids) of every token window, and the window size
+
+        Texts are tokenized once, without a character cap. Normally each text
+        keeps only its first window (truncation by tokens); in long-document
+        mode over-length texts are covered by windows overlapping by
+        ``stride`` tokens.
+        """
+        tokenizer = self.analyzer.tokenizer
+        max_tokens = self.max_tokens
+        body = self._window_body()
+        step = body - self.stride
+
+        encoded = tokenizer(list(texts), add_special_tokens=False, verbose=False)
+        windows = []
+        for index, ids in enumerate(encoded["input_ids"]):
+            if self.long_documents:
+                starts = range(0, max(len(ids) - self.stride, 1), step)
             else:
-                results.append(self.analyze_text(str(text)))
+                starts = [0]
+            for start in starts:
+                windows.append(
+                    (index, tokenizer.build_inputs_with_special_tokens(ids[start : start + body]))
+                )
+        return windows, max_tokens
 
-        self.results = results
+    def _forward(self, texts, batch_size=32, with_embeddings=True):
+        """Pooled embeddings (masked mean of the last hidden layer) and logits per text
 
-        df["sentiment"] = [r["sentiment"] for r in results]
-        df["rating"] = [r["rating"] for r in results]
-        df["confidence"] = [r["confidence"] for r in results]
-        df["sentiment_score"] = [r["score"] for r in results]
+        The windows of all texts are sorted by length and packed into shared
+        forward passes of at most ``batch_size`` full-length windows' worth
+        of tokens, padded per batch, so compute follows the actual token
+        count. Window outputs are averaged back per text weighted by their
+        token count; the returned logits are the log of the averaged
+        probabilities.
+        """
+        import torch
 
-        return df
+        tokenizer, model = self.analyzer.tokenizer, self.analyzer.model
+        windows, max_tokens = self._windows(texts)
+        order = sorted(range(len(windows)), key=lambda w: len(windows[w][1]), reverse=True)
+        token_budget = batch_size * max_tokens
 
-    def plot_sentiment_distribution(self):
+        probabilities = np.zeros((len(texts), model.config.num_labels))
+        embeddings = np.zeros((len(texts), model.config.hidden_size if with_embeddings else 0))
+        weights = np.zeros(len(texts))
+        with torch.no_grad():
+            start = 0
+            while start < len(order):
+                # Longest first, so the first window sets the padded width
+                width = len(windows[order[start]][1])
+                batch = [windows[w] for w in order[start : start + max(token_budget // width, 1)]]
+                start += len(batch)
+
+                inputs = tokenizer.pad(
+                    {"input_ids": [ids for _, ids in batch]}, return_tensors="pt"
+                ).to(model.device)
+                outputs = model(**inputs, output_hidden_states=with_embeddings)
+                mask = inputs["attention_mask"]
+                lengths = mask.sum(dim=1).cpu().numpy()
+                indices = np.array([index for index, _ in batch])
+
+                window_probabilities = torch.softmax(outputs.logits.float(), dim=-1)
+                np.add.at(
+                    probabilities, indices,
+                    window_probabilities.cpu().numpy() * lengths[:, None],
+                )
+                np.add.at(weights, indices, lengths)
+                if with_embeddings:
+                    hidden = outputs.hidden_states[-1].float()
+                    mask = mask.unsqueeze(-1).to(hidden.dtype)
+                    pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+                    np.add.at(embeddings, indices, pooled.cpu().numpy() * lengths[:, None])
+
+        probabilities /= weights[:, None]
+        embeddings /= weights[:, None]
+        return embeddings, np.log(np.clip(probabilities, 1e-12, None))
+
+    def _key(self, text):
+        # Outputs depend on how long texts are cut: the first window
+        # (truncation by tokens) or overlapping windows
+        if self.long_documents:
+            return text_key(f"{text}\0windows:{self.max_tokens}:{self.stride}")
+        return text_key(f"{text}\0tokens:{self.max_tokens}")
+
+    def is_stored(self, text):
+        """Whether the embedding store holds this text's outputs for these settings"""
+        return self.store is not None and self._key(text) in self.store
+
+    def find_duplicates(self, texts, threshold=0.95, k=5):
+        """Near-duplicate pairs among stored ``texts`` as (text, other, similarity)
+
+        Pairs come from the ``k`` nearest stored rows of each row, so rows of
+        texts not listed here can take some of those places.
+        """
+        if self.store is None:
+            raise ValueError("find_duplicates needs an embedding_store")
+        by_key = {self._key(text): str(text) for text in texts}
+        return [
+            (by_key[key], by_key[other], similarity)
+            for _, _, similarity, key, other in self.store.find_duplicates(threshold, k)
+            if key in by_key and other in by_key
+        ]
+
+    def _analyze_with_store(self, texts, rows, results, offset, batch_size):
+        """Score from stored logits, running the model only for unseen texts"""
+        keys = [self._key(texts[i]) for i in rows]
+        stored = self.store.lookup(keys)
+
+        missing = {}
+        for i, key, row in zip(rows, keys, stored):
+            if row < 0 and key not in missing:
+                missing[key] = str(texts[i])
+        if missing:
+            embeddings, logits = self._forward(list(missing.values()), batch_size)
+            self.store.append(list(missing), embeddings, logits)
+            stored = self.store.lookup(keys)
+
+        ratings, confidences = self.store.ratings(stored)
+        for i, rating, confidence in zip(rows, ratings, confidences):
+            results.set(offset + i, rating, confidence)
+        return results
+
+    def analyze_results(self, texts, batch_size=32):
+        texts = list(texts)
+        return self.analyze_into(texts, SentimentResults(len(texts)), batch_size=batch_size)
+
+    def analyze_batch(self, texts, batch_size=32):
+        """Analyze a list of texts, returning one result dict per text"""
+        return self.analyze_results(texts, batch_size=batch_size).records()
+
+    def analyze_dataframe(self, df, text_column, batch_size=32):
+        """Analyze all texts in a dataframe column"""
+        print("Analyzing sentiments...")
+        self.results = self.analyze_results(df[text_column].tolist(), batch_size=batch_size)
+        return self.results.assign_to(df)
+
+    def plot_sentiment_distribution(self, path="sentiment_distribution.png"):
         """Plot the distribution of sentiments and ratings"""
         if not self.results:
             print("No results to plot. Please analyze data first.")
@@ -83,43 +424,41 @@ class SentimentAnalyzer:
         fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
 
         # Plot sentiment categories
-        sentiments = [r["sentiment"] for r in self.results]
         colors = {"POSITIVE": "green", "NEUTRAL": "gray", "NEGATIVE": "red"}
-        sns.countplot(x=sentiments, palette=colors, ax=ax1)
+        sentiment_counts = self.results.sentiment_counts()
+        ax1.bar(
+            list(sentiment_counts),
+            list(sentiment_counts.values()),
+            color=[colors[s] for s in sentiment_counts],
+        )
         ax1.set_title("Distribution of Sentiments")
         ax1.set_xlabel("Sentiment")
         ax1.set_ylabel("Count")
 
         # Plot star ratings
-        ratings = [r["rating"] for r in self.results]
-        sns.countplot(x=ratings, ax=ax2, color="blue")
+        ax2.bar(np.arange(1, 6), self.results.rating_counts(), color="blue")
         ax2.set_title("Distribution of Star Ratings")
         ax2.set_xlabel("Stars")
         ax2.set_ylabel("Count")
 
         plt.tight_layout()
-        plt.savefig("sentiment_distribution.png")
+        plt.savefig(path)
         plt.close()
 
-    def plot_confidence_histogram(self):
+    def plot_confidence_histogram(self, path="confidence_distribution.png"):
         """Plot histogram of confidence scores by sentiment"""
         if not self.results:
             print("No results to plot. Please analyze data first.")
             return
 
-        confidences = [r["confidence"] for r in self.results]
-        sentiments = [r["sentiment"] for r in self.results]
-
         plt.figure(figsize=(10, 6))
         colors = {"POSITIVE": "green", "NEUTRAL": "gray", "NEGATIVE": "red"}
 
         for sentiment in ["POSITIVE", "NEUTRAL", "NEGATIVE"]:
-            sentiment_confidences = [
-                conf for conf, sent in zip(confidences, sentiments) if sent == sentiment
-            ]
-            if sentiment_confidences:
+            mask = self.results.codes == SENTIMENTS.index(sentiment)
+            if mask.any():
                 plt.hist(
-                    sentiment_confidences,
+                    self.results.confidences[mask],
                     bins=20,
                     alpha=0.5,
                     label=sentiment,
@@ -131,23 +470,24 @@ class SentimentAnalyzer:
         plt.ylabel("Frequency")
         plt.legend()
         plt.tight_layout()
-        plt.savefig("confidence_distribution.png")
+        plt.savefig(path)
         plt.close()
 
-    def generate_summary_report(self):
+    def generate_summary_report(self, path="sentiment_analysis_report.txt"):
         """Generate a summary report of the analysis"""
         if not self.results:
             print("No results to summarize. Please analyze data first.")
             return
 
-        sentiments = [r["sentiment"] for r in self.results]
-        ratings = [r["rating"] for r in self.results]
-        confidences = [r["confidence"] for r in self.results]
+        ratings = self.results.ratings
+        confidences = self.results.confidences
+        sentiment_counts = self.results.sentiment_counts()
+        rating_counts = self.results.rating_counts()
 
         total = len(self.results)
-        positive_count = sentiments.count("POSITIVE")
-        neutral_count = sentiments.count("NEUTRAL")
-        negative_count = sentiments.count("NEGATIVE")
+        positive_count = sentiment_counts.get("POSITIVE", 0)
+        neutral_count = sentiment_counts.get("NEUTRAL", 0)
+        negative_count = sentiment_counts.get("NEGATIVE", 0)
 
         report = f"""
 Sentiment Analysis Summary Report
@@ -158,22 +498,22 @@ Neutral sentiments: {neutral_count} ({(neutral_count/total)*100:.1f}%)
 Negative sentiments: {negative_count} ({(negative_count/total)*100:.1f}%)
 
 Rating Distribution:
-1 star: {ratings.count(1)} ({(ratings.count(1)/total)*100:.1f}%)
-2 stars: {ratings.count(2)} ({(ratings.count(2)/total)*100:.1f}%)
-3 stars: {ratings.count(3)} ({(ratings.count(3)/total)*100:.1f}%)
-4 stars: {ratings.count(4)} ({(ratings.count(4)/total)*100:.1f}%)
-5 stars: {ratings.count(5)} ({(ratings.count(5)/total)*100:.1f}%)
+1 star: {rating_counts[0]} ({(rating_counts[0]/total)*100:.1f}%)
+2 stars: {rating_counts[1]} ({(rating_counts[1]/total)*100:.1f}%)
+3 stars: {rating_counts[2]} ({(rating_counts[2]/total)*100:.1f}%)
+4 stars: {rating_counts[3]} ({(rating_counts[3]/total)*100:.1f}%)
+5 stars: {rating_counts[4]} ({(rating_counts[4]/total)*100:.1f}%)
 
-Average rating: {np.mean(ratings):.2f}
+Average rating: {ratings.mean(dtype=np.float64):.2f}
 
 Confidence Scores:
-Average confidence: {np.mean(confidences):.3f}
+Average confidence: {confidences.mean(dtype=np.float64):.3f}
 Median confidence: {np.median(confidences):.3f}
-Min confidence: {min(confidences):.3f}
-Max confidence: {max(confidences):.3f}
+Min confidence: {confidences.min():.3f}
+Max confidence: {confidences.max():.3f}
         """
 
-        with open("sentiment_analysis_report.txt", "w") as f:
+        with open(path, "w") as f:
             f.write(report)
 
         print(report)
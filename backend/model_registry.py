@@ -0,0 +1,341 @@
+# model_registry.py
+"""Versioned model registry with zero-downtime hot swapping.
+
+Shared by model 1 (whose versions hold a copy of a saved pipeline) and
+model_3 (whose versions pin a Hugging Face model id or a local model
+directory, whose files are hashed at registration).
+
+Layout:
+    registry/CURRENT                  version that should be served
+    registry/<version>/metadata.json  hash, source, scores, note, ...
+    registry/<version>/model.joblib   the saved model, for file versions
+
+``HotModel`` serves one version at a time. Activating another version loads
+and warms it in a background thread and only then replaces the serving
+(version, model) pair in a single assignment, so requests never wait for or
+see a half-loaded model. The previous version stays loaded for instant
+rollback. Each process follows CURRENT, so prefork workers pick up a swap
+made through any one of them. What loading a version means is up to the
+app: its ``load`` function raises if the version fails its warm-up checks,
+and such a version is never swapped in. A HotModel that was not loaded at
+startup loads CURRENT on its first request.
+
+Usage:
+    python model_registry.py --registry "model 1/registry" register sentiment_model.joblib --activate
+    python model_registry.py --registry model_3/registry register nlptown/bert-base-multilingual-uncased-sentiment
+    python model_registry.py --registry model_3/registry list
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+MODEL_FILE = "model.joblib"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def directory_sha256(path):
+    """Hash of every file (name and contents) in a local model directory"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode("utf-8") + b"\0")
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, directory):
+        self.directory = directory
+        self.current_path = os.path.join(directory, "CURRENT")
+        self._metadata = {}
+
+    def model_path(self, version):
+        return os.path.join(self.directory, version, MODEL_FILE)
+
+    def exists(self, version):
+        return os.path.exists(os.path.join(self.directory, version, "metadata.json"))
+
+    def metadata(self, version):
+        # Versions are immutable, so their metadata is read once per process
+        if version not in self._metadata:
+            if not self.exists(version):
+                raise KeyError(f"Unknown model version: {version}")
+            with open(os.path.join(self.directory, version, "metadata.json"), "r") as f:
+                self._metadata[version] = json.load(f)
+        return self._metadata[version]
+
+    def model_name(self, version):
+        return self.metadata(version)["model_name"]
+
+    def versions(self):
+        """Metadata of every registered version, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        versions = [
+            self.metadata(name)
+            for name in os.listdir(self.directory)
+            if not name.endswith(".tmp") and self.exists(name)
+        ]
+        return sorted(versions, key=lambda metadata: metadata["created_at"])
+
+    def find(self, model_name):
+        """Latest version registered for ``model_name``, or None"""
+        matches = [m for m in self.versions() if m.get("model_name") == model_name]
+        return matches[-1]["version"] if matches else None
+
+    def _create(self, version, digest, metadata, model_path=None):
+        version = version or f"{time.strftime('%Y%m%d-%H%M%S')}-{digest[:8]}"
+        version_dir = os.path.join(self.directory, version)
+        if os.path.exists(version_dir):
+            raise ValueError(f"Version {version} already exists")
+
+        # Build the version in a temporary directory and rename it into place
+        tmp_dir = f"{version_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        if model_path is not None:
+            shutil.copyfile(model_path, os.path.join(tmp_dir, MODEL_FILE))
+        metadata = {"version": version, "created_at": time.time(), **metadata}
+        with open(os.path.join(tmp_dir, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_dir, version_dir)
+        return metadata
+
+    def register(self, model_path, version=None, **metadata):
+        """Copy a saved model file into the registry as a new immutable version"""
+        digest = file_sha256(model_path)
+        return self._create(
+            version,
+            digest,
+            {
+                "sha256": digest,
+                "size": os.path.getsize(model_path),
+                "source": os.path.abspath(model_path),
+                **metadata,
+            },
+            model_path=model_path,
+        )
+
+    def register_name(self, model_name, version=None, **metadata):
+        """Pin a Hugging Face model id or a local model directory as a new version"""
+        local = os.path.isdir(model_name)
+        if local:
+            model_name = os.path.abspath(model_name)
+        digest = directory_sha256(model_name) if local else None
+        name_hash = hashlib.sha256(f"{model_name}\0{digest}".encode("utf-8")).hexdigest()
+        return self._create(
+            version,
+            name_hash,
+            {
+                "model_name": model_name,
+                "source": "local" if local else "huggingface",
+                "sha256": digest,
+                **metadata,
+            },
+        )
+
+    def current(self):
+        try:
+            with open(self.current_path, "r") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def set_current(self, version):
+        if not self.exists(version):
+            raise KeyError(f"Unknown model version: {version}")
+        tmp_path = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, self.current_path)
+
+
+class HotModel:
+    def __init__(self, registry, load, unload=None, check_interval=1.0):
+        """``load(version)`` returns the loaded and warmed model of a version,
+        raising if it fails; ``unload(version)`` is called once a version is
+        neither served nor kept for rollback"""
+        self.registry = registry
+        self.load = load
+        self.unload = unload
+        self.check_interval = check_interval
+
+        self.active = None  # (version, model)
+        self.previous = None
+        self.loading = None
+        self.error = None
+        self._followed = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._startup_lock = threading.Lock()
+
+    def loaded_versions(self):
+        return {pair[0] for pair in (self.active, self.previous) if pair is not None}
+
+    def load_current(self):
+        """Load the CURRENT version synchronously (at startup)"""
+        version = self.registry.current()
+        self._followed = version
+        if version is not None:
+            self.active = (version, self.load(version))
+        return version
+
+    def activate(self, version, publish=True):
+        """Load and warm ``version`` in the background, then swap it in
+
+        Returns False if the version is already being served.
+        """
+        if not self.registry.exists(version):
+            raise KeyError(f"Unknown model version: {version}")
+        with self._lock:
+            if self.loading is not None:
+                raise RuntimeError(f"Version {self.loading} is still loading")
+            if self.active is not None and self.active[0] == version:
+                return False
+            self.loading = version
+            self.error = None
+
+        threading.Thread(
+            target=self._activate, args=(version, publish), daemon=True
+        ).start()
+        return True
+
+    def _activate(self, version, publish):
+        try:
+            if self.previous is not None and self.previous[0] == version:
+                loaded = self.previous
+            else:
+                loaded = (version, self.load(version))
+            with self._lock:
+                stale = self.previous
+                self.previous, self.active = self.active, loaded
+                self._followed = version
+            if stale is not None and stale[0] not in self.loaded_versions() and self.unload:
+                self.unload(stale[0])
+            if publish:
+                self.registry.set_current(version)
+            print(f"Now serving model version {version}")
+        except Exception as e:
+            print(f"Error loading model version {version}: {str(e)}")
+            with self._lock:
+                self.error = f"{version}: {str(e)}"
+        finally:
+            with self._lock:
+                self.loading = None
+
+    def rollback(self):
+        """Swap the previous version back in immediately (it is still loaded)"""
+        with self._lock:
+            if self.previous is None:
+                raise RuntimeError("No previous version to roll back to")
+            self.active, self.previous = self.previous, self.active
+            self._followed = version = self.active[0]
+        self.registry.set_current(version)
+        print(f"Rolled back to model version {version}")
+        return version
+
+    def follow(self):
+        """Pick up a CURRENT change made by another process (rate limited)"""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval or self.loading is not None:
+            return
+        self._last_check = now
+        version = self.registry.current()
+        if version is not None and version != self._followed:
+            # Remember it even if loading fails, so a bad version is not retried
+            self._followed = version
+            try:
+                self.activate(version, publish=False)
+            except (KeyError, RuntimeError) as e:
+                with self._lock:
+                    self.error = str(e)
+
+    def get(self):
+        """The (version, model) pair to serve a request with
+
+        If nothing was loaded yet, the first call loads CURRENT synchronously.
+        """
+        if self.active is None and self._followed is None:
+            with self._startup_lock:
+                if self.active is None and self._followed is None:
+                    try:
+                        self.load_current()
+                    except Exception as e:
+                        with self._lock:
+                            self.error = f"{self._followed}: {str(e)}"
+                        raise
+        self.follow()
+        return self.active
+
+    def status(self):
+        active, previous = self.active, self.previous
+        return {
+            "active": active[0] if active else None,
+            "previous": previous[0] if previous else None,
+            "loading": self.loading,
+            "error": self.error,
+            "current": self.registry.current(),
+        }
+
+
+def main(registry_dir=None, description="Manage a model registry"):
+    """Command line interface, also run by each app's registry module"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--registry", default=registry_dir, required=registry_dir is None)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    register_parser = subparsers.add_parser(
+        "register", help="Add a saved model file, a model id or a model directory"
+    )
+    register_parser.add_argument("model", help="Model file to copy, or model id/directory to pin")
+    register_parser.add_argument("--version", default=None)
+    register_parser.add_argument("--note", default=None)
+    register_parser.add_argument("--activate", action="store_true",
+                                 help="Make it the CURRENT version")
+
+    activate_parser = subparsers.add_parser("activate", help="Set the CURRENT version")
+    activate_parser.add_argument("version")
+
+    subparsers.add_parser("list", help="List registered versions")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == "register":
+        extra = {"note": args.note} if args.note else {}
+        if os.path.isfile(args.model):
+            metadata = registry.register(args.model, version=args.version, **extra)
+        else:
+            metadata = registry.register_name(args.model, version=args.version, **extra)
+        print(f"Registered version {metadata['version']}")
+        if args.activate:
+            registry.set_current(metadata["version"])
+            print(f"CURRENT -> {metadata['version']}")
+    elif args.command == "activate":
+        registry.set_current(args.version)
+        print(f"CURRENT -> {args.version}")
+    else:
+        current = registry.current()
+        for metadata in registry.versions():
+            marker = "*" if metadata["version"] == current else " "
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(metadata["created_at"]))
+            source = metadata.get("model_name") or f"{metadata['size']} bytes"
+            print(f"{marker} {metadata['version']}  {created}  {source}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# prefork.py
+"""Pre-fork launcher for the sentiment backends.
+
+The master process imports the target app once (which loads the model
+weights), binds the listening socket and then forks worker processes that
+share those weights copy-on-write. Crashed workers are restarted, and the
+master periodically logs per-worker memory so scaling across cores does not
+silently multiply RSS.
+
+On SIGTERM/SIGINT workers stop accepting connections and finish their
+in-flight requests before exiting (uvicorn does this itself; WSGI apps are
+drained by ``serve_waitress``).
+
+Usage:
+    python prefork.py "model 1/app.py:app" --workers 4 --port 8000
+    python prefork.py model_3/main.py:app --workers 4 --port 5000
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - [%(process)d] %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("prefork")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# A worker dying faster than this after being spawned counts as a crash loop
+MIN_WORKER_LIFETIME = 5.0
+MAX_RESTART_DELAY = 30.0
+# Seconds a worker may spend finishing in-flight requests after SIGTERM;
+# the master kills workers that are still running after SHUTDOWN_TIMEOUT
+DRAIN_TIMEOUT = 25.0
+SHUTDOWN_TIMEOUT = 30.0
+MASTER_SIGNALS = (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT, signal.SIGHUP)
+
+
+def load_app(spec):
+    """Import ``path/to/module.py:attr`` and return the app object.
+
+    The module directory becomes the working directory and the first entry
+    on ``sys.path`` so the backends' relative imports and paths keep working.
+    """
+    path, _, attr = spec.partition(":")
+    path = os.path.abspath(os.path.join(BASE_DIR, path))
+    if not os.path.exists(path):
+        path = os.path.abspath(spec.partition(":")[0])
+    app_dir = os.path.dirname(path)
+
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    module_spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(module_spec)
+    sys.modules[module_name] = module
+    module_spec.loader.exec_module(module)
+
+    app = getattr(module, attr or "app")
+
+    # Give the backend a chance to load lazily-created models before forking
+    warmup = getattr(module, "warmup", None)
+    if callable(warmup):
+        warmup()
+
+    return app
+
+
+def is_asgi(app):
+    """FastAPI/Starlette apps are ASGI, everything else is treated as WSGI."""
+    try:
+        from starlette.applications import Starlette
+    except ImportError:
+        return False
+    return isinstance(app, Starlette)
+
+
+def read_memory(pid):
+    """Return RSS/PSS/shared/private memory of a process in KiB.
+
+    PSS splits shared pages between the processes mapping them, so summing
+    PSS over workers gives the real footprint of the fleet. Returns ``None``
+    where ``/proc`` is not available.
+    """
+    fields = {
+        "Rss": "rss_kb",
+        "Pss": "pss_kb",
+        "Shared_Clean": "shared_kb",
+        "Shared_Dirty": "shared_kb",
+        "Private_Clean": "private_kb",
+        "Private_Dirty": "private_kb",
+    }
+    stats = {"rss_kb": 0, "pss_kb": 0, "shared_kb": 0, "private_kb": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    stats[fields[key]] += int(value.split()[0])
+    except (OSError, ValueError):
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        stats["rss_kb"] = int(line.split()[1])
+                        return stats
+        except (OSError, ValueError):
+            pass
+        return None
+    return stats
+
+
+def serve_waitress(app, sock, threads, drain_timeout=DRAIN_TIMEOUT):
+    """Serve a WSGI app with waitress until SIGTERM/SIGINT, then drain
+
+    On the signal the worker stops accepting connections (the other workers
+    keep serving the shared socket) and keeps its event loop running until
+    every in-flight request has been answered, or ``drain_timeout`` passes.
+    """
+    from waitress import wasyncore
+    from waitress.server import create_server
+
+    server = create_server(app, sockets=[sock], threads=threads)
+    deadline = []
+
+    def drain(signum, frame):
+        if not deadline:
+            logger.info("Draining in-flight requests...")
+            deadline.append(time.monotonic() + drain_timeout)
+            server.accepting = False
+
+    def busy():
+        return any(
+            channel.requests or channel.request is not None or channel.total_outbufs_len
+            for channel in list(server.active_channels.values())
+        )
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+    while not deadline or (busy() and time.monotonic() < deadline[0]):
+        wasyncore.loop(
+            timeout=server.adj.asyncore_loop_timeout,
+            map=server._map,
+            use_poll=server.adj.asyncore_use_poll,
+            count=1,
+        )
+    server.task_dispatcher.shutdown(cancel_pending=False)
+    wasyncore.close_all(server._map)
+
+
+def serve_worker(app, sock, threads):
+    """Run the app on the inherited socket inside a worker process."""
+    if is_asgi(app):
+        import uvicorn
+
+        # uvicorn installs its own SIGTERM handling with a graceful shutdown
+        config = uvicorn.Config(app, log_level="info")
+        server = uvicorn.Server(config)
+        server.run(sockets=[sock])
+    else:
+        serve_waitress(app, sock, threads)
+
+
+class PreforkServer:
+    def __init__(self, app, host="0.0.0.0", port=8000, workers=2, threads=4,
+                 memory_interval=60.0, status_file=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.num_workers = workers
+        self.threads = threads
+        self.memory_interval = memory_interval
+        self.status_file = status_file
+
+        self.sock = None
+        self.workers = {}  # pid -> {"slot": int, "started": float}
+        self.restart_delay = {}  # slot -> seconds
+        self.pending = {}  # slot -> monotonic time to respawn at
+        self.reloading = set()  # pids asked to exit by a reload
+        self.running = False
+        self.wakeup = None
+
+    def bind(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+        logger.info(f"Listening on {self.host}:{self.port}")
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            # Worker: drop the master's signal handling and serve forever
+            signal.set_wakeup_fd(-1)
+            for fd in self.wakeup:
+                os.close(fd)
+            for signum in MASTER_SIGNALS:
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                serve_worker(self.app, self.sock, self.threads)
+            except Exception as e:
+                logger.error(f"Worker {slot} failed: {str(e)}")
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.workers[pid] = {"slot": slot, "started": time.time()}
+        logger.info(f"Started worker {slot} (pid {pid})")
+        return pid
+
+    def wait(self, timeout):
+        """Block until a signal arrives (e.g. SIGCHLD) or ``timeout`` passes."""
+        try:
+            select.select([self.wakeup[0]], [], [], timeout)
+        except InterruptedError:
+            pass
+        try:
+            while os.read(self.wakeup[0], 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def next_timeout(self, last_report):
+        """Seconds until the next scheduled respawn or memory report."""
+        due = list(self.pending.values())
+        if self.memory_interval:
+            due.append(last_report + self.memory_interval)
+        if not due:
+            return None
+        return max(min(due) - time.monotonic(), 0.0)
+
+    def respawn_due(self):
+        now = time.monotonic()
+        for slot, due in list(self.pending.items()):
+            if due <= now:
+                del self.pending[slot]
+                self.spawn(slot)
+
+    def reap(self):
+        """Collect exited workers and respawn them with crash-loop backoff."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+            info = self.workers.pop(pid, None)
+            if info is None:
+                continue
+            if not self.running:
+                continue
+
+            slot = info["slot"]
+            lifetime = time.time() - info["started"]
+            logger.warning(
+                f"Worker {slot} (pid {pid}) exited with status {status} "
+                f"after {lifetime:.1f}s"
+            )
+
+            if pid in self.reloading:
+                # Asked to exit by a reload, not a crash
+                self.reloading.discard(pid)
+                self.spawn(slot)
+                continue
+            if lifetime < MIN_WORKER_LIFETIME:
+                delay = min(self.restart_delay.get(slot, 0.5) * 2, MAX_RESTART_DELAY)
+            else:
+                delay = 0.0
+            self.restart_delay[slot] = delay or 0.5
+            if delay:
+                # Respawn later from the main loop, which keeps serving signals
+                logger.warning(f"Worker {slot} is crash-looping, waiting {delay:.1f}s")
+                self.pending[slot] = time.monotonic() + delay
+            else:
+                self.spawn(slot)
+
+    def memory_report(self):
+        report = {
+            "master": {"pid": os.getpid(), **(read_memory(os.getpid()) or {})},
+            "workers": [],
+        }
+        for pid, info in sorted(self.workers.items(), key=lambda w: w[1]["slot"]):
+            stats = read_memory(pid) or {}
+            report["workers"].append({"slot": info["slot"], "pid": pid, **stats})
+            logger.info(
+                f"Worker {info['slot']} (pid {pid}): "
+                + ", ".join(f"{k}={v}" for k, v in stats.items())
+            )
+        total_pss = sum(w.get("pss_kb", 0) for w in report["workers"])
+        report["total_worker_pss_kb"] = total_pss
+        logger.info(f"Total worker PSS: {total_pss} kB")
+
+        if self.status_file:
+            tmp_path = f"{self.status_file}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(report, f, indent=2)
+            os.replace(tmp_path, self.status_file)
+        return report
+
+    def stop(self, signum, frame):
+        logger.info("Shutting down workers...")
+        self.running = False
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload(self, signum, frame):
+        """Restart all workers (SIGHUP); the reaper respawns them."""
+        logger.info("Reloading workers...")
+        self.reloading.update(self.workers)
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        self.bind()
+
+        # Move everything loaded so far out of the GC's reach so collections in
+        # the workers don't touch (and therefore copy) the shared model pages
+        gc.collect()
+        gc.freeze()
+
+        # Signals wake the main loop through this pipe instead of polling
+        self.wakeup = os.pipe()
+        for fd in self.wakeup:
+            os.set_blocking(fd, False)
+        signal.set_wakeup_fd(self.wakeup[1])
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGHUP, self.reload)
+        # The default SIGCHLD disposition is "ignore", which would not wake us
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        for slot in range(self.num_workers):
+            self.spawn(slot)
+
+        last_report = time.monotonic()
+        while self.running:
+            self.reap()
+            self.respawn_due()
+            if self.memory_interval and time.monotonic() - last_report >= self.memory_interval:
+                self.memory_report()
+                last_report = time.monotonic()
+            if self.running:
+                self.wait(self.next_timeout(last_report))
+
+        # Wait for workers to finish their in-flight requests
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            if self.workers:
+                self.wait(deadline - time.monotonic())
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGKILL)
+        self.sock.close()
+        logger.info("Server stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-fork sentiment server")
+    parser.add_argument("app", help="path/to/module.py:app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--threads", type=int, default=4,
+                        help="Threads per worker (WSGI apps only)")
+    parser.add_argument("--memory-interval", type=float, default=60.0,
+                        help="Seconds between per-worker memory reports (0 disables)")
+    parser.add_argument("--status-file", default=None,
+                        help="Write the latest memory report as JSON to this file")
+    args = parser.parse_args()
+    if args.status_file:
+        # load_app() changes directory, keep the path relative to the caller
+        args.status_file = os.path.abspath(args.status_file)
+
+    logger.info(f"Loading {args.app} in master process...")
+    app = load_app(args.app)
+
+    PreforkServer(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        memory_interval=args.memory_interval,
+        status_file=args.status_file,
+    ).run()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The backend is a set of flat scripts, so make each directory importable
+for directory in (BACKEND_DIR, os.path.join(BACKEND_DIR, "model 1"), os.path.join(BACKEND_DIR, "model_3")):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
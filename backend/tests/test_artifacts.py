@@ -0,0 +1,47 @@
+import os
+
+from artifacts import ArtifactStore
+
+PAYLOAD = b'{"vocabulary": ' + b'"word", ' * 2000 + b"}"
+
+
+def make_store(tmp_path):
+    (tmp_path / "vectorizer.json").write_bytes(PAYLOAD)
+    return ArtifactStore(str(tmp_path), {"vectorizer.json": "application/json"})
+
+
+def test_304_uses_the_etag_of_the_selected_representation(tmp_path):
+    store = make_store(tmp_path)
+    path, gzip_etag, encoding = store.select("vectorizer.json", "gzip, deflate")
+    assert encoding == "gzip"
+    _, identity_etag, encoding = store.select("vectorizer.json", "identity")
+    assert encoding is None
+    assert gzip_etag != identity_etag
+
+    # A client revalidates with the ETag it was sent
+    assert store.is_fresh(gzip_etag, f'"{gzip_etag}"')
+    assert store.is_fresh(identity_etag, f'W/"{identity_etag}"')
+    # ... and a tag of another representation is not a match for this one
+    assert not store.is_fresh(gzip_etag, f'"{identity_etag}"')
+    assert store.is_fresh(gzip_etag, "*")
+    assert not store.is_fresh(gzip_etag, None)
+
+
+def test_new_version_changes_every_etag(tmp_path):
+    store = make_store(tmp_path)
+    _, old_etag, _ = store.select("vectorizer.json", "gzip")
+    (tmp_path / "vectorizer.json").write_bytes(PAYLOAD + b" ")
+    os.utime(tmp_path / "vectorizer.json", ns=(1, 1))
+    _, new_etag, _ = store.select("vectorizer.json", "gzip")
+    assert new_etag != old_etag
+    assert not store.is_fresh(new_etag, f'"{old_etag}"')
+
+
+def test_missing_artifact_is_absent_not_an_error(tmp_path):
+    store = make_store(tmp_path)
+    assert store.get("vectorizer.json") is not None
+    os.remove(tmp_path / "vectorizer.json")
+    assert store.get("vectorizer.json") is None
+    assert store.select("vectorizer.json", "gzip") is None
+    assert store.manifest() == {"artifacts": {}}
+    assert store.get("unknown.bin") is None
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+import pytest
+
+import cascade
+from cascade import CascadeAnalyzer, accepts, calibrate
+
+
+class FakeCheap:
+    name = "fake"
+
+    def __init__(self, labels, confidence):
+        self.labels = dict(labels)
+        self.confidence = dict(confidence)
+
+    def predict(self, texts):
+        return (
+            np.array([self.labels[t] for t in texts], dtype=object),
+            np.array([self.confidence[t] for t in texts], dtype=np.float32),
+        )
+
+
+class FakeBert:
+    name = "bert"
+
+    def __init__(self, labels):
+        self.labels = dict(labels)
+        self.calls = []
+
+    def analyze(self, texts):
+        self.calls.append(list(texts))
+        return [
+            {"sentiment": self.labels[t].upper(), "rating": 5, "confidence": 0.9, "score": 1.0}
+            for t in texts
+        ]
+
+
+def test_ties_at_the_threshold_are_never_split():
+    texts = [f"t{i}" for i in range(6)]
+    confidence = dict(zip(texts, [0.9, 0.8, 0.5, 0.5, 0.5, 0.1]))
+    cheap_labels = {t: "positive" for t in texts}
+    # Two of the three rows tied at 0.5 disagree with BERT
+    bert_labels = dict(cheap_labels, t3="negative", t4="negative")
+
+    calibration = calibrate(
+        texts, target_agreement=0.9, min_rows=1,
+        cheap_engine=FakeCheap(cheap_labels, confidence), bert_engine=FakeBert(bert_labels),
+    )
+    assert calibration["threshold"] == pytest.approx(0.8)
+    assert calibration["coverage"] == pytest.approx(2 / 6)
+    # The runtime gate accepts exactly the calibrated rows
+    scores = np.array([confidence[t] for t in texts], dtype=np.float32)
+    assert accepts(scores, calibration["threshold"]).sum() == 2
+
+
+def test_cascade_reports_probabilities_and_raw_scores(monkeypatch):
+    monkeypatch.setattr(cascade, "load_thresholds", lambda: {"fake": {"threshold": 0.5, "agreement": 0.97}})
+    texts = ["sure", "unsure"]
+    cheap = FakeCheap({t: "positive" for t in texts}, {"sure": 3.2, "unsure": 0.2})
+    bert = FakeBert({"unsure": "negative"})
+
+    results = CascadeAnalyzer(cheap_engine=cheap, bert_engine=bert).analyze_texts(texts)
+    assert bert.calls == [["unsure"]]
+    assert results[0]["engine"] == "fake"
+    assert results[0]["confidence"] == pytest.approx(0.97)
+    assert results[0]["engine_confidence"] == pytest.approx(3.2)
+    assert results[1]["engine"] == "bert"
+    assert results[1]["sentiment"] == "NEGATIVE"
+    assert results[1]["confidence"] == pytest.approx(0.9)
+
+
+def test_uncalibrated_engine_needs_a_threshold(monkeypatch):
+    monkeypatch.setattr(cascade, "load_thresholds", lambda: {})
+    cheap = FakeCheap({}, {})
+    with pytest.raises(ValueError, match="No threshold for engine 'fake'"):
+        CascadeAnalyzer(cheap_engine=cheap, bert_engine=FakeBert({}))
+    # Built-in thresholds exist only for the real cheap engines
+    with pytest.raises(ValueError):
+        CascadeAnalyzer(cheap_engine=cheap, bert_engine=FakeBert({}), use_defaults=True)
+
+    cheap.name = "mlp"
+    analyzer = CascadeAnalyzer(cheap_engine=cheap, bert_engine=FakeBert({}), use_defaults=True)
+    assert analyzer.threshold == cascade.DEFAULT_THRESHOLDS["mlp"]["threshold"]
+
+
+def test_uncalibrated_engine_reports_its_raw_score(monkeypatch):
+    monkeypatch.setattr(cascade, "load_thresholds", lambda: {})
+    texts = ["sure", "very sure"]
+    cheap = FakeCheap({t: "positive" for t in texts}, {"sure": 0.7, "very sure": 3.2})
+
+    analyzer = CascadeAnalyzer(threshold=0.5, cheap_engine=cheap, bert_engine=FakeBert({}))
+    results = analyzer.analyze_texts(texts)
+    assert [r["engine"] for r in results] == ["fake", "fake"]
+    assert results[0]["confidence"] == pytest.approx(0.7)
+    assert results[1]["confidence"] == pytest.approx(1.0)
+    assert results[1]["engine_confidence"] == pytest.approx(3.2)
+    assert not any(math.isnan(r["confidence"]) for r in results)
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("tensorflow")
+
+import preprocessing
+from engines import MODEL1_DIR, load_module
+
+distill = load_module(MODEL1_DIR, "distill.py", "model1_distill")
+
+COMMENTS = {
+    1: "terrible waste of money",
+    2: "poor and boring",
+    3: "it is an ordinary product",
+    4: "good value overall",
+    5: "amazing love it",
+}
+
+
+def test_soft_targets_are_distributions_led_by_the_star_class():
+    rng = np.random.default_rng(0)
+    ratings = rng.integers(1, 6, 1000)
+    confidences = rng.random(1000)
+
+    targets = distill.soft_targets(ratings, confidences)
+    np.testing.assert_allclose(targets.sum(axis=1), 1.0, atol=1e-5)
+    assert (targets.argmax(axis=1) == distill.STAR_CLASSES[ratings - 1]).all()
+    # A 3-star row below 1/3 confidence used to come out negative
+    assert distill.soft_targets([3], [0.3]).argmax() == 1
+
+
+def test_distill_trains_exports_and_reports_agreement(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, "init_worker", lambda config: None)
+    monkeypatch.setattr(preprocessing, "preprocess_shard", lambda texts: [t.lower() for t in texts])
+    monkeypatch.setattr(
+        distill, "CorpusPreprocessor",
+        lambda: preprocessing.CorpusPreprocessor(cache_dir=str(tmp_path / "cache"), n_jobs=1),
+    )
+    monkeypatch.setattr(distill.SentimentAnalyzer, "setup_nltk", lambda self: None)
+
+    ratings = [1, 2, 3, 4, 5] * 12
+    pd.DataFrame({
+        "comment": [f"{COMMENTS[r]} {i}" for i, r in enumerate(ratings)],
+        "rating": ratings,
+        "confidence": [0.3 if r == 3 else 0.8 for r in ratings],
+    }).to_csv(tmp_path / "analyzed_reviews.csv", index=False)
+
+    model_path = str(tmp_path / "student.tflite")
+    report = distill.distill(
+        results_pattern=str(tmp_path / "analyzed_*.csv"),
+        model_path=model_path,
+        vectorizer_path=str(tmp_path / "student_vectorizer.json"),
+        epochs=2,
+        time_bert=False,
+    )
+    assert report["teacher_rows"] == 60
+    assert report["train_rows"] + report["test_rows"] == 60
+    assert 0.0 <= report["agreement"] <= 1.0
+    # Every class, including the low-confidence neutral rows, is held out
+    assert set(report["per_class_agreement"]) == set(distill.CLASS_NAMES)
+    with open(str(tmp_path / "student_report.json")) as f:
+        assert json.load(f)["model_path"] == model_path
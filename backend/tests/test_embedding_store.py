@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore, text_key
+
+LABELS = ["1 star", "2 stars", "3 stars", "4 stars", "5 stars"]
+
+
+def make_store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "store"), dim=4, labels=LABELS, model_name="test")
+    keys = [text_key(f"text {i}\0tokens:512") for i in range(3)]
+    embeddings = [[1, 0, 0, 0], [0.99, 0.01, 0, 0], [0, 0, 1, 0]]
+    store.append(keys, embeddings, np.zeros((3, len(LABELS))))
+    return store, keys
+
+
+def test_membership_is_by_key(tmp_path):
+    store, keys = make_store(tmp_path)
+    assert keys[0] in store
+    assert text_key("unseen") not in store
+    # A raw text is never a stored key; the analyzer adds its settings
+    with pytest.raises(TypeError):
+        "text 0" in store
+
+
+def test_duplicates_report_rows_and_keys(tmp_path):
+    store, keys = make_store(tmp_path)
+    pairs = store.find_duplicates(threshold=0.95, k=2)
+    assert len(pairs) == 1
+    row, neighbour, similarity, key, neighbour_key = pairs[0]
+    assert (row, neighbour) == (0, 1)
+    assert similarity > 0.95
+    assert (key, neighbour_key) == (keys[0], keys[1])
+
+    # Keys survive reopening the store
+    reopened = EmbeddingStore(str(tmp_path / "store"))
+    assert reopened.find_duplicates(threshold=0.95, k=2)[0][3:] == (keys[0], keys[1])
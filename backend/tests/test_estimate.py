@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("transformers")
+
+from estimate import ProgressiveEstimator, read_snapshot, request_stop  # noqa: E402
+
+
+class FakeAnalyzer:
+    def analyze_into(self, texts, results, batch_size=32):
+        results.codes[:] = 2
+        results.ratings[:] = 5
+        results.confidences[:] = 0.9
+
+
+def make_estimator(sizes, strata_column="category", **kwargs):
+    categories = np.repeat([f"c{i}" for i in range(len(sizes))], sizes)
+    df = pd.DataFrame({"comment": [f"text {i}" for i in range(len(categories))], "category": categories})
+    return ProgressiveEstimator(FakeAnalyzer(), df, "comment", strata_column=strata_column, **kwargs)
+
+
+def test_allocation_never_exceeds_the_requested_sample():
+    # Many tiny strata used to get two rows each on top of the budget
+    estimator = make_estimator([1000] + [3] * 100)
+    targets = estimator._allocate(50)
+    assert sum(targets) == 50
+    assert all(target <= len(stratum["rows"]) for target, stratum in zip(targets, estimator.strata))
+
+
+def test_allocation_is_proportional_with_two_rows_per_stratum():
+    estimator = make_estimator([600, 300, 100])
+    assert estimator._allocate(100) == [60, 30, 10]
+    assert estimator._allocate(10) == [5, 3, 2]
+
+
+def test_allocation_keeps_rows_already_scored():
+    estimator = make_estimator([600, 300, 100])
+    estimator.strata[2]["scored"] = 40
+    targets = estimator._allocate(100)
+    assert targets[2] == 40
+    assert sum(targets) == 100
+
+
+def test_single_stratum_when_stratification_is_disabled():
+    estimator = make_estimator([500, 500], strata_column=False)
+    assert len(estimator.strata) == 1
+    assert estimator._allocate(200) == [200]
+
+
+def test_strata_column_is_detected():
+    estimator = make_estimator([500, 500], strata_column=None)
+    assert estimator.strata_column == "category"
+    assert len(estimator.strata) == 2
+
+
+def test_many_small_strata_are_merged_and_every_stratum_is_sampled():
+    # 300 strata of 3 rows could not all get a row of a 200-row sample
+    estimator = make_estimator([1000] + [3] * 300, initial_sample=200)
+    assert [stratum["name"] for stratum in estimator.strata] == ["c0", "(other)"]
+    estimator.run_round()
+    assert all(stratum["scored"] > 0 for stratum in estimator.strata)
+    assert estimator.estimate["proportions"]["POSITIVE"]["estimate"] == pytest.approx(1.0)
+    assert np.isfinite(estimator.estimate["mean_rating"]["margin"])
+
+
+def test_round_smaller_than_the_number_of_strata():
+    estimator = make_estimator([400, 300, 200, 100])
+    estimator.run_round(sample_size=2)
+    assert [stratum["scored"] for stratum in estimator.strata] == [1, 1, 0, 0]
+    mean_rating = estimator.estimate["mean_rating"]
+    assert mean_rating["estimate"] == pytest.approx(5.0)
+    assert np.isfinite(mean_rating["margin"]) and mean_rating["margin"] > 0
+
+
+def test_snapshot_is_shared_and_stoppable_through_state_dir(tmp_path):
+    estimator = make_estimator([600, 400], initial_sample=100, state_dir=str(tmp_path))
+    estimator.run_round()
+    snapshot = read_snapshot(str(tmp_path), estimator.job_id)
+    assert snapshot["scored"] == 100
+    assert snapshot["proportions"]["POSITIVE"]["estimate"] == pytest.approx(1.0)
+
+    assert request_stop(str(tmp_path), estimator.job_id) is not None
+    assert estimator.stopping()
+    assert read_snapshot(str(tmp_path), "0" * 32) is None
+    assert read_snapshot(str(tmp_path), "../secrets") is None
@@ -0,0 +1,33 @@
+import numpy as np
+
+import evaluate
+from engines import fingerprint
+
+
+def test_fingerprint_follows_the_artifact_file(tmp_path):
+    path = tmp_path / "model.joblib"
+    missing = fingerprint([str(path)])
+    path.write_bytes(b"v1")
+    first = fingerprint([str(path)])
+    path.write_bytes(b"v2 retrained")
+    assert len({missing, first, fingerprint([str(path)])}) == 3
+
+
+def test_cached_predictions_are_keyed_on_the_artifact_version(tmp_path, monkeypatch):
+    loads = []
+
+    def load_engine(name, batch_size):
+        loads.append(name)
+        return lambda texts: (np.array(["positive"] * len(texts), dtype=object), np.ones(len(texts)))
+
+    version = {"svc": "a"}
+    monkeypatch.setattr(evaluate, "load_engine", load_engine)
+    monkeypatch.setattr(evaluate, "artifact_version", lambda name: version[name])
+    texts = ["good", "bad"]
+    digest = evaluate.dataset_hash(texts)
+
+    assert not evaluate.score_engine("svc", texts, digest, cache_dir=str(tmp_path))["cached"]
+    assert evaluate.score_engine("svc", texts, digest, cache_dir=str(tmp_path))["cached"]
+    version["svc"] = "b"
+    assert not evaluate.score_engine("svc", texts, digest, cache_dir=str(tmp_path))["cached"]
+    assert loads == ["svc", "svc"]
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pytest
+
+import ingest
+from ingest import IngestWorker
+
+
+class FakeEngine:
+    name = "fake"
+
+    def predict(self, texts):
+        return np.array(["positive"] * len(texts), dtype=object), np.ones(len(texts))
+
+
+@pytest.fixture
+def make_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "get_engine", lambda name: FakeEngine())
+    watch_dir = tmp_path / "incoming"
+    watch_dir.mkdir()
+
+    def make():
+        worker = IngestWorker(str(watch_dir), str(tmp_path / "scored.jsonl"))
+        worker.load_checkpoint()
+        return worker
+
+    return watch_dir, make
+
+
+def ingest_available(worker):
+    with open(worker.output_path, "ab") as sink:
+        items = worker.read_records(100)
+        if items:
+            worker.process_batch(items, sink)
+    return items
+
+
+def sink_lines(worker):
+    with open(worker.output_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_quoted_fields_may_span_lines(make_worker):
+    watch_dir, make = make_worker
+    (watch_dir / "reviews.csv").write_text(
+        'id,comment\n1,"first line\nsecond line, with a comma"\n2,plain\n'
+    )
+    items = make().read_records(100)
+    assert [item["record"] for item in items] == [
+        {"id": "1", "comment": "first line\nsecond line, with a comma"},
+        {"id": "2", "comment": "plain"},
+    ]
+
+
+def test_resume_from_a_checkpoint_taken_mid_record(make_worker):
+    watch_dir, make = make_worker
+    path = watch_dir / "reviews.csv"
+    # The writer is in the middle of a multi-line record
+    path.write_text('id,comment\n1,done\n2,"half of\n')
+
+    worker = make()
+    assert [item["record"]["id"] for item in ingest_available(worker)] == ["1"]
+    assert worker.files["reviews.csv"]["offset"] == len(b"id,comment\n1,done\n")
+
+    with open(path, "a") as f:
+        f.write('the review"\n3,last\n')
+
+    # A fresh process picks up from the checkpoint and reads the whole record
+    resumed = make()
+    assert [item["record"] for item in ingest_available(resumed)] == [
+        {"id": "2", "comment": "half of\nthe review"},
+        {"id": "3", "comment": "last"},
+    ]
+    assert [line["id"] for line in sink_lines(resumed)] == ["1", "2", "3"]
+    assert resumed.files["reviews.csv"]["offset"] == path.stat().st_size
+    assert ingest_available(resumed) == []
+
+
+def test_partial_jsonl_line_is_left_for_later(make_worker):
+    watch_dir, make = make_worker
+    path = watch_dir / "reviews.jsonl"
+    path.write_text('{"comment": "good"}\n{"comment": "ba')
+    worker = make()
+    assert len(ingest_available(worker)) == 1
+    with open(path, "a") as f:
+        f.write('d"}\n')
+    assert [item["record"]["comment"] for item in ingest_available(worker)] == ["bad"]
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_load_test(tmp_path, target, *args):
+    output = tmp_path / f"{target}.json"
+    process = subprocess.run(
+        [
+            sys.executable, os.path.join(BACKEND_DIR, "loadtest.py"), "run", target,
+            "--duration", "10", "--requests", "40", "--warmup", "0",
+            "--concurrency", "2", "--output", str(output), *args,
+        ],
+        cwd=str(tmp_path),
+        capture_output=True,
+        text=True,
+        timeout=180,
+    )
+    assert process.returncode == 0, process.stdout[-2000:] + process.stderr[-2000:]
+    with open(output) as f:
+        return json.load(f)
+
+
+def test_model3_stub_serves_analyze_and_download(tmp_path):
+    pytest.importorskip("flask")
+    pytest.importorskip("matplotlib")
+    model3_dir = os.path.join(BACKEND_DIR, "model_3")
+    before = set(os.listdir(model3_dir))
+    report = run_load_test(tmp_path, "model3", "--mix", "analyze=1,download=1", "--rows", "20")
+    assert report["failed_endpoints"] == []
+    assert report["overall"]["errors"] == 0
+    assert report["endpoints"]["download"]["status_codes"] == {
+        "200": report["endpoints"]["download"]["requests"]
+    }
+    # Stub runs keep their registry and outputs out of the tree
+    assert set(os.listdir(model3_dir)) == before
+
+
+def test_model1_stub_serves_batches(tmp_path):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("uvicorn")
+    report = run_load_test(tmp_path, "model1", "--batch-size", "5")
+    assert report["failed_endpoints"] == []
+    assert report["endpoints"]["batch"]["status_codes"] == {"200": 40}
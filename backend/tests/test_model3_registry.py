@@ -0,0 +1,110 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("transformers")
+
+from engines import MODEL3_DIR, load_module  # noqa: E402
+from model_registry import HotModel, ModelRegistry  # noqa: E402
+
+TOKEN = "secret"
+
+
+@pytest.fixture(scope="module")
+def main(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("model3")
+    cwd = os.getcwd()
+    os.environ["MODEL_REGISTRY"] = str(workdir / "registry")
+    os.chdir(workdir)
+    try:
+        yield load_module(MODEL3_DIR, "main.py", "model3_main")
+    finally:
+        os.chdir(cwd)
+        del os.environ["MODEL_REGISTRY"]
+
+
+@pytest.fixture
+def app(main, tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    for name in ("good/model-a", "good/model-b", "broken/model"):
+        registry.register_name(name, version=name.replace("/", "-"))
+    registry.set_current("good-model-a")
+
+    def warm_model(version):
+        if registry.model_name(version).startswith("broken/"):
+            raise ValueError("Rating outside 1-5 in prediction")
+        return registry.model_name(version)
+
+    model = HotModel(registry, warm_model, check_interval=0.0)
+    model.load_current()
+    monkeypatch.setattr(main, "registry", registry)
+    monkeypatch.setattr(main, "model", model)
+    monkeypatch.setattr(main, "ADMIN_TOKEN", TOKEN)
+    return main, registry, main.app.test_client()
+
+
+def activate(client, **data):
+    return client.post("/admin/model", json=data, headers={"X-Admin-Token": TOKEN})
+
+
+def wait_loaded(main):
+    deadline = time.monotonic() + 5
+    while main.model.loading is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_admin_routes_are_disabled_without_a_token(app, monkeypatch):
+    main, _, client = app
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    assert client.get("/admin/model").status_code == 403
+    assert activate(client, version="good-model-b").status_code == 403
+    monkeypatch.setattr(main, "ADMIN_TOKEN", TOKEN)
+    assert client.get("/admin/model", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_only_registered_models_can_be_activated(app):
+    main, _, client = app
+    assert activate(client, model_name="someone/else").status_code == 404
+    assert activate(client, version="no-such-version").status_code == 404
+    assert main.model.get()[0] == "good-model-a"
+
+
+def test_swap_and_rollback(app):
+    main, registry, client = app
+    response = activate(client, model_name="good/model-b")
+    assert response.status_code == 202
+    wait_loaded(main)
+    assert main.model.get()[0] == "good-model-b"
+    assert registry.current() == "good-model-b"
+    status = client.get("/admin/model", headers={"X-Admin-Token": TOKEN})
+    assert status.headers["X-Model-Version"] == "good-model-b"
+    assert [v["model_name"] for v in status.json["versions"]][:2] == ["good/model-a", "good/model-b"]
+
+    response = client.post("/admin/rollback", headers={"X-Admin-Token": TOKEN})
+    assert response.json["rolled_back_to"] == "good-model-a"
+    assert registry.current() == "good-model-a"
+
+
+def test_failed_warm_up_keeps_the_current_version(app):
+    main, registry, client = app
+    assert activate(client, version="broken-model").status_code == 202
+    wait_loaded(main)
+    assert main.model.get()[0] == "good-model-a"
+    assert registry.current() == "good-model-a"
+    assert "broken-model" in main.model.error
+
+
+def test_warm_up_check_rejects_invalid_outputs():
+    from model import SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer.__new__(SentimentAnalyzer)
+    analyzer.long_documents = False
+    analyzer.analyzer = lambda texts, truncation: [{"label": "5 stars", "score": 0.8} for _ in texts]
+    assert analyzer.check(["fine"])[0]["rating"] == 5
+
+    for bad in ({"label": "LABEL_0", "score": 0.8}, {"label": "9 stars", "score": 0.8},
+                {"label": "4 stars", "score": float("nan")}):
+        analyzer.analyzer = lambda texts, truncation, bad=bad: [bad for _ in texts]
+        with pytest.raises(ValueError):
+            analyzer.check(["fine"])
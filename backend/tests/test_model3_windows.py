@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("transformers")
+
+import model  # noqa: E402
+from model import SentimentAnalyzer  # noqa: E402
+
+CLS, SEP = 101, 102
+
+
+class FakeTokenizer:
+    model_max_length = 512
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, texts, add_special_tokens=False, verbose=False):
+        return {"input_ids": [list(range(len(text.split()))) for text in texts]}
+
+    def build_inputs_with_special_tokens(self, ids):
+        return [CLS, *ids, SEP]
+
+
+@pytest.fixture(autouse=True)
+def fake_pipeline(monkeypatch):
+    pipeline = SimpleNamespace(
+        tokenizer=FakeTokenizer(),
+        model=SimpleNamespace(config=SimpleNamespace(max_position_embeddings=512)),
+    )
+    monkeypatch.setattr(model, "load_pipeline", lambda name: pipeline)
+
+
+def words(count):
+    return " ".join(["word"] * count)
+
+
+def test_default_mode_keeps_the_first_window():
+    analyzer = SentimentAnalyzer(max_tokens=12)
+    windows, size = analyzer._windows([words(30), words(3)])
+    assert size == 12
+    assert [(index, ids) for index, ids in windows] == [
+        (0, [CLS, *range(10), SEP]),
+        (1, [CLS, 0, 1, 2, SEP]),
+    ]
+
+
+def test_long_documents_are_covered_by_overlapping_windows():
+    analyzer = SentimentAnalyzer(long_documents=True, max_tokens=12, stride=4)
+    windows, _ = analyzer._windows([words(25), words(5)])
+    starts = [ids[1] for index, ids in windows if index == 0]
+    # 10 text tokens per window, advancing by 10 - 4
+    assert starts == [0, 6, 12, 18]
+    covered = {token for index, ids in windows if index == 0 for token in ids[1:-1]}
+    assert covered == set(range(25))
+    assert all(len(ids) <= 12 for _, ids in windows)
+    assert [ids for index, ids in windows if index == 1] == [[CLS, *range(5), SEP]]
+
+
+@pytest.mark.parametrize("stride", [-1, 10, 50])
+def test_invalid_stride_is_rejected(stride):
+    with pytest.raises(ValueError, match="stride"):
+        SentimentAnalyzer(long_documents=True, max_tokens=12, stride=stride)
+    # The stride is unused without long documents
+    SentimentAnalyzer(max_tokens=12, stride=stride)
+
+
+def test_store_keys_depend_on_the_truncation_mode():
+    text = words(600)
+    default = SentimentAnalyzer()._key(text)
+    windows = SentimentAnalyzer(long_documents=True, stride=128)._key(text)
+    other_stride = SentimentAnalyzer(long_documents=True, stride=64)._key(text)
+    assert len({default, windows, other_stride, model.text_key(text)}) == 4
+
+
+def test_store_lookups_use_the_analyzer_key(tmp_path):
+    from embedding_store import EmbeddingStore
+
+    analyzer = SentimentAnalyzer(max_tokens=12)
+    labels = ["1 star", "2 stars", "3 stars", "4 stars", "5 stars"]
+    analyzer.store = EmbeddingStore(str(tmp_path), dim=2, labels=labels)
+    analyzer.store.append(
+        [analyzer._key("same review"), analyzer._key("same review!")],
+        [[1.0, 0.0], [1.0, 0.01]],
+        [[0.0] * 5, [0.0] * 5],
+    )
+    assert analyzer.is_stored("same review")
+    assert not analyzer.is_stored("another review")
+    [(text, other, similarity)] = analyzer.find_duplicates(["same review", "same review!"])
+    assert (text, other) == ("same review", "same review!")
+    assert similarity > 0.99
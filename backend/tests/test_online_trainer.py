@@ -0,0 +1,85 @@
+import os
+
+import pandas as pd
+import pytest
+
+from online_trainer import OnlineSentimentTrainer
+
+TEXTS = {
+    "positive": "great product love it",
+    "neutral": "it is an ordinary product",
+    "negative": "terrible product hate it",
+}
+
+
+def write_csv(path, rows=60):
+    labels = list(TEXTS) * (rows // len(TEXTS))
+    pd.DataFrame({"text": [TEXTS[label] for label in labels], "sentiment": labels}).to_csv(path, index=False)
+    return str(path)
+
+
+def make_trainer(cache_dir):
+    trainer = OnlineSentimentTrainer(n_features=2**10, chunk_size=10)
+    trainer.preprocessor.cache_dir = str(cache_dir)
+    trainer.preprocess = lambda texts: texts
+    return trainer
+
+
+class Interrupt(Exception):
+    pass
+
+
+def test_resumes_after_interruption_and_removes_checkpoint(tmp_path):
+    csv_path = write_csv(tmp_path / "reviews.csv")
+    checkpoint = str(tmp_path / "model.ckpt")
+
+    trainer = make_trainer(tmp_path / "cache")
+    calls = []
+
+    def failing_preprocess(texts):
+        calls.append(1)
+        if len(calls) == 9:
+            raise Interrupt()
+        return texts
+
+    trainer.preprocess = failing_preprocess
+    with pytest.raises(Interrupt):
+        trainer.train(csv_path, epochs=2, checkpoint_path=checkpoint, checkpoint_every=2)
+    assert os.path.exists(checkpoint)
+
+    resumed = make_trainer(tmp_path / "cache")
+    history = resumed.train(csv_path, epochs=2, checkpoint_path=checkpoint, checkpoint_every=2)
+    # Interrupted in epoch 2 after chunk 2 was checkpointed: 4 chunks are left
+    assert [entry["epoch"] for entry in history] == [2]
+    assert history[0]["rows"] == 4 * 9
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoint_of_another_file_is_ignored(tmp_path):
+    checkpoint = str(tmp_path / "model.ckpt")
+    old_csv = write_csv(tmp_path / "old.csv")
+    trainer = make_trainer(tmp_path / "cache")
+    trainer.epoch = 1
+    trainer.save_checkpoint(checkpoint, source_hash="not-" + os.path.basename(old_csv))
+
+    new_csv = write_csv(tmp_path / "new.csv", rows=90)
+    history = make_trainer(tmp_path / "cache").train(new_csv, epochs=1, checkpoint_path=checkpoint)
+    assert len(history) == 1
+    assert history[0]["rows"] == 9 * 9
+    assert not os.path.exists(checkpoint)
+
+
+def test_no_resume_starts_from_scratch(tmp_path):
+    csv_path = write_csv(tmp_path / "reviews.csv")
+    checkpoint = str(tmp_path / "model.ckpt")
+    trainer = make_trainer(tmp_path / "cache")
+    trainer.train(csv_path, epochs=1, checkpoint_path=checkpoint)
+
+    # Even a finished run's state would be skipped past without resume=False
+    from preprocessing import file_hash
+
+    trainer.save_checkpoint(checkpoint, file_hash(csv_path))
+    history = make_trainer(tmp_path / "cache").train(
+        csv_path, epochs=1, checkpoint_path=checkpoint, resume=False
+    )
+    assert len(history) == 1
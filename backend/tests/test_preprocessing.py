@@ -0,0 +1,50 @@
+import preprocessing
+from preprocessing import CorpusPreprocessor, shard_hash, split_shards
+
+TEXTS = [f"review number {i}" for i in range(2000)]
+
+
+def test_shards_cover_every_row_in_order():
+    shards = split_shards(TEXTS, 50)
+    assert [text for shard in shards for text in shard] == TEXTS
+    assert max(len(shard) for shard in shards) <= 200
+
+
+def test_inserted_row_only_changes_nearby_shards():
+    before = {shard_hash(shard) for shard in split_shards(TEXTS, 50)}
+    edited = TEXTS[:700] + ["a brand new review"] + TEXTS[700:]
+    after = [shard_hash(shard) for shard in split_shards(edited, 50)]
+    assert sum(key not in before for key in after) <= 2
+
+
+def test_process_reuses_cached_shards(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(preprocessing, "init_worker", lambda config: None)
+    monkeypatch.setattr(
+        preprocessing, "preprocess_shard", lambda texts: calls.append(len(texts)) or [t.upper() for t in texts]
+    )
+    preprocessor = CorpusPreprocessor(cache_dir=str(tmp_path), shard_size=50, n_jobs=1)
+
+    assert preprocessor.process(TEXTS) == [text.upper() for text in TEXTS]
+    processed_rows = sum(calls)
+    assert processed_rows == len(TEXTS)
+
+    edited = TEXTS[:700] + ["a brand new review"] + TEXTS[700:]
+    assert preprocessor.process(edited) == [text.upper() for text in edited]
+    assert sum(calls) - processed_rows < 200
+
+
+def test_manifest_is_keyed_on_the_texts_not_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, "init_worker", lambda config: None)
+    monkeypatch.setattr(preprocessing, "preprocess_shard", lambda texts: [t.upper() for t in texts])
+    source = tmp_path / "reviews.csv"
+    source.write_text("text,title\n")
+    preprocessor = CorpusPreprocessor(cache_dir=str(tmp_path / "cache"), shard_size=50, n_jobs=1)
+
+    texts = TEXTS[:100]
+    titles = [f"title {i}" for i in range(100)]
+    assert preprocessor.process(texts, source_path=str(source)) == [t.upper() for t in texts]
+    # Same file and row count, different column
+    assert preprocessor.process(titles, source_path=str(source)) == [t.upper() for t in titles]
+    assert preprocessor.load_cached(texts) == [t.upper() for t in texts]
+    assert preprocessor.load_cached(texts[1:]) is None
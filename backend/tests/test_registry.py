@@ -0,0 +1,114 @@
+import time
+
+import joblib
+import pytest
+
+from registry import HotModel, ModelRegistry
+
+
+class FakeAnalyzer:
+    """Serves the label stored in a joblib file for every text"""
+
+    model = None
+
+    def load_model(self, path, mmap_mode=None):
+        self.model = joblib.load(path)
+
+    def preprocess_text(self, text):
+        return text
+
+    def predict_batch(self, texts):
+        return [self.model["label"] for _ in texts]
+
+
+def register(registry, tmp_path, label, version):
+    path = tmp_path / f"{version}.joblib"
+    joblib.dump({"label": label}, path)
+    return registry.register(str(path), version=version)
+
+
+def wait_loaded(model):
+    deadline = time.monotonic() + 5
+    while model.loading is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert model.loading is None
+
+
+@pytest.fixture
+def setup(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "registry"))
+    for label, version in (("positive", "v1"), ("negative", "v2"), ("banana", "broken")):
+        register(registry, tmp_path, label, version)
+    registry.set_current("v1")
+    model = HotModel(registry, FakeAnalyzer(), check_interval=0.0)
+    model.load_current()
+    return registry, model
+
+
+def test_swap_and_rollback(setup):
+    registry, model = setup
+    assert model.get()[0] == "v1"
+
+    assert model.activate("v2")
+    wait_loaded(model)
+    version, analyzer = model.get()
+    assert version == "v2"
+    assert analyzer.predict_batch(["x"]) == ["negative"]
+    assert registry.current() == "v2"
+    assert model.status()["previous"] == "v1"
+
+    assert model.rollback() == "v1"
+    assert model.get()[0] == "v1"
+    assert registry.current() == "v1"
+    assert not model.activate("v1")
+
+
+def test_invalid_version_is_never_swapped_in(setup):
+    registry, model = setup
+    assert model.activate("broken")
+    wait_loaded(model)
+    assert model.get()[0] == "v1"
+    assert "unknown labels: banana" in model.error
+    assert registry.current() == "v1"
+
+    with pytest.raises(KeyError):
+        model.activate("missing")
+
+
+def test_other_processes_follow_current(setup):
+    registry, model = setup
+    other = HotModel(registry, FakeAnalyzer(), check_interval=0.0)
+    other.load_current()
+
+    registry.set_current("v2")
+    other.get()
+    wait_loaded(other)
+    assert other.get()[0] == "v2"
+
+
+def test_shared_hot_model_loads_on_first_use_and_unloads_stale_versions(setup):
+    import model_registry
+
+    registry, _ = setup
+    unloaded = []
+    model = model_registry.HotModel(
+        registry, lambda version: f"model {version}", unload=unloaded.append, check_interval=0.0
+    )
+    assert model.get() == ("v1", "model v1")
+
+    model.activate("v2")
+    wait_loaded(model)
+    model.activate("broken")
+    wait_loaded(model)
+    # v1 is neither served nor kept for rollback any more
+    assert model.get() == ("broken", "model broken")
+    assert model.status()["previous"] == "v2"
+    assert unloaded == ["v1"]
+
+
+def test_registry_lives_next_to_the_app():
+    import os
+
+    import registry
+
+    assert registry.REGISTRY_DIR == os.path.join(os.path.dirname(registry.__file__), "registry")